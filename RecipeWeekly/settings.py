@@ -234,6 +234,26 @@ REST_FRAMEWORK = {
 }
 
 
+###################################################
+# Recommender
+###################################################
+# Optional .npz flavor index written by computerecommendations --flavor-snapshot, loaded on first query
+FLAVOR_INDEX_SNAPSHOT = os.environ.get('RECIPY_FLAVOR_INDEX_SNAPSHOT')
+# Seconds before the in-process flavor index reloads the snapshot (when rewritten) or the database
+FLAVOR_INDEX_MAX_AGE = 3600
+# Show a random page of each user's feed (stable for the day) instead of its top ranked recipes
+HOME_FEED_SAMPLE = False
+# Seconds a stale feed is still served before the home page recomputes it in the request. Schedule
+# refreshrecommendations (ex: cron every few minutes) so most stale feeds are rebuilt before that.
+HOME_FEED_STALE_AGE = 300
+# MMR tradeoff between relevance and variety for feeds and related recipes (1 turns re-ranking off)
+RECOMMENDATION_DIVERSITY = 0.7
+# Compute related recipes of new user recipes on a background thread after commit instead of in the request
+COLD_START_DEFERRED = False
+# Trained model artifacts, one versioned directory per run (ex: artifacts/als/20170501120000000000/)
+RECOMMENDER_ARTIFACT_DIR = os.environ.get('RECIPY_RECOMMENDER_ARTIFACT_DIR', os.path.join(BASE_DIR, 'artifacts'))
+
+
 
 
 
@@ -3,3 +3,18 @@ from django.apps import AppConfig
 
 class MainConfig(AppConfig):
     name = 'main'
+
+    def ready(self):
+        from django.db.models.signals import m2m_changed
+        from main.models import Recipe, Profile, ingredients_linked
+        from main.recommender.minhash import update_recipe_signature
+        from main.recommender.coldstart import cold_start_recipe
+        from main.recommender.feed import update_feed_on_vote
+        from main.recommender.taste import update_flavor_profile
+        import main.recommender.flavor # Registers the receivers marking the flavor index stale
+        ingredients_linked.connect(update_recipe_signature, sender=Recipe, dispatch_uid='update_recipe_signature')
+        ingredients_linked.connect(cold_start_recipe, sender=Recipe, dispatch_uid='cold_start_recipe')
+        m2m_changed.connect(update_feed_on_vote, sender=Profile.liked_recipes.through, dispatch_uid='update_feed_on_like')
+        m2m_changed.connect(update_feed_on_vote, sender=Profile.disliked_recipes.through, dispatch_uid='update_feed_on_dislike')
+        m2m_changed.connect(update_flavor_profile, sender=Profile.liked_recipes.through, dispatch_uid='update_flavor_profile_on_like')
+        m2m_changed.connect(update_flavor_profile, sender=Profile.disliked_recipes.through, dispatch_uid='update_flavor_profile_on_dislike')
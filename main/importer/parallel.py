@@ -0,0 +1,102 @@
+import csv
+import multiprocessing
+import os
+import traceback
+
+from main.importer.rows import parse_recipe_row, OffsetLineReader
+
+
+# Sent through the queue in place of a batch when a worker fails
+class ShardError(object):
+	def __init__(self, message):
+		self.message = message
+
+
+# Worker: parse the rows starting inside [begin, end) and put them on the queue in batches
+def parse_shard(path, begin, end, parse_row, delimiter, batch_size, queue):
+	try:
+		with open(path, 'rb') as f:
+			# Skip to the first line starting at or after begin, the previous shard owns the rest
+			if begin > 0:
+				f.seek(begin - 1)
+				f.readline()
+			lines = OffsetLineReader(f)
+			reader = csv.reader(lines, delimiter=delimiter, quotechar='"')
+
+			batch = []
+			while lines.offset < end:
+				row = next(reader, None)
+				if row is None:
+					break
+				batch.append(parse_row(row))
+				if len(batch) >= batch_size:
+					queue.put(batch)
+					batch = []
+			if batch:
+				queue.put(batch)
+	except Exception:
+		queue.put(ShardError(traceback.format_exc()))
+	queue.put(None)
+
+
+class ParallelImport(object):
+	"""
+	Parses byte-range shards of a csv in a pool of worker processes and feeds the
+	normalized batches through a bounded queue to a single writer in this process.
+
+	Shards are aligned on line starts, so every record must fit on one line (true
+	for the bundled Yummly exports). There's no checkpointing since shards finish
+	out of order; use StreamingImport when a run needs to be resumable.
+	"""
+
+	def __init__(self, path, writer, parse_row=parse_recipe_row, workers=None, chunk_size=1000, delimiter=',', has_header=True, queue_size=None):
+		self.path = path
+		self.writer = writer
+		self.parse_row = parse_row
+		self.workers = workers or multiprocessing.cpu_count()
+		self.chunk_size = chunk_size
+		self.delimiter = delimiter
+		self.has_header = has_header
+		self.queue_size = queue_size or 2 * self.workers
+		self.rows_written = 0
+
+	# Byte ranges covering the file after the header, one per worker
+	def shards(self):
+		with open(self.path, 'rb') as f:
+			if self.has_header:
+				f.readline()
+			start = f.tell()
+		size = os.path.getsize(self.path)
+		step = max(1, (size - start) // self.workers + 1)
+		return [(begin, min(begin + step, size)) for begin in range(start, size, step)]
+
+	def run(self, progress=None):
+		# Forked workers only parse and exit without closing the inherited database connection
+		context = multiprocessing.get_context('fork')
+		queue = context.Queue(maxsize=self.queue_size)
+		processes = [
+			context.Process(target=parse_shard, args=(self.path, begin, end, self.parse_row, self.delimiter, self.chunk_size, queue))
+			for begin, end in self.shards()
+		]
+		for process in processes:
+			process.daemon = True
+			process.start()
+
+		try:
+			finished = 0
+			while finished < len(processes):
+				batch = queue.get()
+				if batch is None:
+					finished += 1
+				elif isinstance(batch, ShardError):
+					raise RuntimeError("Parsing {} failed:\n{}".format(self.path, batch.message))
+				else:
+					self.writer.write(batch)
+					self.rows_written += len(batch)
+					if progress:
+						progress(self.rows_written)
+		finally:
+			for process in processes:
+				if process.is_alive():
+					process.terminate()
+				process.join()
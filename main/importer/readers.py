@@ -0,0 +1,124 @@
+import ast
+import csv
+import re
+
+from main.models import FLAVORS
+from main.importer.rows import parse_recipe_row, with_content_hash
+
+
+# Recipe name from a yummly id, ex: Tomato_-Onion_-And-Herb-Omelet-1939451 -> Tomato Onion And Herb Omelet
+def name_from_yummly_id(yummly_id):
+	return re.sub(r'-\d+$', '', yummly_id).replace('_', '').replace('-', ' ')
+
+
+class CsvFormat(object):
+	"""
+	One of the bundled csv file shapes. Formats are detected from the first line
+	of a file and turn each csv row into a record: a dict of Recipe fields for
+	recipe files, or the raw row of yummly ids for recommendation files.
+	"""
+	name = None
+	kind = 'recipes'
+	delimiter = ','
+	header = None # Column names of the first row, None when the file has no header row
+
+	@property
+	def has_header(self):
+		return self.header is not None
+
+	def matches(self, first_row):
+		return self.header is not None and tuple(first_row) == self.header
+
+	def parse_row(self, row):
+		raise NotImplementedError
+
+	# Keyword arguments for StreamingImport and ParallelImport
+	def reader_options(self):
+		return {'parse_row': self.parse_row, 'delimiter': self.delimiter, 'has_header': self.has_header}
+
+
+# final_recipes*.csv and salty_recipes*.csv
+class RecipeExportFormat(CsvFormat):
+	name = 'recipe export'
+	header = ('id',) + FLAVORS + ('ingredients', 'recipeName', 'smallImageUrls', 'totalTimeInSeconds', 'rating', 'sourceDisplayName')
+
+	def parse_row(self, row):
+		return parse_recipe_row(row)
+
+
+# garlic_ingredients.csv: flavors and space separated ingredients, keyed by yummly id
+class FlavorIngredientsFormat(CsvFormat):
+	name = 'flavor and ingredients'
+	header = ('name',) + FLAVORS + ('ingredients',)
+
+	def parse_row(self, row):
+		record = {flavor: float(value or 0) for flavor, value in zip(FLAVORS, row[1:7])}
+		record.update({
+			'yummly_url':       row[0],
+			'name':             name_from_yummly_id(row[0]),
+			'ingredient_list':  row[7].lower(),
+			'is_yummly_recipe': True,
+		})
+		return with_content_hash(record)
+
+
+# yummly_recipe_data.csv: pipe delimited Yummly API dump without a header,
+# columns: id|name|source|rating|totalTimeInSeconds|flavors dict|ingredients list
+class YummlyApiFormat(CsvFormat):
+	name = 'yummly api'
+	delimiter = '|'
+
+	def matches(self, first_row):
+		return len(first_row) == 7 and first_row[3].isdigit()
+
+	def parse_row(self, row):
+		flavors = ast.literal_eval('{' + row[5] + '}') if row[5] != 'None' else {}
+		ingredients = ast.literal_eval('[' + row[6] + ']')
+
+		record = {flavor: float(flavors.get(flavor, 0)) for flavor in FLAVORS}
+		record.update({
+			'yummly_url':       row[0],
+			'name':             row[1],
+			'yummly_source':    row[2],
+			'yummly_rating':    int(float(row[3] or 0)),
+			'yummly_time_in_seconds': int(float(row[4] or 0)),
+			# Same convention as the exports: lowercase, hyphens between words, spaces between ingredients
+			'ingredient_list':  ' '.join('-'.join(name.lower().split()) for name in ingredients),
+			'is_yummly_recipe': True,
+		})
+		return with_content_hash(record)
+
+
+# final_recommendations*.csv and id_recc_pairing*.csv: a yummly id followed by its recommended ids
+class RecommendationFormat(CsvFormat):
+	name = 'recommendations'
+	kind = 'recommendations'
+	header = ('id', 'recc tuple')
+
+	def parse_row(self, row):
+		return row
+
+
+FORMATS = [RecipeExportFormat(), FlavorIngredientsFormat(), YummlyApiFormat(), RecommendationFormat()]
+
+
+# Pick the format whose delimiter and header (or column layout) match the first line of the file
+def detect_format(path):
+	with open(path, 'r', newline='', encoding='utf-8') as f:
+		first_line = f.readline()
+	for csv_format in FORMATS:
+		row = next(csv.reader([first_line], delimiter=csv_format.delimiter, quotechar='"'), [])
+		if csv_format.matches([column.strip() for column in row]):
+			return csv_format
+	raise ValueError("Unrecognized csv format: {}".format(path))
+
+
+# Records of a csv file, in file order
+def read_records(path, csv_format=None):
+	csv_format = csv_format or detect_format(path)
+	with open(path, 'r', newline='', encoding='utf-8') as f:
+		reader = csv.reader(f, delimiter=csv_format.delimiter, quotechar='"')
+		if csv_format.has_header:
+			next(reader, None)
+		for row in reader:
+			yield csv_format.parse_row(row)
@@ -0,0 +1,50 @@
+from django.db import transaction
+
+from main.models import Recipe
+
+
+class RecommendationLinker(object):
+	"""
+	Links related_recipes from rows of (yummly id, recommended yummly id, ...).
+
+	All yummly ids are resolved against one yummly_url -> pk map, and the through
+	table pairs are collected up front and written with batched inserts. Ids that
+	aren't in the database are skipped and counted rather than aborting the run.
+	"""
+	max_related = 4 # Recommendations used per row
+
+	def __init__(self, batch_size=1000):
+		self.batch_size = batch_size
+		self.recipe_ids = dict(Recipe.objects.exclude(yummly_url='').values_list('yummly_url', 'id'))
+		self.pairs = set()
+		self.rows_linked = 0
+		self.missing_ids = 0
+
+	def add_rows(self, rows):
+		for row in rows:
+			recipe_id = self.recipe_ids.get(row[0])
+			if recipe_id is None:
+				self.missing_ids += 1
+				continue
+
+			for yummly_id in row[1:self.max_related+1]:
+				related_id = self.recipe_ids.get(yummly_id)
+				if related_id is None:
+					self.missing_ids += 1
+				elif related_id != recipe_id:
+					self.pairs.add((recipe_id, related_id)) # related_recipes is one way, like save_related_recipes writes it
+			self.rows_linked += 1
+
+	# Write all collected pairs that aren't linked yet, returns number of through rows created
+	def save(self):
+		Through = Recipe.related_recipes.through
+		existing = set(Through.objects.values_list('from_recipe_id', 'to_recipe_id'))
+		new_pairs = sorted(self.pairs.difference(existing))
+
+		with transaction.atomic():
+			for i in range(0, len(new_pairs), self.batch_size):
+				Through.objects.bulk_create([
+					Through(from_recipe_id=from_id, to_recipe_id=to_id)
+					for from_id, to_id in new_pairs[i:i+self.batch_size]
+				])
+		return len(new_pairs)
@@ -0,0 +1,33 @@
+from django.core.management.color import no_style
+from django.db import connection, models, transaction
+
+from main.models import Recipe, Ingredient, Profile, FlavorProfile
+
+
+# Tables holding recipes, ingredients and every row that points at them (through tables and cascading foreign keys)
+def recipe_tables():
+	tables = set()
+	for model in (Recipe, Ingredient):
+		tables.add(model._meta.db_table)
+		for field in model._meta.many_to_many:
+			tables.add(field.remote_field.through._meta.db_table)
+		for related in model._meta.related_objects:
+			if related.many_to_many:
+				tables.add(related.through._meta.db_table)
+			elif related.on_delete is models.CASCADE:
+				tables.add(related.related_model._meta.db_table)
+	tables.add(FlavorProfile._meta.db_table) # Sums over the recipes' flavors, rebuilt on the next read
+	return sorted(tables)
+
+
+# Delete all recipes and ingredients with one set-based statement per table (TRUNCATE on PostgreSQL).
+# Every profile's feed goes with them, so they're all marked stale to be recomputed on the next visit.
+def reset_recipe_data():
+	tables = recipe_tables()
+	statements = connection.ops.sql_flush(no_style(), tables, [])
+	with transaction.atomic():
+		with connection.cursor() as cursor:
+			for sql in statements:
+				cursor.execute(sql)
+		Profile.objects.update(recommendations_stale=True)
+	return tables
@@ -0,0 +1,66 @@
+from itertools import islice
+import hashlib
+
+
+# Columns: id,bitter,meaty,salty,sour,sweet,piquant,ingredients,recipeName,smallImageUrls,totalTimeInSeconds,rating,sourceDisplayName
+def parse_recipe_row(row):
+	# If image url is http:, change to https:
+	image_url = row[9].split(' ')[0]
+	if image_url[:5] == 'http:':
+		image_url = "{}s{}".format(image_url[:4], image_url[4:])
+
+	return with_content_hash({
+		'yummly_url':       row[0],
+		'bitter':           float(row[1] or 0),
+		'meaty':            float(row[2] or 0),
+		'salty':            float(row[3] or 0),
+		'sour':             float(row[4] or 0),
+		'sweet':            float(row[5] or 0),
+		'piquant':          float(row[6] or 0),
+		'ingredient_list':  row[7].lower(),
+		'name':             row[8],
+		'yummly_image_url': image_url,
+		'yummly_rating':    int(float(row[11] or 0)),
+		'yummly_source':    row[12],
+		'is_yummly_recipe': True,
+	})
+
+
+# Add a hash of a parsed record's fields, so re-imports can tell whether a recipe changed
+def with_content_hash(record):
+	content = '\x1f'.join('{}={!r}'.format(key, record[key]) for key in sorted(record) if key != 'content_hash')
+	record['content_hash'] = hashlib.sha1(content.encode('utf-8')).hexdigest()
+	return record
+
+
+# Split an iterable into lists of at most size items
+def chunked(iterable, size):
+	iterator = iter(iterable)
+	while True:
+		chunk = list(islice(iterator, size))
+		if not chunk:
+			return
+		yield chunk
+
+
+# Iterates the decoded lines of a binary file while tracking the byte offset read so far.
+# csv.reader pulls exactly the lines of each record, so after a row the offset is the start of the next one.
+class OffsetLineReader(object):
+	def __init__(self, f, encoding='utf-8'):
+		self.f = f
+		self.encoding = encoding
+		self.offset = f.tell()
+
+	def __iter__(self):
+		return self
+
+	def __next__(self):
+		line = self.f.readline()
+		if not line:
+			raise StopIteration
+		self.offset += len(line)
+		return line.decode(self.encoding)
+
+	def seek(self, offset):
+		self.f.seek(offset)
+		self.offset = offset
@@ -0,0 +1,60 @@
+import csv
+import os
+
+from django.db import transaction
+
+from main.models import ImportCheckpoint
+from main.importer.rows import parse_recipe_row, chunked, OffsetLineReader
+
+
+class StreamingImport(object):
+	"""
+	Streams a csv file into a writer in fixed-size chunks, committing each chunk
+	together with an ImportCheckpoint holding the byte offset and row number of
+	the next row. An interrupted run can then resume where its last commit ended.
+	"""
+
+	def __init__(self, path, writer, parse_row=parse_recipe_row, chunk_size=1000, delimiter=',', has_header=True):
+		self.path = path
+		self.source = os.path.abspath(path)
+		self.writer = writer
+		self.parse_row = parse_row
+		self.chunk_size = chunk_size
+		self.delimiter = delimiter
+		self.has_header = has_header
+		self.rows_written = 0
+
+	# Checkpoint of an unfinished earlier run, if any
+	def pending_checkpoint(self):
+		return ImportCheckpoint.objects.filter(source=self.source, completed=False).first()
+
+	# Import the file, from the start or from the last checkpoint. progress is called after each committed chunk.
+	def run(self, resume=False, progress=None):
+		checkpoint, created = ImportCheckpoint.objects.get_or_create(source=self.source)
+		if not resume:
+			checkpoint.byte_offset, checkpoint.row_number, checkpoint.completed = 0, 0, False
+			checkpoint.save()
+		elif checkpoint.completed:
+			return checkpoint
+
+		with open(self.path, 'rb') as f:
+			lines = OffsetLineReader(f)
+			reader = csv.reader(lines, delimiter=self.delimiter, quotechar='"')
+			if self.has_header:
+				next(reader, None)
+			if checkpoint.byte_offset > lines.offset:
+				lines.seek(checkpoint.byte_offset)
+
+			for chunk in chunked(reader, self.chunk_size):
+				with transaction.atomic():
+					self.writer.write([self.parse_row(row) for row in chunk])
+					checkpoint.byte_offset = lines.offset
+					checkpoint.row_number += len(chunk)
+					checkpoint.save()
+				self.rows_written += len(chunk)
+				if progress:
+					progress(checkpoint)
+
+		checkpoint.completed = True
+		checkpoint.save()
+		return checkpoint
@@ -0,0 +1,152 @@
+from collections import defaultdict, deque
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from main.models import Recipe, Ingredient
+
+
+# Saves each parsed row through Recipe.save(), so the post_save signal links its ingredients
+class RecipeWriter(object):
+	def __init__(self):
+		self.recipes_created = 0
+
+	def write(self, records):
+		with transaction.atomic():
+			for record in records:
+				Recipe(**record).save()
+		self.recipes_created += len(records)
+		return len(records)
+
+
+class BulkRecipeWriter(object):
+	"""
+	Writes parsed recipe rows with batched inserts, one transaction per chunk.
+
+	Ingredients are resolved against an in-memory raw_name -> id map loaded once,
+	and rows are inserted with bulk_create, so the Recipe post_save signal (and its
+	per-ingredient queries) never fires.
+	"""
+
+	def __init__(self, batch_size=500):
+		self.batch_size = batch_size
+		self.ingredient_ids = dict(Ingredient.objects.values_list('raw_name', 'id'))
+		self.recipes_created = 0
+		self.ingredients_created = 0
+		self.changed_ids = [] # Recipes created or updated, for indexes the save signal would have kept current
+
+	# Write one chunk of parsed rows (dicts of Recipe fields) atomically
+	def write(self, records):
+		with transaction.atomic():
+			recipes = self._create_recipes(records)
+			self._link_ingredients(recipes)
+		return len(recipes)
+
+	def _create_recipes(self, records):
+		now = timezone.now()
+		recipes = [Recipe(date_created=now, date_modified=now, **record) for record in records]
+		Recipe.objects.bulk_create(recipes, batch_size=self.batch_size)
+
+		# Only some backends hand back primary keys from a bulk insert
+		# (rows are inserted in order, so repeated urls get their ids in ascending order)
+		if not connection.features.can_return_ids_from_bulk_insert:
+			ids = defaultdict(deque)
+			urls = sorted(set(r.yummly_url for r in recipes))
+			for i in range(0, len(urls), self.batch_size):
+				for url, pk in Recipe.objects.filter(yummly_url__in=urls[i:i+self.batch_size], date_created=now).order_by('id').values_list('yummly_url', 'id'):
+					ids[url].append(pk)
+			for recipe in recipes:
+				recipe.id = ids[recipe.yummly_url].popleft()
+
+		self.recipes_created += len(recipes)
+		self.changed_ids.extend(recipe.id for recipe in recipes)
+		return recipes
+
+	# Link ingredients for recipes whose ingredient through rows don't exist yet
+	def _link_ingredients(self, recipes):
+		names_by_recipe = [(r.id, Recipe.split_ingredient_list(r.ingredient_list)) for r in recipes]
+		self._create_missing_ingredients(set(n for _, names in names_by_recipe for n in names))
+
+		Through = Recipe.ingredients.through
+		Through.objects.bulk_create([
+			Through(recipe_id=recipe_id, ingredient_id=self.ingredient_ids[name])
+			for recipe_id, names in names_by_recipe for name in names
+		], batch_size=self.batch_size)
+
+	def _create_missing_ingredients(self, names):
+		missing = sorted(names.difference(self.ingredient_ids))
+		if not missing:
+			return
+		Ingredient.objects.bulk_create([
+			Ingredient(raw_name=name, name=Ingredient.format_name(name)) for name in missing
+		], batch_size=self.batch_size)
+		for i in range(0, len(missing), self.batch_size):
+			self.ingredient_ids.update(Ingredient.objects.filter(raw_name__in=missing[i:i+self.batch_size]).values_list('raw_name', 'id'))
+		self.ingredients_created += len(missing)
+
+
+class UpsertRecipeWriter(BulkRecipeWriter):
+	"""
+	Incremental variant of BulkRecipeWriter keyed on yummly_url.
+
+	Each row's content_hash is compared with the stored one: new recipes are bulk
+	inserted, changed ones are updated in place and unchanged ones skipped. Existing
+	recipes keep their pk, so users' saved, liked and disliked links survive.
+	"""
+
+	def __init__(self, batch_size=500):
+		super(UpsertRecipeWriter, self).__init__(batch_size)
+		self.recipes_updated = 0
+		self.recipes_unchanged = 0
+		self.seen_urls = set()
+
+	def write(self, records):
+		with transaction.atomic():
+			existing = self._existing_recipes(set(record['yummly_url'] for record in records))
+			new_records, changed = {}, {}
+			for record in records:
+				url = record['yummly_url']
+				self.seen_urls.add(url)
+				if url not in existing:
+					new_records[url] = record # Last row wins when a url repeats
+				elif existing[url][1] != record['content_hash']:
+					changed[existing[url][0]] = record
+				else:
+					self.recipes_unchanged += 1
+
+			recipes = self._create_recipes(list(new_records.values()))
+			self._link_ingredients(recipes)
+			self._update_recipes(changed)
+		return len(recipes) + len(changed)
+
+	# yummly_url -> (pk, content_hash) of the yummly recipes already in the database
+	def _existing_recipes(self, urls):
+		urls = sorted(urls)
+		existing = {}
+		for i in range(0, len(urls), self.batch_size):
+			for pk, url, content_hash in Recipe.objects.filter(is_yummly_recipe=True, yummly_url__in=urls[i:i+self.batch_size]).values_list('id', 'yummly_url', 'content_hash'):
+				existing[url] = (pk, content_hash)
+		return existing
+
+	# Update changed rows in place (one query each) and relink their ingredients
+	def _update_recipes(self, changed):
+		if not changed:
+			return
+		now = timezone.now()
+		for pk, record in changed.items():
+			Recipe.objects.filter(pk=pk).update(date_modified=now, **record)
+
+		ids = list(changed)
+		for i in range(0, len(ids), self.batch_size):
+			Recipe.ingredients.through.objects.filter(recipe_id__in=ids[i:i+self.batch_size]).delete()
+		self._link_ingredients([Recipe(id=pk, ingredient_list=record['ingredient_list']) for pk, record in changed.items()])
+		self.recipes_updated += len(changed)
+		self.changed_ids.extend(changed)
+
+	# Delete yummly recipes that weren't in any row written by this writer, returns how many were retired
+	def retire_missing(self):
+		missing = [pk for pk, url in Recipe.objects.filter(is_yummly_recipe=True).values_list('id', 'yummly_url').iterator() if url not in self.seen_urls]
+		with transaction.atomic():
+			for i in range(0, len(missing), self.batch_size):
+				Recipe.objects.filter(id__in=missing[i:i+self.batch_size]).delete()
+		return len(missing)
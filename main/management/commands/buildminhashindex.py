@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from main.recommender.features import RecipeFeatures
+from main.recommender.minhash import MinHashIndex
+
+import time
+
+
+
+class Command(BaseCommand):
+	help = 'Rebuilds the MinHash/LSH index of recipe ingredient sets'
+
+
+	# Main method when command is called
+	def handle(self, *args, **options):
+		start_time = time.time()
+		features = RecipeFeatures.load()
+		indexed = MinHashIndex().rebuild(features)
+		self.stdout.write(self.style.SUCCESS('Finished indexing {} of {} recipes (took {:.1f} seconds).'\
+			.format(indexed, len(features), time.time()-start_time) ))
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from main.recommender.interactions import Interactions
+from main.recommender.collaborative import ItemItemSimilarity
+from main.recommender.related import save_collaborative_neighbours
+from main.recommender.profiling import peak_rss_mb
+
+import time
+
+
+
+class Command(BaseCommand):
+	help = 'Computes item-item collaborative neighbours from liked, saved and disliked recipes'
+
+
+	def add_arguments(self, parser):
+		parser.add_argument('--k', type=int, default=10, help='Neighbours stored per recipe')
+		parser.add_argument('--block-size', type=int, default=1024, help='Recipes scored at a time')
+		parser.add_argument('--like-weight', type=float, default=1.0)
+		parser.add_argument('--save-weight', type=float, default=1.0)
+		parser.add_argument('--dislike-weight', type=float, default=-1.0)
+
+
+	# Main method when command is called
+	def handle(self, *args, **options):
+		if options['k'] < 1:
+			raise CommandError("--k must be at least 1.")
+
+		start_time = time.time()
+		interactions = Interactions.load({
+			'liked_recipes': options['like_weight'],
+			'saved_recipes': options['save_weight'],
+			'disliked_recipes': options['dislike_weight'],
+		})
+		shape = interactions.matrix.shape
+		density = len(interactions) / max(shape[0] * shape[1], 1)
+		print('Scoring {} recipes from {} interactions of {} users ({:.4%} dense)...'.format(shape[1], len(interactions), shape[0], density))
+
+		similarity = ItemItemSimilarity(interactions)
+		links = save_collaborative_neighbours(similarity.top_k(options['k'], options['block_size']))
+		self.stdout.write(self.style.SUCCESS('Finished computing collaborative neighbours: {} links for {} recipes (took {:.1f} seconds, peak RSS {:.0f} MB).'\
+			.format(links, shape[1], time.time()-start_time, peak_rss_mb()) ))
@@ -0,0 +1,70 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.models import User
+
+from main.models import Recipe
+from main.recommender.walk import InteractionGraph, RandomWalk, WalkRecommendations
+from main.recommender.artifacts import artifact_root
+from main.recommender.registry import save_version
+from main.recommender.profiling import peak_rss_mb
+
+import time
+
+
+
+class Command(BaseCommand):
+	help = 'Recommends recipes with a personalized random walk over users, recipes and ingredients'
+
+
+	def add_arguments(self, parser):
+		parser.add_argument('--k', type=int, default=20, help='Recipes kept per user')
+		parser.add_argument('--restart', type=float, default=0.3, help='Probability of jumping back to the user at each step')
+		parser.add_argument('--tolerance', type=float, default=1e-6, help='Stop once a step moves less than this much probability mass')
+		parser.add_argument('--max-iterations', type=int, default=50)
+		parser.add_argument('--batch-size', type=int, default=256, help='Users walked at once in batch mode')
+		parser.add_argument('--user', help='Only print the recommendations of this username instead of saving a batch for everyone')
+		parser.add_argument('--no-publish', action='store_true', help='Save the new version without making it live (see recommendermodels publish)')
+
+
+	# Main method when command is called
+	def handle(self, *args, **options):
+		if not 0 < options['restart'] < 1:
+			raise CommandError("--restart must be between 0 and 1.")
+
+		start_time = time.time()
+		graph = InteractionGraph.load()
+		walk = RandomWalk(graph, options['restart'], options['tolerance'], options['max_iterations'])
+		print('Loaded a graph of {} nodes and {} edges in {:.1f} seconds.'.format(len(graph), graph.transition.nnz, time.time() - start_time))
+
+		if options['user']:
+			self.recommend_one(walk, options)
+		else:
+			self.recommend_all(walk, options)
+
+
+	# On-demand mode for a single user
+	def recommend_one(self, walk, options):
+		try:
+			profile = User.objects.get(username=options['user']).profile
+		except User.DoesNotExist:
+			raise CommandError("No user named {}.".format(options['user']))
+
+		start_time = time.time()
+		result = walk.recommend(profile.id, options['k'], exclude=profile.disliked_recipes.values_list('id', flat=True))
+		if result is None:
+			raise CommandError("{} has no liked or saved recipes to start from.".format(options['user']))
+		recipe_ids, scores = result
+		names = Recipe.objects.in_bulk([int(recipe_id) for recipe_id in recipe_ids])
+		for recipe_id, score in zip(recipe_ids, scores):
+			self.stdout.write('{:.6f}  {}'.format(score, names[int(recipe_id)]))
+		self.stdout.write(self.style.SUCCESS('Converged in {} iterations ({:.3f} seconds).'.format(walk.iterations, time.time() - start_time)))
+
+
+	# Batch mode, saved as a new version under RECOMMENDER_ARTIFACT_DIR/walk for the home feed
+	def recommend_all(self, walk, options):
+		start_time = time.time()
+		meta = {key: options[key] for key in ('k', 'restart', 'tolerance', 'max_iterations')}
+		recommendations = WalkRecommendations.from_rows(walk.recommend_all(options['k'], options['batch_size']), meta)
+		recommendations.meta.update({'seconds': time.time() - start_time, 'peak_rss_mb': peak_rss_mb()})
+		directory = save_version(recommendations.save, artifact_root('walk'), live=not options['no_publish'])
+		self.stdout.write(self.style.SUCCESS('Saved random walk recommendations for {} users to {} (took {:.1f} seconds).'\
+			.format(len(recommendations.profile_ids), directory, time.time() - start_time) ))
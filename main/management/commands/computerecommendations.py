@@ -0,0 +1,104 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from main.recommender.features import RecipeFeatures
+from main.recommender.similarity import ContentSimilarity
+from main.recommender.related import save_related_recipes
+from main.recommender.parallel import ParallelTopK
+from main.recommender.flavor import FlavorIndex
+from main.recommender.snapshot import RecommenderSnapshot, snapshot_root
+from main.recommender.registry import save_version
+from main.recommender.profiling import peak_rss_mb, peak_children_rss_mb
+
+import numpy as np
+import time
+
+
+
+class Command(BaseCommand):
+	help = 'Computes related recipes from flavors and ingredients'
+
+
+	def add_arguments(self, parser):
+		parser.add_argument('--k', type=int, default=4, help='Related recipes stored per recipe')
+		parser.add_argument('--block-size', type=int, default=1024, help='Recipes scored against the catalog at a time')
+		parser.add_argument('--shard-size', type=int, default=0, help='Catalog columns scored per step, bounds memory to block x shard scores (0 for the whole catalog)')
+		parser.add_argument('--workers', type=int, default=1, help='Score the catalog in N processes sharing a read-only copy of it')
+		parser.add_argument('--flavor-snapshot', help='Also write the flavor nearest neighbour index to this .npz file')
+		parser.add_argument('--snapshot', action='store_true', help='Write the related recipes to a memory-mapped serving snapshot for the web workers instead of the related_recipes table')
+		parser.add_argument('--no-publish', action='store_true', help='Save the new snapshot without making it live (see recommendermodels publish)')
+		parser.add_argument('--flavor-weight', type=float, default=0.5, help='Weight of flavor similarity, the rest goes to ingredients')
+		parser.add_argument('--diversity', type=float, default=None, help='MMR tradeoff between relevance and variety, 1 keeps the plain top k (default RECOMMENDATION_DIVERSITY)')
+		parser.add_argument('--pool', type=int, default=None, help='Candidates per recipe that MMR picks the k from (default 3k)')
+
+
+	# Main method when command is called
+	def handle(self, *args, **options):
+		if not 0 <= options['flavor_weight'] <= 1:
+			raise CommandError("--flavor-weight must be between 0 and 1.")
+		if options['diversity'] is None:
+			options['diversity'] = getattr(settings, 'RECOMMENDATION_DIVERSITY', 0.7)
+		if not 0 <= options['diversity'] <= 1:
+			raise CommandError("--diversity must be between 0 and 1.")
+		if options['no_publish'] and not options['snapshot']:
+			raise CommandError("--no-publish needs --snapshot, the related_recipes table is live as soon as it's written.")
+
+		start_time = time.time()
+		features = RecipeFeatures.load()
+		print('Scoring {} recipes with {} ingredients...'.format(len(features), features.ingredients.shape[1]), end='', flush=True)
+
+		similarity = ContentSimilarity(features, flavor_weight=options['flavor_weight'])
+		k = max(0, min(options['k'], len(features) - 1))
+		score_time = time.time()
+		if options['workers'] > 1:
+			recipe_ids, neighbour_ids = self.score_parallel(similarity, k, options)
+		else:
+			recipe_ids, neighbour_ids = self.score(similarity, k, options)
+		score_time = time.time() - score_time
+		print("")
+
+		if not len(features):
+			self.stdout.write(self.style.WARNING('No recipes to score.'))
+			return
+		if options['snapshot']:
+			# The live snapshot serves related recipes, the table is left as it is: a new snapshot reaches
+			# users once published, and rolling back restores the lists along with it
+			positions = features.index_of(recipe_ids)
+			snapshot = RecommenderSnapshot.from_neighbours(recipe_ids, features.flavors[positions], neighbour_ids)
+			directory = save_version(snapshot.save, snapshot_root(), live=not options['no_publish'])
+			links = len(snapshot.neighbour_ids)
+			self.stdout.write('Wrote snapshot generation {} to {}{}.'.format(snapshot.generation, directory, ' (not published)' if options['no_publish'] else ''))
+		else:
+			links = save_related_recipes(recipe_ids, neighbour_ids)
+		if options['flavor_snapshot']:
+			FlavorIndex(features.ids, features.flavors).save(options['flavor_snapshot'])
+		self.stdout.write('Scored {} pairs in {:.1f} seconds ({:.0f} pairs/sec), peak RSS {:.0f} MB.'\
+			.format(len(features) ** 2, score_time, len(features) ** 2 / max(score_time, 1e-6), peak_rss_mb()))
+		if options['workers'] > 1:
+			# Worker RSS counts the shared mapped catalog pages in every worker, so the sum overstates the box's use
+			worker_rss = self.worker_rss_mb.values()
+			self.stdout.write('Worker peak RSS: {:.0f} MB at most, {:.0f} MB summed over {} workers.'\
+				.format(max(list(worker_rss) + [peak_children_rss_mb()]), sum(worker_rss), len(worker_rss)))
+		self.stdout.write(self.style.SUCCESS('Finished computing related recipes: {} links for {} recipes (took {:.1f} seconds).'\
+			.format(links, len(features), time.time()-start_time) ))
+
+
+	def score(self, similarity, k, options):
+		neighbour_ids = np.empty((len(similarity), k), dtype=np.int64)
+		for rows, neighbours, scores in similarity.top_k(k, options['block_size'], options['shard_size'],
+				tradeoff=options['diversity'], pool=options['pool']):
+			neighbour_ids[rows] = similarity.ids[neighbours]
+			print('.', end='', flush=True)
+		return similarity.ids, neighbour_ids
+
+	def score_parallel(self, similarity, k, options):
+		pipeline = ParallelTopK(similarity, workers=options['workers'])
+		self.worker_rss_mb = pipeline.worker_rss_mb
+		recipe_ids, neighbour_ids = [], []
+		for ids, neighbours in pipeline.run(k, options['block_size'], options['shard_size'], options['diversity'], options['pool']):
+			recipe_ids.append(ids)
+			neighbour_ids.append(neighbours)
+			print('.', end='', flush=True)
+		if not recipe_ids:
+			return similarity.ids, np.empty((0, k), dtype=np.int64)
+		return np.concatenate(recipe_ids), np.concatenate(neighbour_ids)
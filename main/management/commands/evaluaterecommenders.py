@@ -0,0 +1,75 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime, parse_date
+
+from main.models import Recipe
+from main.recommender.evaluation import TimeSplit, RECOMMENDERS, evaluate
+
+import datetime
+import json
+from collections import OrderedDict
+
+
+
+class Command(BaseCommand):
+	help = 'Compares recommenders offline on a time split of the votes: precision, recall, coverage, latency, training time and memory'
+
+
+	def add_arguments(self, parser):
+		parser.add_argument('recommenders', nargs='*', help='Recommenders to run, all of them ({}) when left out'.format(', '.join(RECOMMENDERS)))
+		parser.add_argument('--k', type=int, default=10, help='Cutoff of precision, recall and coverage')
+		parser.add_argument('--holdout', type=float, default=0.2, help='Share of the latest votes held out, when --cutoff isn\'t given')
+		parser.add_argument('--cutoff', help='Hold out the votes from this date or datetime on (ex: 2017-05-01)')
+		parser.add_argument('--output', help='Write the JSON report to this file instead of stdout')
+
+
+	# Main method when command is called
+	def handle(self, *args, **options):
+		names = options['recommenders'] or list(RECOMMENDERS)
+		unknown = [name for name in names if name not in RECOMMENDERS]
+		if unknown:
+			raise CommandError("Unknown recommenders: {}. Choose from {}.".format(', '.join(unknown), ', '.join(RECOMMENDERS)))
+		if options['k'] < 1:
+			raise CommandError("--k must be at least 1.")
+		if not 0 <= options['holdout'] < 1:
+			raise CommandError("--holdout must be at least 0 and below 1.")
+
+		split = TimeSplit.load(options['holdout'], self.parse_cutoff(options['cutoff']))
+		if not split.heldout:
+			raise CommandError("No liked votes after the cutoff to evaluate on.")
+		catalog_size = Recipe.objects.count()
+
+		report = OrderedDict([
+			('k', options['k']),
+			('cutoff', split.cutoff.isoformat()),
+			('train_interactions', len(split.train)),
+			('heldout_users', len(split.heldout)),
+			('heldout_interactions', sum(len(recipes) for recipes in split.heldout.values())),
+			('catalog_size', catalog_size),
+			('recommenders', OrderedDict()),
+		])
+		for name in names:
+			self.stderr.write('Evaluating {}...'.format(name))
+			report['recommenders'][name] = evaluate(RECOMMENDERS[name](), split, options['k'], catalog_size)
+
+		output = json.dumps(report, indent=2)
+		if options['output']:
+			with open(options['output'], 'w') as f:
+				f.write(output + '\n')
+			self.stderr.write(self.style.SUCCESS('Wrote evaluation of {} recommenders to {}.'.format(len(names), options['output'])))
+		else:
+			self.stdout.write(output)
+
+
+	def parse_cutoff(self, value):
+		if not value:
+			return None
+		cutoff = parse_datetime(value)
+		if cutoff is None:
+			date = parse_date(value)
+			if date is None:
+				raise CommandError("--cutoff must be a date or datetime, ex: 2017-05-01.")
+			cutoff = datetime.datetime.combine(date, datetime.time())
+		if timezone.is_naive(cutoff):
+			cutoff = timezone.make_aware(cutoff)
+		return cutoff
@@ -1,9 +1,17 @@
 from django.core.management.base import BaseCommand, CommandError
 from django.core.exceptions import ObjectDoesNotExist
 
-from main.models import Recipe, Ingredient
-
-import csv
+from main.models import Recipe, Ingredient, ImportCheckpoint
+from main.importer.rows import chunked
+from main.importer.writers import RecipeWriter, BulkRecipeWriter, UpsertRecipeWriter
+from main.importer.stream import StreamingImport
+from main.importer.parallel import ParallelImport
+from main.importer.recommendations import RecommendationLinker
+from main.importer.reset import reset_recipe_data
+from main.importer.readers import detect_format, read_records
+from main.recommender.minhash import MinHashIndex
+
+import os
 import time
 
 
@@ -14,118 +22,158 @@ class Command(BaseCommand):
 	recommendation_file = 'data/final_recommendations_v2.csv'
 
 
+	def add_arguments(self, parser):
+		parser.add_argument('--recipe-file', default=self.recipe_file, help='Recipe csv to import')
+		parser.add_argument('--recommendation-file', default=self.recommendation_file, help='Recommendation csv to link')
+		parser.add_argument('--bulk', action='store_true', help='Import with batched inserts, bypassing the per-recipe save signal')
+		parser.add_argument('--chunk-size', type=int, default=1000, help='Rows committed per transaction and checkpoint')
+		parser.add_argument('--workers', type=int, default=1, help='Parse the csv in N processes feeding one writer (not resumable)')
+		group = parser.add_mutually_exclusive_group()
+		group.add_argument('--resume', action='store_true', help='Continue an interrupted import from its last checkpoint')
+		group.add_argument('--restart', action='store_true', help='Delete existing recipes and import from the first row')
+		group.add_argument('--append', action='store_true', help='Import every row next to the recipes already in the database')
+		parser.add_argument('--incremental', action='store_true', help='Insert new and update changed recipes by yummly id, skipping unchanged ones')
+		parser.add_argument('--retire-missing', action='store_true', help='With --incremental, delete yummly recipes missing from the file')
+		parser.add_argument('--skip-recipes', action='store_true', help='Only link recommendations')
+		parser.add_argument('--skip-recommendations', action='store_true', help='Only import recipes')
+
+
 	# Main method when command is called
 	def handle(self, *args, **options):
 		print("{} recipes exist in database.".format(Recipe.objects.count()))
 
-		choice = input("Delete existing recipes and import from {}? [y/n] ".format(self.recipe_file))
-		if choice == 'y':
-			self.delete_existing_recipes()
-			self.read_csv()
-
-		# If already chose to delete and import recipes, automatically perform recommendations. 
-		# If not, might want to just perform recommendations. 
-		if choice != 'y': 
-			choice = input("Import recommendations from {}? [y/n] ".format(self.recommendation_file))
-		if choice == 'y':
-			self.get_recommendations()
+		if not options['skip_recipes']:
+			self.import_recipes(options)
+		if not options['skip_recommendations'] and options['recommendation_file']:
+			self.get_recommendations(options['recommendation_file'])
+
+
+	# Detect which bundled csv shape a file has, and check it holds the expected kind of data
+	def get_format(self, path, kind):
+		try:
+			csv_format = detect_format(path)
+		except ValueError as e:
+			raise CommandError(str(e))
+		if csv_format.kind != kind:
+			raise CommandError("{} is a {} file, expected {}.".format(path, csv_format.name, kind))
+		return csv_format
+
+
+	# Import the recipe csv with the writer and pipeline picked by the options
+	def import_recipes(self, options):
+		writer = self.get_writer(options)
+		if options['workers'] > 1:
+			self.import_recipes_parallel(writer, options)
+		else:
+			self.import_recipes_streaming(writer, options)
+
+		if options['incremental']:
+			retired = writer.retire_missing() if options['retire_missing'] else 0
+			self.stdout.write(self.style.SUCCESS('{} recipes created, {} updated, {} unchanged, {} retired.'\
+				.format(writer.recipes_created, writer.recipes_updated, writer.recipes_unchanged, retired) ))
+
+		# Batched writers link ingredients without the save signal that keeps the index current
+		if not isinstance(writer, RecipeWriter) and writer.changed_ids:
+			start_time = time.time()
+			indexed = MinHashIndex().update_recipes(writer.changed_ids)
+			self.stdout.write(self.style.SUCCESS('Indexed {} of {} new or changed recipes (took {:.1f} seconds).'\
+				.format(indexed, len(writer.changed_ids), time.time()-start_time) ))
+
+
+	def get_writer(self, options):
+		if options['retire_missing'] and not options['incremental']:
+			raise CommandError("--retire-missing needs --incremental.")
+		if options['incremental']:
+			if options['restart']:
+				raise CommandError("--incremental keeps existing recipes, it can't be combined with --restart.")
+			if options['retire_missing'] and options['resume']:
+				raise CommandError("--retire-missing needs to see the whole file, it can't be combined with --resume.")
+			return UpsertRecipeWriter()
+		return BulkRecipeWriter() if options['bulk'] else RecipeWriter()
+
+
+	# Stream the recipe csv into the database, committing and checkpointing every chunk
+	def import_recipes_streaming(self, writer, options):
+		csv_format = self.get_format(options['recipe_file'], 'recipes')
+		stream = StreamingImport(options['recipe_file'], writer, chunk_size=options['chunk_size'], **csv_format.reader_options())
+
+		checkpoint = stream.pending_checkpoint()
+		if options['resume']:
+			if checkpoint is None:
+				raise CommandError("No unfinished import of {} to resume.".format(options['recipe_file']))
+			print('Resuming import of {} after row {}...'.format(options['recipe_file'], checkpoint.row_number), end='', flush=True)
+		else:
+			if checkpoint is not None and not options['restart']:
+				raise CommandError("An import of {} stopped after row {}, pass --resume to continue or --restart to start over."\
+					.format(options['recipe_file'], checkpoint.row_number))
+			self.check_fresh_import(options)
+			if options['restart']:
+				self.delete_existing_recipes()
+			print('Importing recipes from {} in chunks of {}...'.format(options['recipe_file'], options['chunk_size']), end='', flush=True)
 
-
-	# Read from csv file and create models in database 
-	def read_csv(self):
-		print('Creating recipes in database...', end='', flush=True)
 		start_time = time.time()
-		with open(self.recipe_file, 'r') as csvfile:
-			reader = csv.reader(csvfile, delimiter=',', quotechar='"')
-
-			headers = next(reader)
-
-			count = 0
-
-			# Columns: id,bitter,meaty,salty,sour,sweet,piquant,ingredients,recipeName,smallImageUrls,totalTimeInSeconds,rating,sourceDisplayName
-			for row in reader:
-				# If image url is http:, change to https:
-				image_url = row[9].split(' ')[0]
-				if image_url[:5] == 'http:':
-					image_url = "{}s{}".format(image_url[:4], image_url[4:])
-
-				r = Recipe()
-				r.yummly_url        = row[0]
-				r.bitter            = row[1]
-				r.meaty             = row[2]
-				r.salty             = row[3]
-				r.sour              = row[4]
-				r.sweet             = row[5]
-				r.piquant           = row[6]
-				r.ingredient_list   = row[7].lower()
-				r.name              = row[8]
-				r.yummly_image_url  = image_url 
-				# r.yummly_time_in_seconds   = row[10] if (row[10] != '') else 0
-				r.yummly_rating     = row[11]
-				r.yummly_source     = row[12]
-				r.is_yummly_recipe 	= True
-				r.save()
-
-				# For each ingredient in list, add to many to many field
-				# self.add_ingredients(r)
-				# Now managed in Recipe post_save method
-
-
-				count += 1
-				if count % 100 == 0:
-					print('.', end='', flush=True)
+		checkpoint = stream.run(resume=options['resume'], progress=lambda checkpoint: print('.', end='', flush=True))
 
+		elapsed = time.time() - start_time
 		print("")
-		self.stdout.write(self.style.SUCCESS('Finished importing {} into db: {} recipes, {} ingredients (took {} minutes).'\
-			.format(self.recipe_file, Recipe.objects.count(), Ingredient.objects.count(), int((time.time()-start_time)/60)) ))
+		self.stdout.write(self.style.SUCCESS('Finished importing {} into db: {} recipes in this run, {} rows total (took {:.1f} seconds, {:.0f} rows/sec).'\
+			.format(options['recipe_file'], stream.rows_written, checkpoint.row_number, elapsed, stream.rows_written / max(elapsed, 1e-6)) ))
 
 
-	# Delete existing values in DB, should change to prompt to confirm deletion
-	def delete_existing_recipes(self):
-		print("Deleting {} recipes".format(Recipe.objects.count()), end='', flush=True)
-		count = 0
-		for recipe in Recipe.objects.all():
-			recipe.delete()
-			count += 1
-			if count % 100 == 0: print('.', end='', flush=True)
-		print("")
+	# Parse the recipe csv on several cores, writing batches from this process as they arrive
+	def import_recipes_parallel(self, writer, options):
+		if options['resume']:
+			raise CommandError("Parallel imports aren't checkpointed, --resume needs --workers 1.")
+		self.check_fresh_import(options)
+		if options['restart']:
+			self.delete_existing_recipes()
+		print('Importing recipes from {} with {} workers...'.format(options['recipe_file'], options['workers']), end='', flush=True)
 
-		print("Deleting {} ingredients".format(Ingredient.objects.count()), end='', flush=True)
-		count = 0
-		for ingredient in Ingredient.objects.all():
-			ingredient.delete()
-			count += 1
-			if count % 100 == 0: print('.', end='', flush=True)
-		print("")
+		start_time = time.time()
+		csv_format = self.get_format(options['recipe_file'], 'recipes')
+		pipeline = ParallelImport(options['recipe_file'], writer, workers=options['workers'], chunk_size=options['chunk_size'], **csv_format.reader_options())
+		pipeline.run(progress=lambda rows: print('.', end='', flush=True))
 
+		elapsed = time.time() - start_time
+		print("")
+		self.stdout.write(self.style.SUCCESS('Finished importing {} into db: {} recipes (took {:.1f} seconds, {:.0f} rows/sec).'\
+			.format(options['recipe_file'], pipeline.rows_written, elapsed, pipeline.rows_written / max(elapsed, 1e-6)) ))
 
-	def get_recommendations(self):
-		print('Linking recommendations...', end='', flush=True)
-		start_time = time.time()
-		with open(self.recommendation_file, 'r') as csvfile:
-			reader = csv.reader(csvfile, delimiter=',', quotechar='"')
 
-			headers = next(reader)
+	# A plain import writes every row as a new recipe, refuse it when that would duplicate recipes
+	def check_fresh_import(self, options):
+		if options['restart'] or options['incremental'] or options['append']:
+			return
+		if ImportCheckpoint.objects.filter(source=os.path.abspath(options['recipe_file']), completed=True).exists():
+			reason = "{} was already imported".format(options['recipe_file'])
+		elif Recipe.objects.exists():
+			reason = "The database already has recipes"
+		else:
+			return
+		raise CommandError(reason + ", pass --restart to replace them, --incremental to update them by yummly id or --append to add the rows anyway.")
 
-			count = 0
 
-			for row in reader:
-				try:
-					currRecipe = Recipe.objects.get(yummly_url=row[0])
-					for i in range(1, 5):
-						relatedRecipe = Recipe.objects.get(yummly_url=row[i])
-						currRecipe.related_recipes.add(relatedRecipe)
-				except Recipe.DoesNotExist:
-					print("    - Couldn't find " + row[i])
-					return 
+	# Delete existing values in DB
+	def delete_existing_recipes(self):
+		print("Deleting {} recipes and {} ingredients...".format(Recipe.objects.count(), Ingredient.objects.count()))
+		reset_recipe_data()
 
 
-				count += 1
-				if count % 100 == 0:
-					print('.', end='', flush=True)
+	def get_recommendations(self, recommendation_file):
+		print('Linking recommendations...', end='', flush=True)
+		start_time = time.time()
+		linker = RecommendationLinker()
+		recommendation_format = self.get_format(recommendation_file, 'recommendations')
+		for chunk in chunked(read_records(recommendation_file, recommendation_format), 1000):
+			linker.add_rows(chunk)
+			print('.', end='', flush=True)
 
-			print("")
-			self.stdout.write(self.style.SUCCESS('Finished linking recommended recipes (took {} minutes).'.format(int((time.time()-start_time)/60)) ))
+		created = linker.save()
+		print("")
+		if linker.missing_ids:
+			self.stdout.write(self.style.WARNING('Skipped {} unknown recipe ids.'.format(linker.missing_ids)))
+		self.stdout.write(self.style.SUCCESS('Finished linking recommended recipes: {} rows, {} new links (took {:.1f} seconds).'\
+			.format(linker.rows_linked, created, time.time()-start_time) ))
 
 
 
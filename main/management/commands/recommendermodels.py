@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from main.recommender.registry import ModelRegistry, KINDS
+
+
+
+class Command(BaseCommand):
+	help = 'Lists recommender model versions, makes one live or rolls back to the previously live one'
+
+
+	def add_arguments(self, parser):
+		parser.add_argument('action', nargs='?', default='list', choices=('list', 'publish', 'rollback'))
+		parser.add_argument('kind', nargs='?', choices=KINDS, help='Model kind, all kinds are listed when left out')
+		parser.add_argument('version', nargs='?', help='Version to publish')
+
+
+	# Main method when command is called
+	def handle(self, *args, **options):
+		action, kind = options['action'], options['kind']
+		if action == 'list':
+			for kind in [kind] if kind else KINDS:
+				self.list(kind)
+			return
+
+		if not kind:
+			raise CommandError("Which kind of model to {}? One of: {}.".format(action, ', '.join(KINDS)))
+		registry = ModelRegistry.for_kind(kind)
+		try:
+			if action == 'publish':
+				if not options['version']:
+					raise CommandError("Which version to publish? Run 'recommendermodels list {}' to see them.".format(kind))
+				registry.publish(options['version'])
+				version = options['version']
+			else:
+				version = registry.rollback()
+		except ValueError as e:
+			raise CommandError(str(e))
+		self.stdout.write(self.style.SUCCESS('{} {} is live.'.format(kind, version)))
+
+
+	def list(self, kind):
+		registry = ModelRegistry.for_kind(kind)
+		live = registry.live()
+		self.stdout.write('{}:'.format(kind))
+		for version in registry.versions():
+			self.stdout.write('  {} {}'.format('*' if version == live else ' ', version))
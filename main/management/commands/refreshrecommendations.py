@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from main.models import Profile
+from main.recommender.feed import refresh_user_recommendations, FEED_SIZE
+from main.recommender.taste import rebuild_flavor_profile
+
+import time
+
+
+
+class Command(BaseCommand):
+	help = 'Regenerates the materialized home feed of users whose likes or dislikes changed. Meant to run from a scheduler '\
+		'(ex: cron every few minutes), the home page only recomputes feeds stale for HOME_FEED_STALE_AGE seconds itself'
+
+
+	def add_arguments(self, parser):
+		parser.add_argument('--all', action='store_true', help='Regenerate every user\'s feed, not only stale ones, and recompute their flavor profiles')
+		parser.add_argument('--limit', type=int, default=FEED_SIZE, help='Recipes stored per user')
+
+
+	# Main method when command is called
+	def handle(self, *args, **options):
+		start_time = time.time()
+		profiles = Profile.objects.all() if options['all'] else Profile.objects.filter(recommendations_stale=True)
+		count = rows = 0
+		for profile in profiles.iterator():
+			if options['all']:
+				rebuild_flavor_profile(profile.id)
+			rows += refresh_user_recommendations(profile, options['limit'])
+			count += 1
+		self.stdout.write(self.style.SUCCESS('Refreshed {} feeds with {} recommendations (took {:.1f} seconds).'\
+			.format(count, rows, time.time()-start_time) ))
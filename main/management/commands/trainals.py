@@ -0,0 +1,73 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from main.recommender.interactions import Interactions
+from main.recommender.als import ALSModel, train_als, top_k_for_users, als_root
+from main.recommender.registry import save_version
+from main.recommender.metrics import holdout_split, precision_recall_at_k
+from main.recommender.profiling import peak_rss_mb
+
+import time
+import logging
+logger = logging.getLogger('main')
+
+
+
+class Command(BaseCommand):
+	help = 'Trains user and recipe embeddings with implicit ALS on likes, saves and dislikes'
+
+
+	def add_arguments(self, parser):
+		parser.add_argument('--factors', type=int, default=32, help='Embedding size')
+		parser.add_argument('--iterations', type=int, default=10)
+		parser.add_argument('--regularization', type=float, default=0.1)
+		parser.add_argument('--alpha', type=float, default=20.0, help='Confidence gained per unit of feedback')
+		parser.add_argument('--holdout', type=float, default=0.2, help='Share of each user\'s positive feedback held out for metrics (0 to skip)')
+		parser.add_argument('--k', type=int, default=10, help='Cutoff of the held-out precision and recall')
+		parser.add_argument('--output', default=None, help='Artifact directory, a new version is created inside it')
+		parser.add_argument('--no-publish', action='store_true', help='Save the new version without making it live (see recommendermodels publish)')
+
+
+	# Main method when command is called
+	def handle(self, *args, **options):
+		if not 0 <= options['holdout'] < 1:
+			raise CommandError("--holdout must be at least 0 and below 1.")
+		if options['factors'] < 1 or options['iterations'] < 1:
+			raise CommandError("--factors and --iterations must be at least 1.")
+
+		interactions = Interactions.load()
+		shape = interactions.matrix.shape
+		self.log('Training on {} interactions of {} users and {} recipes'.format(len(interactions), shape[0], shape[1]))
+
+		meta = {key: options[key] for key in ('factors', 'iterations', 'regularization', 'alpha')}
+		if options['holdout']:
+			meta['heldout'] = self.evaluate(interactions, options)
+
+		start_time = time.time()
+		user_factors, item_factors = self.train(interactions.matrix, options)
+		meta.update({'training_seconds': time.time() - start_time, 'interactions': len(interactions), 'peak_rss_mb': peak_rss_mb()})
+
+		model = ALSModel(interactions.profile_ids, interactions.recipe_ids, user_factors, item_factors, meta)
+		directory = save_version(model.save, options['output'] or als_root(), live=not options['no_publish'])
+		self.stdout.write(self.style.SUCCESS('Saved ALS model {} to {} (trained in {:.1f} seconds).'.format(model.version, directory, meta['training_seconds'])))
+
+
+	def train(self, matrix, options):
+		return train_als(matrix, options['factors'], options['iterations'], options['regularization'], options['alpha'],
+			progress=lambda iteration, seconds: self.log('Iteration {} took {:.2f} seconds'.format(iteration, seconds)))
+
+
+	# Precision and recall at k of a model trained without each user's held-out likes and saves
+	def evaluate(self, interactions, options):
+		train, heldout = holdout_split(interactions.matrix, options['holdout'])
+		start_time = time.time()
+		user_factors, item_factors = self.train(train, options)
+		ranked = top_k_for_users(user_factors, item_factors, list(heldout), train, options['k'])
+		precision, recall = precision_recall_at_k(ranked, heldout, options['k'])
+		metrics = {'users': len(heldout), 'k': options['k'], 'precision': precision, 'recall': recall, 'training_seconds': time.time() - start_time}
+		self.log('Held out {} users: precision@{k} {precision:.4f}, recall@{k} {recall:.4f}'.format(len(heldout), **metrics))
+		return metrics
+
+
+	def log(self, message):
+		logger.info(message)
+		self.stdout.write(message)
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.5 on 2026-10-18 17:23
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0002_auto_20170430_1412'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportCheckpoint',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=300, unique=True)),
+                ('byte_offset', models.BigIntegerField(default=0)),
+                ('row_number', models.IntegerField(default=0)),
+                ('completed', models.BooleanField(default=False)),
+                ('date_modified', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.5 on 2026-10-18 17:25
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0003_importcheckpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='content_hash',
+            field=models.CharField(blank=True, editable=False, max_length=40),
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='yummly_url',
+            field=models.CharField(blank=True, db_index=True, max_length=300),
+        ),
+    ]
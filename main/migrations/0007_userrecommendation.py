@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.5 on 2026-10-18 17:38
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0006_collaborativeneighbour'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserRecommendation',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('rank', models.PositiveIntegerField()),
+                ('generated_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='recommendations_stale',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddField(
+            model_name='userrecommendation',
+            name='profile',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recommendations', to='main.Profile'),
+        ),
+        migrations.AddField(
+            model_name='userrecommendation',
+            name='recipe',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recommended_to', to='main.Recipe'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='userrecommendation',
+            unique_together=set([('profile', 'recipe')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='userrecommendation',
+            index_together=set([('profile', 'rank')]),
+        ),
+    ]
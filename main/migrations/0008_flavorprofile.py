@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.5 on 2026-10-18 17:48
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0007_userrecommendation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FlavorProfile',
+            fields=[
+                ('profile', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='flavor_profile', serialize=False, to='main.Profile')),
+                ('liked_count', models.IntegerField(default=0)),
+                ('disliked_count', models.IntegerField(default=0)),
+                ('liked_bitter', models.FloatField(default=0)),
+                ('disliked_bitter', models.FloatField(default=0)),
+                ('liked_meaty', models.FloatField(default=0)),
+                ('disliked_meaty', models.FloatField(default=0)),
+                ('liked_salty', models.FloatField(default=0)),
+                ('disliked_salty', models.FloatField(default=0)),
+                ('liked_sour', models.FloatField(default=0)),
+                ('disliked_sour', models.FloatField(default=0)),
+                ('liked_sweet', models.FloatField(default=0)),
+                ('disliked_sweet', models.FloatField(default=0)),
+                ('liked_piquant', models.FloatField(default=0)),
+                ('disliked_piquant', models.FloatField(default=0)),
+            ],
+        ),
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.5 on 2026-10-18 18:05
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0008_flavorprofile'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='related_recipes',
+            field=models.ManyToManyField(blank=True, related_name='related_from', to='main.Recipe'),
+        ),
+    ]
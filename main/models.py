@@ -1,7 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
-from django.dispatch import receiver 
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver, Signal
 from django.utils import timezone 
 
 
@@ -9,6 +9,14 @@ import logging
 logger = logging.getLogger('main')
 
 
+# Taste profile fields shared by Recipe and the recommender features
+FLAVORS = ('bitter', 'meaty', 'salty', 'sour', 'sweet', 'piquant')
+
+
+# Sent with sender=Recipe after a recipe's ingredients M2M was synced with its ingredient_list
+ingredients_linked = Signal(providing_args=['recipe', 'ingredient_ids'])
+
+
 class Ingredient(models.Model):
 	raw_name 	= models.CharField(max_length=200) # Lowercase and hyphens in between words
 	name 		= models.CharField(max_length=200) # Capitalized and with spaces
@@ -17,9 +25,24 @@ class Ingredient(models.Model):
 		return self.name
 
 	def save(self, *args, **kwargs):
-		self.name = self.raw_name.replace('-', ' ').title()
+		self.name = self.format_name(self.raw_name)
 		return super(Ingredient, self).save(*args, **kwargs)
 
+	@staticmethod
+	def format_name(raw_name):
+		return raw_name.replace('-', ' ').title()
+
+	# Ids for a list of raw names, creating the missing ingredients: one select and at most one bulk insert.
+	# Not cached across calls, ingredients can be wiped by another process (ex: importrecipedata --restart).
+	@classmethod
+	def ids_for_names(cls, raw_names):
+		ids = dict(cls.objects.filter(raw_name__in=raw_names).values_list('raw_name', 'id'))
+		new_names = [name for name in raw_names if name not in ids]
+		if new_names:
+			cls.objects.bulk_create([cls(raw_name=name, name=cls.format_name(name)) for name in new_names])
+			ids.update(cls.objects.filter(raw_name__in=new_names).values_list('raw_name', 'id'))
+		return [ids[name] for name in raw_names]
+
 
 # Encompasses recipes from external API source, as well as user uploaded
 class Recipe(models.Model):
@@ -32,11 +55,12 @@ class Recipe(models.Model):
 	instructions	= models.TextField()
 	photo			= models.ImageField(upload_to='recipe_photos/', null=True, blank=True)
 
-	# Machine learning algorithm to determine similar recipes
-	related_recipes	= models.ManyToManyField('self', blank=True)
+	# Machine learning algorithm to determine similar recipes. One way: each recipe lists its own
+	# neighbours, best first in through row order, and A listing B says nothing about B's list.
+	related_recipes	= models.ManyToManyField('self', blank=True, symmetrical=False, related_name='related_from')
 
 	# Data included in Yummly API
-	yummly_url	 	= models.CharField(max_length=300, blank=True) 
+	yummly_url	 	= models.CharField(max_length=300, blank=True, db_index=True) 
 	yummly_source 	= models.CharField(max_length=300, blank=True) 
 	yummly_rating	= models.IntegerField(default=0, blank=True)
 	yummly_time_in_seconds	= models.IntegerField(default=0, blank=True) 
@@ -50,6 +74,9 @@ class Recipe(models.Model):
 	sweet			= models.FloatField(blank=True, default=0)
 	piquant			= models.FloatField(blank=True, default=0)
 
+	# Hash of the imported row, lets incremental imports skip unchanged recipes
+	content_hash	= models.CharField(max_length=40, blank=True, editable=False)
+
 	# Timestamps
 	date_created	= models.DateTimeField(editable=False)
 	date_modified	= models.DateTimeField(editable=False)
@@ -66,15 +93,38 @@ class Recipe(models.Model):
 			self.date_created = timezone.now()
 		self.date_modified = timezone.now()
 
-	def _post_save_link_ingredients(self):
-		for ingredient_name in self.ingredient_list.split(' '):
-			try:
-				ingredient = Ingredient.objects.get(raw_name=ingredient_name)
-			except Ingredient.DoesNotExist:
-				ingredient = Ingredient.objects.create(raw_name=ingredient_name)
-
-			if ingredient not in self.ingredients.all():
-				self.ingredients.add(ingredient)
+	# Unique ingredient raw names in an ingredient_list string, in order of appearance
+	@staticmethod
+	def split_ingredient_list(ingredient_list):
+		names, seen = [], set()
+		for ingredient_name in ingredient_list.split():
+			if ingredient_name not in seen:
+				seen.add(ingredient_name)
+				names.append(ingredient_name)
+		return names
+
+	# Remember the ingredient_list loaded from the database, so saves that don't change it skip linking
+	@classmethod
+	def from_db(cls, db, field_names, values):
+		instance = super(Recipe, cls).from_db(db, field_names, values)
+		instance._linked_ingredient_list = instance.__dict__.get('ingredient_list')
+		return instance
+
+	# Sync the ingredients M2M with ingredient_list as a set difference, instead of a lookup per ingredient
+	def _post_save_link_ingredients(self, created=False):
+		if self.ingredient_list == getattr(self, '_linked_ingredient_list', None):
+			return
+
+		ingredient_ids = set(Ingredient.ids_for_names(Recipe.split_ingredient_list(self.ingredient_list)))
+		current_ids = set() if created else set(self.ingredients.values_list('id', flat=True))
+
+		Through = Recipe.ingredients.through
+		if current_ids - ingredient_ids:
+			Through.objects.filter(recipe_id=self.id, ingredient_id__in=current_ids - ingredient_ids).delete()
+		if ingredient_ids - current_ids:
+			Through.objects.bulk_create([Through(recipe_id=self.id, ingredient_id=i) for i in ingredient_ids - current_ids])
+		self._linked_ingredient_list = self.ingredient_list
+		ingredients_linked.send(sender=Recipe, recipe=self, ingredient_ids=ingredient_ids)
 
 	def num_saves(self):
 		count = self.profiles_saved.all().count()
@@ -82,7 +132,31 @@ class Recipe(models.Model):
 
 @receiver(post_save, sender=Recipe)
 def recipe_saved(sender, instance, created, **kwargs):
-	instance._post_save_link_ingredients()
+	instance._post_save_link_ingredients(created)
+
+
+# Recipes liked and saved by the same users, computed by the computecollaborative command
+class CollaborativeNeighbour(models.Model):
+	recipe 			= models.ForeignKey(Recipe, on_delete=models.CASCADE, related_name='collaborative_neighbours')
+	neighbour 		= models.ForeignKey(Recipe, on_delete=models.CASCADE, related_name='collaborative_sources')
+	score 			= models.FloatField() # Item-item cosine similarity of their user feedback
+
+	def __str__(self):
+		return "{} -> {}".format(self.recipe_id, self.neighbour_id)
+
+
+# MinHash signature of a recipe's ingredient set, see main/recommender/minhash.py
+class RecipeSignature(models.Model):
+	recipe 			= models.OneToOneField(Recipe, on_delete=models.CASCADE, primary_key=True, related_name='signature')
+	signature		= models.BinaryField() # uint32 hash minimums
+
+	def __str__(self):
+		return self.recipe.name + "'s signature"
+
+# One row per LSH band of a signature, recipes sharing a key are approximate neighbours
+class SignatureBucket(models.Model):
+	recipe 			= models.ForeignKey(Recipe, on_delete=models.CASCADE, related_name='signature_buckets')
+	key 			= models.BigIntegerField(db_index=True)
 
 
 # Each user has a profile with additional information
@@ -98,6 +172,9 @@ class Profile(models.Model):
 	date_created 	= models.DateTimeField(auto_now_add=True) 
 	date_modified 	= models.DateTimeField(auto_now=True) 
 
+	# Set when likes or dislikes are withdrawn, cleared when the refreshrecommendations job regenerates the feed
+	recommendations_stale = models.BooleanField(default=True)
+
 
 	def __str__(self):
 		return self.user.username + "'s profile"
@@ -128,6 +205,74 @@ def save_user_profile(sender, instance, **kwargs):
 
 
 
+# Withdrawn likes and dislikes (from either side of the relation) invalidate the materialized feed,
+# new ones are merged into it right away by main.recommender.feed.update_feed_on_vote
+@receiver(m2m_changed, sender=Profile.liked_recipes.through)
+@receiver(m2m_changed, sender=Profile.disliked_recipes.through)
+def profile_votes_changed(sender, instance, action, reverse, pk_set, **kwargs):
+	if action not in ('post_remove', 'post_clear'):
+		return
+	if not reverse:
+		Profile.objects.filter(id=instance.id).update(recommendations_stale=True)
+	elif pk_set:
+		Profile.objects.filter(id__in=pk_set).update(recommendations_stale=True)
+	elif action == 'post_clear':
+		Profile.objects.update(recommendations_stale=True) # pk_set isn't sent for clears, assume everyone
+
+
+# Keep a RecipeVote per (profile, recipe) in step with likes and dislikes from either side of the relation,
+# dated when the vote was cast or withdrawn (liked back to None), for the time split evaluation
+@receiver(m2m_changed, sender=Profile.liked_recipes.through)
+@receiver(m2m_changed, sender=Profile.disliked_recipes.through)
+def record_votes(sender, instance, action, reverse, pk_set, **kwargs):
+	liked = sender is Profile.liked_recipes.through
+	owner = 'recipe' if reverse else 'user_profile'
+	other = 'user_profile_id' if reverse else 'recipe_id'
+	now = timezone.now()
+	if action == 'post_add':
+		for other_id in pk_set:
+			votes = RecipeVote.objects.filter(**{owner: instance, other: other_id})
+			if not votes.update(liked=liked, date_modified=now):
+				RecipeVote.objects.create(**{owner: instance, other: other_id, 'liked': liked})
+	elif action in ('post_remove', 'post_clear'):
+		votes = RecipeVote.objects.filter(**{owner: instance, 'liked': liked})
+		if action == 'post_remove':
+			votes = votes.filter(**{other + '__in': pk_set})
+		votes.update(liked=None, date_modified=now)
+
+
+# Materialized home feed, one row per recommended recipe, read a page at a time in rank order
+class UserRecommendation(models.Model):
+	profile 		= models.ForeignKey(Profile, on_delete=models.CASCADE, related_name='recommendations')
+	recipe 			= models.ForeignKey(Recipe, on_delete=models.CASCADE, related_name='recommended_to')
+	score 			= models.FloatField()
+	rank 			= models.PositiveIntegerField()
+	generated_at 	= models.DateTimeField()
+
+	class Meta:
+		unique_together = (('profile', 'recipe'),)
+		index_together = (('profile', 'rank'),)
+
+	def __str__(self):
+		return "{} #{}: {}".format(self.profile_id, self.rank, self.recipe_id)
+
+
+# Running flavor sums and counts of a profile's liked and disliked recipes (liked_sweet, disliked_sweet, ...),
+# changed in place on every like and dislike by main.recommender.taste so the taste vector is read, not aggregated
+class FlavorProfile(models.Model):
+	profile 		= models.OneToOneField(Profile, on_delete=models.CASCADE, primary_key=True, related_name='flavor_profile')
+	liked_count 	= models.IntegerField(default=0)
+	disliked_count 	= models.IntegerField(default=0)
+
+	def __str__(self):
+		return str(self.profile) + " flavors"
+
+for flavor in FLAVORS:
+	FlavorProfile.add_to_class('liked_' + flavor, models.FloatField(default=0))
+	FlavorProfile.add_to_class('disliked_' + flavor, models.FloatField(default=0))
+
+
+
 # Keeps track of like and dislike of a user for a recipe
 class RecipeVote(models.Model):
 	user_profile = models.ForeignKey(Profile, on_delete=models.CASCADE)
@@ -148,26 +293,15 @@ class RecipeVote(models.Model):
 
 
 
+# Progress of a chunked import, so an interrupted run can resume after its last committed chunk
+class ImportCheckpoint(models.Model):
+	source 		= models.CharField(max_length=300, unique=True) # Path of the imported file
+	byte_offset = models.BigIntegerField(default=0) # Start of the first uncommitted row
+	row_number 	= models.IntegerField(default=0) # Rows committed so far
+	completed 	= models.BooleanField(default=False)
 
+	date_modified = models.DateTimeField(auto_now=True)
 
 
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
+	def __str__(self):
+		return "{} (row {})".format(self.source, self.row_number)
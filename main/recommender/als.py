@@ -0,0 +1,122 @@
+import time
+
+import numpy as np
+
+from main.recommender.artifacts import artifact_root, save_artifact, load_artifact, LatestArtifact
+
+
+class ALSModel(object):
+	"""
+	User and recipe embeddings from implicit feedback (float32, users x factors and
+	recipes x factors). A user's score for every recipe is one matrix-vector product.
+
+	Saved as a versioned directory of .npy arrays plus meta.json, and loaded
+	memory-mapped so processes serving the same version share its pages.
+	"""
+
+	def __init__(self, profile_ids, recipe_ids, user_factors, item_factors, meta=None):
+		self.profile_ids = profile_ids
+		self.recipe_ids = recipe_ids
+		self.user_factors = user_factors
+		self.item_factors = item_factors
+		self.meta = meta or {}
+		self.recipe_positions = {int(recipe_id): i for i, recipe_id in enumerate(recipe_ids)}
+		self.profile_positions = {int(profile_id): i for i, profile_id in enumerate(profile_ids)}
+
+	@property
+	def version(self):
+		return self.meta.get('version')
+
+	def save(self, root, version=None):
+		directory, self.meta = save_artifact(root, {
+			'profile_ids': np.asarray(self.profile_ids, dtype=np.int64),
+			'recipe_ids': np.asarray(self.recipe_ids, dtype=np.int64),
+			'user_factors': self.user_factors.astype(np.float32),
+			'item_factors': self.item_factors.astype(np.float32),
+		}, self.meta, version)
+		return directory
+
+	@classmethod
+	def load(cls, directory, mmap_mode='r'):
+		arrays, meta = load_artifact(directory, ('profile_ids', 'recipe_ids', 'user_factors', 'item_factors'), mmap_mode)
+		return cls(arrays['profile_ids'], arrays['recipe_ids'], arrays['user_factors'], arrays['item_factors'], meta)
+
+	# Whether the profile had feedback at training time and so has an embedding
+	def has_user(self, profile_id):
+		return profile_id in self.profile_positions
+
+	# Scores of the given recipes for a profile, None when the profile had no feedback at training time.
+	# Recipes trained without feedback score 0.
+	def score(self, profile_id, recipe_ids):
+		user = self.profile_positions.get(profile_id)
+		if user is None:
+			return None
+		positions = np.array([self.recipe_positions.get(int(recipe_id), -1) for recipe_id in recipe_ids], dtype=np.int64)
+		scores = np.zeros(len(positions), dtype=np.float32)
+		known = positions >= 0
+		scores[known] = self.item_factors[positions[known]].dot(self.user_factors[user])
+		return scores
+
+
+# Implicit ALS (Hu, Koren and Volinsky): every user and recipe pair is a preference of 1 for
+# positive feedback and 0 otherwise, weighted by a confidence of 1 + alpha * |feedback|.
+# Each half step solves the ridge regression of one side with the other side fixed.
+def train_als(matrix, factors=32, iterations=10, regularization=0.1, alpha=20.0, seed=0, progress=None):
+	random = np.random.RandomState(seed)
+	matrix = matrix.tocsr().astype(np.float32)
+	user_factors = random.normal(scale=0.01, size=(matrix.shape[0], factors)).astype(np.float32)
+	item_factors = random.normal(scale=0.01, size=(matrix.shape[1], factors)).astype(np.float32)
+	by_item = matrix.T.tocsr()
+
+	for iteration in range(iterations):
+		start = time.time()
+		user_factors = _least_squares(matrix, item_factors, regularization, alpha)
+		item_factors = _least_squares(by_item, user_factors, regularization, alpha)
+		if progress:
+			progress(iteration + 1, time.time() - start)
+	return user_factors, item_factors
+
+
+def _least_squares(matrix, fixed, regularization, alpha):
+	factors = fixed.shape[1]
+	gram = fixed.T.dot(fixed) + regularization * np.eye(factors, dtype=np.float32)
+	solved = np.zeros((matrix.shape[0], factors), dtype=np.float32)
+	for row in range(matrix.shape[0]):
+		begin, end = matrix.indptr[row], matrix.indptr[row + 1]
+		if begin == end:
+			continue
+		vectors = fixed[matrix.indices[begin:end]]
+		feedback = matrix.data[begin:end]
+		confidence = 1 + alpha * np.abs(feedback)
+		preference = (feedback > 0).astype(np.float32)
+		a = gram + (vectors.T * (confidence - 1)).dot(vectors)
+		b = vectors.T.dot(confidence * preference)
+		solved[row] = np.linalg.solve(a, b)
+	return solved
+
+
+# Top k columns per user row from factor products, skipping the columns the user already has in exclude (CSR)
+def top_k_for_users(user_factors, item_factors, rows, exclude, k=10):
+	ranked = {}
+	for row in rows:
+		scores = item_factors.dot(user_factors[row])
+		scores[exclude.indices[exclude.indptr[row]:exclude.indptr[row + 1]]] = -np.inf
+		count = min(k, len(scores))
+		if not count:
+			ranked[row] = []
+			continue
+		best = np.argpartition(-scores, count - 1)[:count]
+		ranked[row] = best[np.argsort(-scores[best])].tolist()
+	return ranked
+
+
+# Latest model under RECOMMENDER_ARTIFACT_DIR/als, reloaded when a new version is written
+_latest_model = LatestArtifact('als', ALSModel.load)
+
+
+def als_root():
+	return artifact_root('als')
+
+
+def current_als_model():
+	return _latest_model.get()
@@ -0,0 +1,97 @@
+import json
+import os
+import threading
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+
+# Trained models live in RECOMMENDER_ARTIFACT_DIR/<kind>/<version>/ as .npy arrays plus meta.json,
+# versions are timestamps so the newest sorts last
+def artifact_root(kind):
+	return os.path.join(settings.RECOMMENDER_ARTIFACT_DIR, kind)
+
+
+# A version is written to a hidden directory and renamed into place once complete, so readers
+# never see it half written and the kind's directory changes (for LatestArtifact) only then
+def save_artifact(root, arrays, meta, version=None):
+	version = version or timezone.now().strftime('%Y%m%d%H%M%S%f')
+	directory, building = os.path.join(root, version), os.path.join(root, '.' + version)
+	os.makedirs(building)
+	for name, array in arrays.items():
+		np.save(os.path.join(building, name + '.npy'), array)
+	meta = dict(meta, version=version)
+	with open(os.path.join(building, 'meta.json'), 'w') as f:
+		json.dump(meta, f, indent=2, sort_keys=True)
+	os.rename(building, directory)
+	return directory, meta
+
+
+# Arrays (memory-mapped read-only by default) and meta of one version directory
+def load_artifact(directory, names, mmap_mode='r'):
+	with open(os.path.join(directory, 'meta.json')) as f:
+		meta = json.load(f)
+	return {name: np.load(os.path.join(directory, name + '.npy'), mmap_mode=mmap_mode) for name in names}, meta
+
+
+# Newest complete version directory under root, None when there is none
+def latest_version(root):
+	if not os.path.isdir(root):
+		return None
+	versions = sorted(v for v in os.listdir(root) if not v.startswith('.') and os.path.exists(os.path.join(root, v, 'meta.json')))
+	return os.path.join(root, versions[-1]) if versions else None
+
+
+# Pointer file of a kind's live version, see ModelRegistry
+POINTER = 'LIVE'
+
+
+# Version directory serving traffic: the one the LIVE pointer names, the newest when there is no pointer
+# (nothing was ever published or pinned). A pointer naming no version means nothing is live.
+def live_version(root):
+	try:
+		with open(os.path.join(root, POINTER)) as f:
+			version = json.load(f)['version']
+	except (OSError, ValueError, KeyError):
+		return latest_version(root)
+	if version is None:
+		return None
+	directory = os.path.join(root, version)
+	return directory if os.path.exists(os.path.join(directory, 'meta.json')) else latest_version(root)
+
+
+class LatestArtifact(object):
+	"""
+	Process-wide cache of the live version of one kind of artifact. Loads lazily,
+	and again whenever the kind's directory changes (a version was added or removed)
+	or the LIVE pointer is replaced, which costs two stats per lookup.
+	"""
+
+	def __init__(self, kind, load):
+		self.kind = kind
+		self.load = load
+		self.value = None
+		self.stamp = None
+		self.lock = threading.Lock()
+
+	def get(self):
+		root = artifact_root(self.kind)
+		try:
+			stamp = (root, os.stat(root).st_mtime_ns, _pointer_stamp(root))
+		except OSError:
+			return None
+		with self.lock:
+			if stamp != self.stamp:
+				directory = live_version(root)
+				self.value, self.stamp = (self.load(directory) if directory else None), stamp
+			return self.value
+
+
+# The pointer is replaced by a rename, a new inode tells a switch apart even within one mtime tick
+def _pointer_stamp(root):
+	try:
+		pointer = os.stat(os.path.join(root, POINTER))
+	except OSError:
+		return None
+	return pointer.st_ino, pointer.st_mtime_ns
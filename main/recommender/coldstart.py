@@ -0,0 +1,54 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from main.recommender.minhash import MinHashIndex
+from main.recommender.related import save_related_recipes
+
+logger = logging.getLogger('main')
+
+
+# Related recipes stored for a new user recipe, as many as computerecommendations keeps by default
+COLD_START_NEIGHBOURS = 4
+
+# Single background thread for COLD_START_DEFERRED, created on first use
+_executor = None
+
+
+# Give a recipe related_recipes from the MinHash index: one indexed bucket lookup and a Jaccard
+# re-rank of the candidates, no catalog scan. Returns the neighbour ids.
+def link_cold_start_neighbours(recipe_id, ingredient_ids, k=COLD_START_NEIGHBOURS):
+	neighbour_ids = [neighbour_id for neighbour_id, jaccard in MinHashIndex().similar(ingredient_ids, k, exclude=recipe_id)]
+	save_related_recipes([recipe_id], [neighbour_ids])
+	return neighbour_ids
+
+
+def _deferred_link(recipe_id, ingredient_ids):
+	try:
+		link_cold_start_neighbours(recipe_id, ingredient_ids)
+	except Exception:
+		logger.exception("Cold start neighbours failed for recipe %s", recipe_id)
+	finally:
+		connection.close() # The worker thread has its own connection, don't leave it open
+
+
+def _background():
+	global _executor
+	if _executor is None:
+		_executor = ThreadPoolExecutor(max_workers=1)
+	return _executor
+
+
+# Receiver for ingredients_linked, connected in MainConfig.ready after the signature update.
+# Catalog recipes get their neighbours from computerecommendations, user recipes get them here,
+# inline or (COLD_START_DEFERRED) on a background thread once the transaction commits.
+def cold_start_recipe(sender, recipe, ingredient_ids, **kwargs):
+	if not recipe.is_user_recipe:
+		return
+	ingredient_ids = set(ingredient_ids)
+	if getattr(settings, 'COLD_START_DEFERRED', False):
+		transaction.on_commit(lambda: _background().submit(_deferred_link, recipe.id, ingredient_ids))
+	else:
+		link_cold_start_neighbours(recipe.id, ingredient_ids)
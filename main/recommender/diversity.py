@@ -0,0 +1,25 @@
+import numpy as np
+
+
+# Maximal marginal relevance for a batch of candidate lists: repeatedly pick the candidate with the best
+# tradeoff * relevance - (1 - tradeoff) * (highest similarity to the ones already picked).
+# relevance is (lists x candidates) with -inf for padding, similarity (lists x candidates x candidates).
+# Returns (lists x k) candidate positions in pick order, -1 where a list runs out.
+def mmr(relevance, similarity, k, tradeoff=0.7):
+	relevance = np.asarray(relevance, dtype=np.float32)
+	lists, candidates = relevance.shape
+	k = min(k, candidates)
+	picked = np.full((lists, k), -1, dtype=np.int64)
+	available = np.isfinite(relevance)
+	redundancy = np.zeros((lists, candidates), dtype=np.float32)
+	rows = np.arange(lists)
+
+	for step in range(k):
+		with np.errstate(invalid='ignore'):
+			gain = np.where(available, tradeoff * relevance - (1 - tradeoff) * redundancy, -np.inf)
+		choice = gain.argmax(axis=1)
+		found = available[rows, choice]
+		picked[found, step] = choice[found]
+		available[rows[found], choice[found]] = False
+		redundancy = np.maximum(redundancy, similarity[rows, choice])
+	return picked
@@ -0,0 +1,212 @@
+import time
+from collections import OrderedDict
+from itertools import islice
+
+import numpy as np
+
+from main.models import Recipe, RecipeVote
+from main.recommender.interactions import Interactions, FEEDBACK
+from main.recommender.collaborative import ItemItemSimilarity
+from main.recommender.als import train_als
+from main.recommender.walk import InteractionGraph, RandomWalk
+from main.recommender.metrics import precision_recall_at_k, coverage
+from main.recommender.profiling import peak_rss_mb
+
+
+class TimeSplit(object):
+	"""
+	Feedback split at a point in time. Votes (RecipeVote) modified at or after the
+	cutoff are the future: the liked ones are held out as what each profile went on
+	to like. Training keeps the liked, saved and disliked recipes of every profile
+	except the pairs voted on after the cutoff, feedback without a vote counts as past.
+	"""
+
+	def __init__(self, train, heldout, cutoff):
+		self.train = train
+		self.heldout = heldout # {profile id: set of recipe ids}
+		self.cutoff = cutoff
+
+	# Cut at the given datetime, or where the latest holdout fraction of votes begins
+	@classmethod
+	def load(cls, holdout=0.2, cutoff=None):
+		votes = list(RecipeVote.objects.exclude(liked=None).values_list('user_profile_id', 'recipe_id', 'liked', 'date_modified'))
+		if cutoff is None and votes and holdout > 0:
+			times = sorted(date for profile_id, recipe_id, liked, date in votes)
+			cutoff = times[min(int(len(times) * (1 - holdout)), len(times) - 1)]
+		future = {(profile_id, recipe_id): liked for profile_id, recipe_id, liked, date in votes if cutoff is not None and date >= cutoff}
+
+		heldout = {}
+		for (profile_id, recipe_id), liked in future.items():
+			if liked:
+				heldout.setdefault(profile_id, set()).add(recipe_id)
+		triples = np.vstack([Interactions.feedback_pairs(field, weight) for field, weight in FEEDBACK])
+		past = np.array([(int(profile_id), int(recipe_id)) not in future for profile_id, recipe_id, weight in triples], dtype=bool)
+		return cls(Interactions.from_triples(triples[past].reshape(-1, 3)), heldout, cutoff)
+
+
+# Recommenders compared by evaluaterecommenders, by name
+RECOMMENDERS = OrderedDict()
+
+
+def register(name):
+	def decorator(cls):
+		RECOMMENDERS[name] = cls
+		return cls
+	return decorator
+
+
+class Recommender(object):
+	"""
+	Something evaluaterecommenders can compare: fit() sees only the training
+	interactions, recommend() returns up to k recipe ids for a profile, best first,
+	leaving out the recipes the profile has feedback on in training.
+	"""
+
+	def fit(self, train):
+		self.train = train
+
+	def recommend(self, profile_id, k=10):
+		raise NotImplementedError
+
+	# Recipe ids the profile has feedback on in training, all signs
+	def known(self, profile_id):
+		row = self.train.profile_index([profile_id])[0]
+		if row < 0:
+			return set()
+		matrix = self.train.matrix
+		return set(self.train.recipe_ids[matrix.indices[matrix.indptr[row]:matrix.indptr[row + 1]]].tolist())
+
+	# Recipe ids the profile liked or saved in training
+	def positives(self, profile_id):
+		row = self.train.profile_index([profile_id])[0]
+		if row < 0:
+			return []
+		matrix = self.train.matrix
+		begin, end = matrix.indptr[row], matrix.indptr[row + 1]
+		return self.train.recipe_ids[matrix.indices[begin:end][matrix.data[begin:end] > 0]].tolist()
+
+
+@register('popular')
+class Popular(Recommender):
+	"""Baseline: the recipes with the most positive feedback, the same for everyone."""
+
+	def fit(self, train):
+		super(Popular, self).fit(train)
+		counts = np.asarray((train.matrix > 0).sum(axis=0)).ravel()
+		self.ranking = train.recipe_ids[np.lexsort((train.recipe_ids, -counts))].tolist()
+
+	def recommend(self, profile_id, k=10):
+		known = self.known(profile_id)
+		return list(islice((recipe_id for recipe_id in self.ranking if recipe_id not in known), k))
+
+
+class NeighbourVotes(Recommender):
+	"""
+	Recipes scored by summing their neighbour scores over the profile's liked and
+	saved recipes. Subclasses fill self.neighbours with {recipe id: (neighbour ids, scores)}.
+	"""
+
+	def recommend(self, profile_id, k=10):
+		known, scores = self.known(profile_id), {}
+		for recipe_id in self.positives(profile_id):
+			for neighbour_id, score in zip(*self.neighbours.get(recipe_id, ((), ()))):
+				if neighbour_id not in known:
+					scores[neighbour_id] = scores.get(neighbour_id, 0) + score
+		return [recipe_id for recipe_id, score in sorted(scores.items(), key=lambda pair: (-pair[1], pair[0]))[:k]]
+
+
+@register('related')
+class Related(NeighbourVotes):
+	"""The stored related_recipes lists (imported or from computerecommendations), earlier neighbours weigh more."""
+
+	def fit(self, train):
+		super(Related, self).fit(train)
+		lists = {}
+		for recipe_id, neighbour_id in Recipe.related_recipes.through.objects.order_by('from_recipe_id', 'id').values_list('from_recipe_id', 'to_recipe_id'):
+			lists.setdefault(recipe_id, []).append(neighbour_id)
+		self.neighbours = {recipe_id: (ids, [1 / (rank + 1) for rank in range(len(ids))]) for recipe_id, ids in lists.items()}
+
+
+@register('collaborative')
+class Collaborative(NeighbourVotes):
+	"""Item-item cosine neighbours of the training feedback, as computecollaborative stores them."""
+
+	def __init__(self, neighbours=20):
+		self.neighbour_count = neighbours
+
+	def fit(self, train):
+		super(Collaborative, self).fit(train)
+		self.neighbours = {
+			int(recipe_id): (neighbour_ids.tolist(), scores.tolist())
+			for recipe_id, neighbour_ids, scores in ItemItemSimilarity(train).top_k(self.neighbour_count)
+		}
+
+
+@register('als')
+class ALS(Recommender):
+	"""Implicit ALS embeddings trained on the training feedback, as trainals does."""
+
+	def __init__(self, factors=32, iterations=10, regularization=0.1, alpha=20.0):
+		self.options = (factors, iterations, regularization, alpha)
+
+	def fit(self, train):
+		super(ALS, self).fit(train)
+		self.user_factors, self.item_factors = train_als(train.matrix, *self.options)
+
+	def recommend(self, profile_id, k=10):
+		row = self.train.profile_index([profile_id])[0]
+		if row < 0:
+			return []
+		matrix = self.train.matrix
+		scores = self.item_factors.dot(self.user_factors[row])
+		scores[matrix.indices[matrix.indptr[row]:matrix.indptr[row + 1]]] = -np.inf
+		count = min(k, int(np.isfinite(scores).sum()))
+		if count < 1:
+			return []
+		best = np.argpartition(-scores, count - 1)[:count]
+		return self.train.recipe_ids[best[np.argsort(-scores[best], kind='mergesort')]].tolist()
+
+
+@register('walk')
+class Walk(Recommender):
+	"""Personalized random walk over the graph built from the training likes and saves."""
+
+	def fit(self, train):
+		super(Walk, self).fit(train)
+		matrix = train.matrix.tocoo()
+		positive = matrix.data > 0
+		feedback = np.column_stack([train.profile_ids[matrix.row[positive]], train.recipe_ids[matrix.col[positive]]])
+		self.walk = RandomWalk(InteractionGraph.load(feedback))
+
+	def recommend(self, profile_id, k=10):
+		result = self.walk.recommend(profile_id, k, exclude=list(self.known(profile_id)))
+		return [] if result is None else result[0].tolist()
+
+
+# Train one recommender on the split and score it on the held-out profiles: precision@k, recall@k,
+# catalog coverage, per-profile recommend() latency percentiles, training wall time and memory
+def evaluate(recommender, split, k=10, catalog_size=None):
+	catalog_size = Recipe.objects.count() if catalog_size is None else catalog_size
+	rss_before = peak_rss_mb()
+	start_time = time.time()
+	recommender.fit(split.train)
+	training_seconds = time.time() - start_time
+
+	ranked, latencies = {}, []
+	for profile_id in sorted(split.heldout):
+		start_time = time.perf_counter()
+		ranked[profile_id] = recommender.recommend(profile_id, k)
+		latencies.append((time.perf_counter() - start_time) * 1000)
+
+	precision, recall = precision_recall_at_k(ranked, split.heldout, k)
+	return OrderedDict([
+		('precision', precision),
+		('recall', recall),
+		('coverage', coverage(ranked, catalog_size, k)),
+		('users', len(ranked)),
+		('latency_p50_ms', float(np.percentile(latencies, 50)) if latencies else None),
+		('latency_p99_ms', float(np.percentile(latencies, 99)) if latencies else None),
+		('training_seconds', training_seconds),
+		('peak_rss_mb', peak_rss_mb()),
+		('rss_growth_mb', peak_rss_mb() - rss_before),
+	])
@@ -0,0 +1,50 @@
+import numpy as np
+from scipy import sparse
+
+from main.models import Recipe, FLAVORS
+
+
+class RecipeFeatures(object):
+	"""
+	Recipe catalog as arrays, rows ordered by recipe id:
+	ids (int64, n), flavors (float32, n x 6) and a sparse binary
+	recipe x ingredient incidence matrix (float32 CSR, n x max ingredient id + 1).
+	"""
+
+	def __init__(self, ids, flavors, ingredients):
+		self.ids = ids
+		self.flavors = flavors
+		self.ingredients = ingredients
+
+	def __len__(self):
+		return len(self.ids)
+
+	@classmethod
+	def load(cls, queryset=None):
+		queryset = Recipe.objects.all() if queryset is None else queryset
+		rows = list(queryset.order_by('id').values_list('id', *FLAVORS))
+		ids = np.array([row[0] for row in rows], dtype=np.int64)
+		flavors = np.array([row[1:] for row in rows], dtype=np.float32).reshape(len(rows), len(FLAVORS))
+
+		links = np.array(list(Recipe.ingredients.through.objects.filter(recipe_id__in=queryset).values_list('recipe_id', 'ingredient_id')), dtype=np.int64).reshape(-1, 2)
+		return cls(ids, flavors, cls.incidence_matrix(ids, links))
+
+	# Binary recipe x ingredient matrix from (recipe_id, ingredient_id) pairs
+	@staticmethod
+	def incidence_matrix(ids, links, num_ingredients=None):
+		rows = np.searchsorted(ids, links[:, 0])
+		cols = links[:, 1]
+		if num_ingredients is None:
+			num_ingredients = int(cols.max()) + 1 if len(cols) else 0
+		data = np.ones(len(links), dtype=np.float32)
+		matrix = sparse.csr_matrix((data, (rows, cols)), shape=(len(ids), num_ingredients), dtype=np.float32)
+		matrix.data[:] = 1 # Duplicate links sum up, keep the matrix binary
+		return matrix
+
+	# Row positions of recipe ids, -1 for ids not in the catalog
+	def index_of(self, recipe_ids):
+		recipe_ids = np.asarray(recipe_ids, dtype=np.int64)
+		if not len(self.ids):
+			return np.full(len(recipe_ids), -1, dtype=np.int64)
+		positions = np.minimum(np.searchsorted(self.ids, recipe_ids), len(self.ids) - 1)
+		return np.where(self.ids[positions] == recipe_ids, positions, -1)
@@ -0,0 +1,237 @@
+from collections import defaultdict
+from itertools import chain, zip_longest
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum, Min
+from django.utils import timezone
+
+from main.models import Recipe, Profile, UserRecommendation, CollaborativeNeighbour, FLAVORS
+from main.recommender.als import current_als_model
+from main.recommender.walk import current_walk_recommendations
+from main.recommender.sampling import daily_seed, reservoir_sample, sample_positions
+from main.recommender.features import RecipeFeatures
+from main.recommender.similarity import ContentSimilarity
+from main.recommender.diversity import mmr
+from main.recommender.taste import taste_vector
+from main.recommender.related import live_related_ids
+
+
+# Rows materialized per user and rows shown on the home page
+FEED_SIZE = 20
+PAGE_SIZE = 4
+
+# Incremental updates: neighbours merged per liked recipe, score of a related_recipes
+# neighbour (collaborative ones bring their own) and factor applied to neighbours of a disliked recipe
+VOTE_NEIGHBOURS = 10
+RELATED_SCORE = 0.5
+DISLIKE_PENALTY = 0.5
+
+
+# One page of the user's materialized feed, in rank order, or with HOME_FEED_SAMPLE a random page
+# drawn from the whole feed (the same all day for a user). Stale feeds (ex: after an unlike or a
+# data reset) are recomputed on the spot once their last full refresh is HOME_FEED_STALE_AGE seconds
+# old, or at once when empty. Until then refreshrecommendations, when scheduled, catches them first.
+def home_recommendations(profile, page_size=PAGE_SIZE, sample=None):
+	sample = getattr(settings, 'HOME_FEED_SAMPLE', False) if sample is None else sample
+	read_page = sampled_page if sample else top_page
+	if profile.recommendations_stale and feed_age(profile) >= getattr(settings, 'HOME_FEED_STALE_AGE', 300):
+		refresh_user_recommendations(profile)
+	return read_page(profile, page_size)
+
+
+# Seconds since the user's feed was last fully generated, infinite when it has no rows.
+# Incremental vote updates insert newer rows, the oldest row dates the last full refresh.
+def feed_age(profile):
+	generated_at = UserRecommendation.objects.filter(profile=profile).aggregate(oldest=Min('generated_at'))['oldest']
+	return float('inf') if generated_at is None else (timezone.now() - generated_at).total_seconds()
+
+
+def top_page(profile, page_size):
+	return list(recipes_in_feed(profile)[:page_size])
+
+
+# Random ranks looked up on the (profile, rank) index, ranks are kept contiguous from 1
+def sampled_page(profile, page_size):
+	count = UserRecommendation.objects.filter(profile=profile).count()
+	ranks = sample_positions(count, page_size, daily_seed(profile.id))
+	rows = UserRecommendation.objects.filter(profile=profile, rank__in=ranks).select_related('recipe')
+	recipes = {row.rank: row.recipe for row in rows}
+	return [recipes[rank] for rank in ranks if rank in recipes]
+
+
+def recipes_in_feed(profile):
+	return Recipe.objects.filter(recommended_to__profile=profile).order_by('recommended_to__rank')
+
+
+# Recompute and store a user's feed, replacing the previous rows. Returns how many rows were written.
+def refresh_user_recommendations(profile, limit=FEED_SIZE):
+	recipes = compute_home_recommendations(profile, limit)
+	now = timezone.now()
+	with transaction.atomic():
+		UserRecommendation.objects.filter(profile=profile).delete()
+		UserRecommendation.objects.bulk_create([
+			UserRecommendation(profile=profile, recipe=recipe, score=1.0 / rank, rank=rank, generated_at=now)
+			for rank, recipe in enumerate(recipes, 1)
+		])
+		Profile.objects.filter(id=profile.id).update(recommendations_stale=False)
+	profile.recommendations_stale = False
+	return len(recipes)
+
+
+# Merge the neighbours of a newly liked recipe into the user's feed, adding their scores
+def apply_like(profile_id, recipe_id):
+	neighbours = vote_neighbours(recipe_id)
+	Through = Profile.liked_recipes.through
+	voted = set(Through.objects.filter(profile_id=profile_id, recipe_id__in=neighbours).values_list('recipe_id', flat=True))
+	Through = Profile.disliked_recipes.through
+	voted.update(Through.objects.filter(profile_id=profile_id, recipe_id__in=neighbours).values_list('recipe_id', flat=True))
+
+	with transaction.atomic():
+		rows = feed_rows(profile_id)
+		removed = [recipe_id] if recipe_id in rows else []
+		for neighbour_id, score in neighbours.items():
+			if neighbour_id in voted or neighbour_id == recipe_id:
+				continue
+			if neighbour_id not in rows:
+				rows[neighbour_id] = UserRecommendation(profile_id=profile_id, recipe_id=neighbour_id, score=0, rank=0, generated_at=timezone.now())
+			rows[neighbour_id].score += score
+		save_feed_rows(rows, removed)
+
+
+# Drop a newly disliked recipe from the user's feed and push its neighbours down
+def apply_dislike(profile_id, recipe_id):
+	neighbours = vote_neighbours(recipe_id)
+	with transaction.atomic():
+		rows = feed_rows(profile_id)
+		for neighbour_id in neighbours:
+			if neighbour_id in rows:
+				rows[neighbour_id].score *= DISLIKE_PENALTY
+		save_feed_rows(rows, [recipe_id] if recipe_id in rows else [])
+
+
+# neighbour id -> score of a recipe's live related recipes and collaborative neighbours
+def vote_neighbours(recipe_id, k=VOTE_NEIGHBOURS):
+	scores = defaultdict(float)
+	for neighbour_id in live_related_ids([recipe_id]).get(recipe_id, [])[:k]:
+		scores[neighbour_id] += RELATED_SCORE
+	collaborative = CollaborativeNeighbour.objects.filter(recipe_id=recipe_id).order_by('-score').values_list('neighbour_id', 'score')
+	for neighbour_id, score in collaborative[:k]:
+		scores[neighbour_id] += score
+	return scores
+
+
+# recipe id -> UserRecommendation of the user's feed, locked until the transaction ends
+def feed_rows(profile_id):
+	rows = {}
+	for row in UserRecommendation.objects.select_for_update().filter(profile_id=profile_id):
+		row.stored = (row.rank, row.score)
+		rows[row.recipe_id] = row
+	return rows
+
+
+# Re-rank rows by score and write back only what changed: removed and overflowing rows are
+# deleted, new rows inserted and existing rows updated when their score or rank moved
+def save_feed_rows(rows, removed, size=FEED_SIZE):
+	deleted = [rows.pop(recipe_id).id for recipe_id in removed]
+	ranked = sorted(rows.values(), key=lambda row: (-row.score, row.recipe_id))
+	deleted += [row.id for row in ranked[size:] if row.id is not None]
+
+	new_rows = []
+	for rank, row in enumerate(ranked[:size], 1):
+		row.rank = rank
+		if row.id is None:
+			new_rows.append(row)
+		elif (row.rank, row.score) != row.stored:
+			UserRecommendation.objects.filter(id=row.id).update(rank=row.rank, score=row.score)
+	if deleted:
+		UserRecommendation.objects.filter(id__in=deleted).delete()
+	UserRecommendation.objects.bulk_create(new_rows)
+
+
+# Apply likes and dislikes to the feed as they're added, connected in MainConfig.ready
+def update_feed_on_vote(sender, instance, action, reverse, pk_set, **kwargs):
+	if action != 'post_add' or not pk_set:
+		return
+	apply_vote = apply_like if sender is Profile.liked_recipes.through else apply_dislike
+	for other_id in pk_set:
+		if reverse: # recipe.profiles_liked.add(profile)
+			apply_vote(other_id, instance.id)
+		else:
+			apply_vote(instance.id, other_id)
+
+
+# Home feed: content neighbours (live related recipes) of liked recipes, alternating with collaborative
+# neighbours of liked and saved recipes by summed score and the user's latest random walk results,
+# minus liked and disliked recipes.
+# Content neighbours are ranked by the latest ALS model when it knows the user, else by flavor taste.
+def compute_home_recommendations(profile, limit=FEED_SIZE):
+	liked = profile.liked_recipes.all()
+	disliked = profile.disliked_recipes.all()
+	sources = set(liked.values_list('id', flat=True)) | set(profile.saved_recipes.values_list('id', flat=True))
+
+	neighbours = set(chain.from_iterable(live_related_ids(list(liked.values_list('id', flat=True))).values()))
+	content = Recipe.objects.filter(id__in=neighbours).exclude(id__in=liked).exclude(id__in=disliked)
+	content = rank_by_model(profile, content, limit)
+	collaborative = Recipe.objects.filter(collaborative_sources__recipe__in=sources)\
+		.exclude(id__in=liked).exclude(id__in=disliked)\
+		.annotate(collaborative_score=Sum('collaborative_sources__score')).order_by('-collaborative_score', 'id')[:limit]
+	recipes = blend(content, collaborative, walk_recommendations(profile, liked, disliked, limit), limit=limit)
+	return diversify(recipes, getattr(settings, 'RECOMMENDATION_DIVERSITY', 0.7))
+
+
+# Recipes of the latest batch random walk for the profile, best first
+def walk_recommendations(profile, liked, disliked, limit):
+	walk = current_walk_recommendations()
+	recipe_ids = walk.for_profile(profile.id)[:limit] if walk is not None else []
+	if not recipe_ids:
+		return []
+	recipes = Recipe.objects.exclude(id__in=liked).exclude(id__in=disliked).in_bulk(recipe_ids)
+	return [recipes[recipe_id] for recipe_id in recipe_ids if recipe_id in recipes]
+
+
+# Up to limit recipes of a queryset, best first for the user's embedding, else by the dot product of their
+# flavors with the user's taste vector, or a seeded random sample when the user has neither.
+# Every recipe of the queryset is scored, ties going to the lowest id.
+def rank_by_model(profile, recipes, limit):
+	recipes = recipes.order_by('id')
+	model = current_als_model()
+	if model is not None and model.has_user(profile.id):
+		candidate_ids = list(recipes.values_list('id', flat=True))
+		scores = model.score(profile.id, candidate_ids)
+		recipe_ids = [candidate_ids[i] for i in np.argsort(-scores, kind='mergesort')[:limit]]
+	else:
+		taste = taste_vector(profile.id)
+		if taste is None:
+			recipe_ids = reservoir_sample(recipes.values_list('id', flat=True).iterator(), limit, daily_seed(profile.id))
+		else:
+			rows = list(recipes.values_list('id', *FLAVORS))
+			scores = np.array([row[1:] for row in rows], dtype=np.float32).reshape(len(rows), len(FLAVORS)).dot(taste)
+			recipe_ids = [rows[i][0] for i in np.argsort(-scores, kind='mergesort')[:limit]]
+	found = Recipe.objects.in_bulk(recipe_ids)
+	return [found[recipe_id] for recipe_id in recipe_ids]
+
+
+# Reorder recipes with MMR so near duplicates don't sit next to each other at the top,
+# relevance falling with the original position (tradeoff 1 keeps the order)
+def diversify(recipes, tradeoff=0.7):
+	if tradeoff >= 1 or len(recipes) < 3:
+		return recipes
+	# Vectors normalized over the candidates only, enough to tell near duplicates apart
+	features = RecipeFeatures.load(Recipe.objects.filter(id__in=[recipe.id for recipe in recipes]))
+	positions = features.index_of([recipe.id for recipe in recipes])
+	pairwise = ContentSimilarity(features).score_block(0, len(features))[np.ix_(positions, positions)]
+	relevance = 1 - np.arange(len(recipes), dtype=np.float32) / len(recipes)
+	order = mmr(relevance[None, :], pairwise[None, :, :], len(recipes), tradeoff)[0]
+	return [recipes[i] for i in order]
+
+
+# Alternate between recipe lists, skipping recipes already taken
+def blend(*recipe_lists, limit=None):
+	blended, seen = [], set()
+	for recipe in chain.from_iterable(zip_longest(*recipe_lists)):
+		if recipe is not None and recipe.id not in seen:
+			seen.add(recipe.id)
+			blended.append(recipe)
+	return blended[:limit]
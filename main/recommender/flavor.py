@@ -0,0 +1,174 @@
+import copy
+import os
+import threading
+import time
+
+import numpy as np
+from scipy.spatial import cKDTree
+from django.conf import settings
+from django.db import connection
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from main.models import Recipe, FLAVORS
+
+
+class FlavorIndex(object):
+	"""
+	KD-tree over the six flavor values of every recipe, for k nearest neighbour
+	queries by Euclidean distance in flavor space in O(log n) per query.
+	Can be saved to and loaded from an .npz snapshot.
+
+	Recipes edited since the tree was built can be laid over it as changes,
+	{recipe id: flavors, or None when deleted}, which queries check directly
+	until the tree is rebuilt with them.
+	"""
+
+	def __init__(self, ids, flavors):
+		self.ids = np.asarray(ids, dtype=np.int64)
+		self.flavors = np.asarray(flavors, dtype=np.float32).reshape(len(self.ids), len(FLAVORS))
+		self.tree = cKDTree(self.flavors)
+		self.positions = {int(recipe_id): i for i, recipe_id in enumerate(self.ids)}
+		self.changes = {}
+
+	def __len__(self):
+		return len(self.ids)
+
+	# The same tree with changes laid over it, cheap: nothing is copied or rebuilt
+	def with_changes(self, changes):
+		index = copy.copy(self)
+		index.changes = changes
+		return index
+
+	# A new index with the changes built into the tree
+	def updated(self, changes):
+		if not changes:
+			return self
+		kept = ~np.isin(self.ids, list(changes))
+		added = [(recipe_id, flavors) for recipe_id, flavors in changes.items() if flavors is not None]
+		ids = np.concatenate([self.ids[kept], np.array([recipe_id for recipe_id, flavors in added], dtype=np.int64)])
+		flavors = np.vstack([self.flavors[kept], np.array([flavors for recipe_id, flavors in added], dtype=np.float32).reshape(-1, len(FLAVORS))])
+		order = np.argsort(ids, kind='mergesort')
+		return FlavorIndex(ids[order], flavors[order])
+
+	# Current flavors of a recipe, None when it isn't indexed
+	def flavors_of(self, recipe_id):
+		if recipe_id in self.changes:
+			return self.changes[recipe_id]
+		position = self.positions.get(recipe_id)
+		return None if position is None else self.flavors[position]
+
+	@classmethod
+	def load(cls):
+		rows = list(Recipe.objects.order_by('id').values_list('id', *FLAVORS))
+		return cls([row[0] for row in rows], [row[1:] for row in rows])
+
+	def save(self, path):
+		np.savez(path, ids=self.ids, flavors=self.flavors)
+
+	@classmethod
+	def load_snapshot(cls, path):
+		with np.load(path) as snapshot:
+			return cls(snapshot['ids'], snapshot['flavors'])
+
+	# Up to k (recipe id, distance) pairs closest to a flavor vector, closest first
+	def nearest(self, flavors, k=10, exclude=None):
+		if not len(self) + len(self.changes) or k < 1:
+			return []
+		flavors = np.asarray(flavors, dtype=np.float32)
+		neighbours = []
+		query_k = min(k + (exclude is not None) + len(self.changes), len(self))
+		if query_k:
+			distances, positions = self.tree.query(flavors, k=query_k)
+			neighbours = [(int(self.ids[p]), float(d)) for d, p in zip(np.atleast_1d(distances), np.atleast_1d(positions))]
+		neighbours = [(recipe_id, distance) for recipe_id, distance in neighbours if recipe_id != exclude and recipe_id not in self.changes]
+		neighbours.extend(
+			(recipe_id, float(np.sqrt(np.square(np.asarray(changed, dtype=np.float32) - flavors).sum())))
+			for recipe_id, changed in self.changes.items() if changed is not None and recipe_id != exclude
+		)
+		return sorted(neighbours, key=lambda pair: (pair[1], pair[0]))[:k]
+
+	# Up to k (recipe id, distance) pairs closest in flavor to a recipe, None when the recipe isn't indexed
+	def similar_to(self, recipe_id, k=10):
+		flavors = self.flavors_of(recipe_id)
+		if flavors is None:
+			return None
+		return self.nearest(flavors, k, exclude=recipe_id)
+
+
+# Process-wide index, built on first use from FLAVOR_INDEX_SNAPSHOT when set, else from the database.
+# Recipe flavor edits are queued as changes and served laid over the tree at once, while a background
+# thread rebuilds the tree with them. Every FLAVOR_INDEX_MAX_AGE seconds the thread also reloads the
+# source: the snapshot if its file was rewritten since, the database when there's no snapshot.
+_index = None
+_index_built = 0
+_index_source = None # Modification time of the snapshot file loaded, None when loaded from the database
+_pending = {}
+_rebuild_thread = None
+_index_lock = threading.Lock()
+
+
+def flavor_index():
+	global _index, _index_built, _index_source, _rebuild_thread
+	max_age = getattr(settings, 'FLAVOR_INDEX_MAX_AGE', 3600)
+	with _index_lock:
+		if _index is None:
+			_index, _index_source = load_flavor_index()
+			_index_built = time.time()
+		elif (_pending or time.time() - _index_built > max_age) and not (_rebuild_thread and _rebuild_thread.is_alive()):
+			_rebuild_thread = threading.Thread(target=rebuild_flavor_index, daemon=True)
+			_rebuild_thread.start()
+		return _index.with_changes(dict(_pending)) if _pending else _index
+
+
+# The configured snapshot, or the database: (index, snapshot modification time or None)
+def load_flavor_index(source=None):
+	snapshot = getattr(settings, 'FLAVOR_INDEX_SNAPSHOT', None)
+	if snapshot:
+		modified = os.stat(snapshot).st_mtime_ns
+		return (FlavorIndex.load_snapshot(snapshot), modified) if modified != source else (None, source)
+	return FlavorIndex.load(), None
+
+
+# Build the queued changes into the tree, reloading the source first when the index is older than
+# FLAVOR_INDEX_MAX_AGE. Runs on the background thread flavor_index() starts.
+def rebuild_flavor_index():
+	global _index, _index_built, _index_source
+	with _index_lock:
+		index, source, changes = _index, _index_source, dict(_pending)
+		expired = time.time() - _index_built > getattr(settings, 'FLAVOR_INDEX_MAX_AGE', 3600)
+	try:
+		if expired:
+			reloaded, source = load_flavor_index(source)
+			index = reloaded or index
+		index = index.updated(changes)
+	finally:
+		if threading.current_thread() is not threading.main_thread():
+			connection.close()
+	with _index_lock:
+		_index, _index_built, _index_source = index, time.time(), source
+		for recipe_id, flavors in changes.items():
+			if recipe_id in _pending and _pending[recipe_id] is flavors: # Not changed again meanwhile
+				del _pending[recipe_id]
+	return index
+
+
+# Queue edits of the flavor fields, other saves (ex: a new name or image) leave the index alone
+@receiver(post_save, sender=Recipe)
+def recipe_changed(sender, instance, update_fields=None, **kwargs):
+	if update_fields is not None and not set(update_fields) & set(FLAVORS):
+		return
+	flavors = np.array([getattr(instance, flavor) or 0 for flavor in FLAVORS], dtype=np.float32)
+	with _index_lock:
+		if _index is None: # Built with it on first use
+			return
+		indexed = _pending[instance.id] if instance.id in _pending else _index.flavors_of(instance.id)
+		if indexed is None or not np.array_equal(indexed, flavors):
+			_pending[instance.id] = flavors
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+	with _index_lock:
+		if _index is not None and (instance.id in _pending or instance.id in _index.positions):
+			_pending[instance.id] = None
@@ -0,0 +1,63 @@
+import numpy as np
+from scipy import sparse
+
+from main.models import Profile
+
+
+# Profile M2M fields read as feedback, with their default weights
+FEEDBACK = (('liked_recipes', 1.0), ('saved_recipes', 1.0), ('disliked_recipes', -1.0))
+
+
+class Interactions(object):
+	"""
+	User feedback as a sparse profile x recipe matrix (float32 CSR): likes and saves
+	add positive weight, dislikes negative weight. Only profiles and recipes with at
+	least one interaction get a row or column, profile_ids and recipe_ids (sorted)
+	map them back to primary keys.
+	"""
+
+	def __init__(self, profile_ids, recipe_ids, matrix):
+		self.profile_ids = profile_ids
+		self.recipe_ids = recipe_ids
+		self.matrix = matrix
+
+	@classmethod
+	def load(cls, weights=None):
+		weights = dict(FEEDBACK, **(weights or {}))
+		triples = [cls.feedback_pairs(field, weight) for field, weight in weights.items()]
+		return cls.from_triples(np.vstack(triples) if triples else np.empty((0, 3)))
+
+	# (profile_id, recipe_id, weight) rows of one Profile M2M field
+	@staticmethod
+	def feedback_pairs(field, weight):
+		Through = getattr(Profile, field).through
+		pairs = np.array(list(Through.objects.values_list('profile_id', 'recipe_id')), dtype=np.float64).reshape(-1, 2)
+		return np.hstack([pairs, np.full((len(pairs), 1), weight)])
+
+	@classmethod
+	def from_triples(cls, triples):
+		profile_ids, rows = np.unique(triples[:, 0].astype(np.int64), return_inverse=True)
+		recipe_ids, cols = np.unique(triples[:, 1].astype(np.int64), return_inverse=True)
+		# Duplicate entries (a recipe both liked and saved) are summed
+		matrix = sparse.csr_matrix((triples[:, 2].astype(np.float32), (rows, cols)), shape=(len(profile_ids), len(recipe_ids)), dtype=np.float32)
+		matrix.eliminate_zeros()
+		return cls(profile_ids, recipe_ids, matrix)
+
+	def __len__(self):
+		return self.matrix.nnz
+
+	# Column positions of recipe ids, -1 for recipes without feedback
+	def recipe_index(self, recipe_ids):
+		return _index_of(self.recipe_ids, recipe_ids)
+
+	# Row positions of profile ids, -1 for profiles without feedback
+	def profile_index(self, profile_ids):
+		return _index_of(self.profile_ids, profile_ids)
+
+
+def _index_of(sorted_ids, ids):
+	ids = np.asarray(ids, dtype=np.int64)
+	if not len(sorted_ids):
+		return np.full(len(ids), -1, dtype=np.int64)
+	positions = np.minimum(np.searchsorted(sorted_ids, ids), len(sorted_ids) - 1)
+	return np.where(sorted_ids[positions] == ids, positions, -1)
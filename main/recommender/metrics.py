@@ -0,0 +1,44 @@
+import numpy as np
+
+
+# Split each user's positive interactions, holding out a random fraction of every user with at least two.
+# Returns the training matrix (CSR, same shape) and {row: set of held-out columns}.
+def holdout_split(matrix, fraction=0.2, seed=0):
+	random = np.random.RandomState(seed)
+	matrix = matrix.tocsr().copy()
+	heldout = {}
+	for row in range(matrix.shape[0]):
+		begin, end = matrix.indptr[row], matrix.indptr[row + 1]
+		positives = begin + np.flatnonzero(matrix.data[begin:end] > 0)
+		count = int(round(len(positives) * fraction))
+		if len(positives) < 2 or count < 1:
+			continue
+		chosen = random.choice(positives, size=min(count, len(positives) - 1), replace=False)
+		heldout[row] = set(matrix.indices[chosen].tolist())
+		matrix.data[chosen] = 0
+	matrix.eliminate_zeros()
+	return matrix, heldout
+
+
+# Mean precision@k and recall@k of {user: ranked items} against {user: set of relevant items}
+def precision_recall_at_k(recommended, relevant, k=10):
+	precisions, recalls = [], []
+	for user, items in relevant.items():
+		if not items:
+			continue
+		hits = len(set(list(recommended.get(user, []))[:k]) & items)
+		precisions.append(hits / k)
+		recalls.append(hits / len(items))
+	if not precisions:
+		return 0.0, 0.0
+	return float(np.mean(precisions)), float(np.mean(recalls))
+
+
+# Share of the catalog appearing in at least one user's top k
+def coverage(recommended, catalog_size, k=10):
+	if not catalog_size:
+		return 0.0
+	items = set()
+	for ranked in recommended.values():
+		items.update(list(ranked)[:k])
+	return len(items) / catalog_size
@@ -0,0 +1,162 @@
+import numpy as np
+from django.db import transaction
+
+from main.models import Recipe, RecipeSignature, SignatureBucket
+from main.recommender.features import RecipeFeatures
+
+
+# Mersenne prime 2^31 - 1, hashes (a * x + b) mod P of ingredient ids stay within int64
+PRIME = (1 << 31) - 1
+
+
+class MinHasher(object):
+	"""
+	MinHash signatures of ingredient id sets and their LSH band keys.
+
+	A signature holds the minimum of num_perm random hash functions over the set,
+	two signatures agree on each value with probability equal to the Jaccard
+	similarity of the sets. Signatures are cut into bands of rows, recipes that
+	agree on a whole band share its key: with 20 bands of 3 rows, pairs at
+	Jaccard 0.5 share a key 93% of the time and pairs at 0.2 only 15%.
+	The seed is fixed, keys stay comparable between processes and runs.
+	"""
+
+	def __init__(self, num_perm=60, bands=20, seed=1):
+		assert num_perm % bands == 0, "num_perm must be a multiple of bands"
+		self.num_perm = num_perm
+		self.bands = bands
+		random = np.random.RandomState(seed)
+		self.a = random.randint(1, PRIME, size=num_perm).astype(np.int64)
+		self.b = random.randint(0, PRIME, size=num_perm).astype(np.int64)
+		# Random odd multipliers mixing each band's rows into one 64 bit key
+		self.mix = random.randint(0, 1 << 62, size=(bands, num_perm // bands)).astype(np.uint64) * 2 + 1
+
+	# Signature of one set of ingredient ids (uint32, num_perm), all PRIME for an empty set
+	def signature(self, ingredient_ids):
+		ingredient_ids = np.fromiter(ingredient_ids, dtype=np.int64)
+		if not len(ingredient_ids):
+			return np.full(self.num_perm, PRIME, dtype=np.uint32)
+		hashes = (self.a[:, None] * ingredient_ids[None, :] + self.b[:, None]) % PRIME
+		return hashes.min(axis=1).astype(np.uint32)
+
+	# Signatures of the rows of a recipe x ingredient CSR matrix (uint32, n x num_perm), a block of rows at a time
+	def signatures(self, incidence, block_size=4096):
+		n = incidence.shape[0]
+		result = np.full((n, self.num_perm), PRIME, dtype=np.uint32)
+		for start in range(0, n, block_size):
+			block = incidence[start:start + block_size]
+			lengths = np.diff(block.indptr)
+			nonempty = lengths > 0
+			if not nonempty.any():
+				continue
+			hashes = (self.a[:, None] * block.indices[None, :].astype(np.int64) + self.b[:, None]) % PRIME
+			minimums = np.minimum.reduceat(hashes, block.indptr[:-1][nonempty], axis=1)
+			result[start + nonempty.nonzero()[0]] = minimums.T
+		return result
+
+	# Band keys of one or more signatures (int64, bands or n x bands)
+	def band_keys(self, signatures):
+		rows = np.asarray(signatures, dtype=np.uint64)
+		rows = rows.reshape(rows.shape[:-1] + (self.bands, self.num_perm // self.bands))
+		with np.errstate(over='ignore'):
+			keys = (rows * self.mix).sum(axis=-1, dtype=np.uint64) + np.arange(self.bands, dtype=np.uint64)
+		return keys.view(np.int64)
+
+
+class MinHashIndex(object):
+	"""
+	Approximate neighbours by shared ingredients, from signatures and band keys
+	persisted as RecipeSignature and SignatureBucket rows. Candidates cost one
+	indexed lookup on the bucket keys and are re-ranked by exact Jaccard similarity.
+	"""
+
+	def __init__(self, hasher=None, batch_size=500):
+		self.hasher = hasher or MinHasher()
+		self.batch_size = batch_size
+
+	# Store the signature and buckets of one recipe, replacing the previous ones
+	def update(self, recipe_id, ingredient_ids):
+		with transaction.atomic():
+			SignatureBucket.objects.filter(recipe_id=recipe_id).delete()
+			if not ingredient_ids:
+				RecipeSignature.objects.filter(recipe_id=recipe_id).delete()
+				return
+			signature = self.hasher.signature(ingredient_ids)
+			RecipeSignature.objects.update_or_create(recipe_id=recipe_id, defaults={'signature': signature.tobytes()})
+			SignatureBucket.objects.bulk_create([
+				SignatureBucket(recipe_id=recipe_id, key=int(key)) for key in self.hasher.band_keys(signature)
+			])
+
+	# Recompute every signature from RecipeFeatures, recipes without ingredients aren't indexed
+	def rebuild(self, features):
+		with transaction.atomic():
+			SignatureBucket.objects.all().delete()
+			RecipeSignature.objects.all().delete()
+			return self._store(features)
+
+	# Recompute the signatures of some recipes only, ex: the ones a batched import created or changed.
+	# Returns how many of them have ingredients and are indexed.
+	def update_recipes(self, recipe_ids, chunk_size=10000):
+		recipe_ids = sorted(set(recipe_ids))
+		indexed = 0
+		for i in range(0, len(recipe_ids), chunk_size):
+			chunk = recipe_ids[i:i+chunk_size]
+			with transaction.atomic():
+				for j in range(0, len(chunk), self.batch_size):
+					SignatureBucket.objects.filter(recipe_id__in=chunk[j:j+self.batch_size]).delete()
+					RecipeSignature.objects.filter(recipe_id__in=chunk[j:j+self.batch_size]).delete()
+				indexed += self._store(RecipeFeatures.load(Recipe.objects.filter(id__in=chunk)))
+		return indexed
+
+	def _store(self, features):
+		signatures = self.hasher.signatures(features.ingredients)
+		keys = self.hasher.band_keys(signatures)
+		indexed = np.diff(features.ingredients.indptr) > 0
+		RecipeSignature.objects.bulk_create([
+			RecipeSignature(recipe_id=int(recipe_id), signature=signature.tobytes())
+			for recipe_id, signature in zip(features.ids[indexed], signatures[indexed])
+		], batch_size=self.batch_size)
+		SignatureBucket.objects.bulk_create([
+			SignatureBucket(recipe_id=int(recipe_id), key=int(key))
+			for recipe_id, recipe_keys in zip(features.ids[indexed], keys[indexed]) for key in recipe_keys
+		], batch_size=self.batch_size)
+		return int(indexed.sum())
+
+	# Ids of recipes sharing at least one band key with the ingredient set
+	def candidates(self, ingredient_ids, exclude=None):
+		if not ingredient_ids:
+			return set()
+		keys = [int(key) for key in self.hasher.band_keys(self.hasher.signature(ingredient_ids))]
+		candidates = set(SignatureBucket.objects.filter(key__in=keys).values_list('recipe_id', flat=True))
+		candidates.discard(exclude)
+		return candidates
+
+	# Up to k (recipe id, Jaccard similarity) pairs among the candidates, best first
+	def similar(self, ingredient_ids, k=4, exclude=None):
+		ingredient_ids = set(ingredient_ids)
+		candidates = self.candidates(ingredient_ids, exclude)
+		if not candidates:
+			return []
+
+		candidate_sets = {}
+		candidates = sorted(candidates)
+		for i in range(0, len(candidates), self.batch_size):
+			links = Recipe.ingredients.through.objects.filter(recipe_id__in=candidates[i:i+self.batch_size]).values_list('recipe_id', 'ingredient_id')
+			for recipe_id, ingredient_id in links:
+				candidate_sets.setdefault(recipe_id, set()).add(ingredient_id)
+
+		scores = [
+			(recipe_id, len(ingredient_ids & others) / len(ingredient_ids | others))
+			for recipe_id, others in candidate_sets.items()
+		]
+		scores.sort(key=lambda pair: (-pair[1], pair[0]))
+		return scores[:k]
+
+	# Approximate neighbours of a saved recipe
+	def similar_to(self, recipe, k=4):
+		return self.similar(recipe.ingredients.values_list('id', flat=True), k, exclude=recipe.id)
+
+
+# Keeps the index in sync when a recipe's ingredients change, connected in MainConfig.ready
+def update_recipe_signature(sender, recipe, ingredient_ids, **kwargs):
+	MinHashIndex().update(recipe.id, ingredient_ids)
@@ -0,0 +1,78 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from main.recommender.similarity import ContentSimilarity
+from main.recommender.profiling import peak_rss_mb
+
+
+# Similarity mapped into each worker process by the pool initializer
+_similarity = None
+
+
+def _load_similarity(directory):
+	global _similarity
+	_similarity = ContentSimilarity.load(directory, mmap_mode='r')
+
+
+# Worker: top k neighbours of the rows in [start, stop), as (recipe ids, k neighbour ids per recipe)
+def neighbours_for_rows(start, stop, k, block_size, shard_size, tradeoff=1.0, pool=None):
+	neighbour_ids = np.empty((stop - start, k), dtype=np.int64)
+	for rows, neighbours, scores in _similarity.top_k(k, block_size, shard_size, start, stop, tradeoff, pool):
+		neighbour_ids[rows - start] = _similarity.ids[neighbours]
+	return np.array(_similarity.ids[start:stop]), neighbour_ids
+
+
+class ParallelTopK(object):
+	"""
+	Computes the top k neighbours of every recipe in a pool of worker processes.
+
+	The scoring vectors are written once to .npy files that every worker maps
+	read-only, so the catalog is shared through the page cache rather than pickled
+	per task. Workers each take a contiguous range of rows and send back only the
+	recipe ids and their neighbour ids, which are merged here for a single write.
+	Each worker's peak RSS comes back with its results, in worker_rss_mb by pid.
+	"""
+
+	def __init__(self, similarity, workers=None, shard_rows=None):
+		self.similarity = similarity
+		self.workers = workers or multiprocessing.cpu_count()
+		# Rows per task, a few tasks per worker evens out the load
+		self.shard_rows = shard_rows or max(1, -(-len(similarity) // (4 * self.workers)))
+		self.worker_rss_mb = {}
+
+	def shards(self):
+		n = len(self.similarity)
+		return [(start, min(start + self.shard_rows, n)) for start in range(0, n, self.shard_rows)]
+
+	# Yields (recipe ids, neighbour ids) per finished shard, in completion order
+	def run(self, k=4, block_size=1024, shard_size=None, tradeoff=1.0, pool=None):
+		k = max(0, min(k, len(self.similarity) - 1))
+		directory = tempfile.mkdtemp(prefix='recommender-')
+		try:
+			self.similarity.save(directory)
+			context = multiprocessing.get_context('fork')
+			with context.Pool(self.workers, initializer=_load_similarity, initargs=(directory,)) as workers:
+				tasks = [(start, stop, k, block_size, shard_size, tradeoff, pool) for start, stop in self.shards()]
+				for recipe_ids, neighbour_ids, pid, rss_mb in workers.imap_unordered(_run_task, tasks):
+					self.worker_rss_mb[pid] = max(rss_mb, self.worker_rss_mb.get(pid, 0))
+					yield recipe_ids, neighbour_ids
+		finally:
+			shutil.rmtree(directory, ignore_errors=True)
+
+	# All neighbours at once: recipe ids (n) and neighbour ids (n x k), ordered by recipe id
+	def neighbours(self, k=4, block_size=1024, shard_size=None, tradeoff=1.0, pool=None):
+		results = list(self.run(k, block_size, shard_size, tradeoff, pool))
+		if not results:
+			return np.empty(0, dtype=np.int64), np.empty((0, max(0, k)), dtype=np.int64)
+		recipe_ids = np.concatenate([ids for ids, neighbour_ids in results])
+		neighbour_ids = np.concatenate([neighbour_ids for ids, neighbour_ids in results])
+		order = np.argsort(recipe_ids)
+		return recipe_ids[order], neighbour_ids[order]
+
+
+def _run_task(task):
+	return neighbours_for_rows(*task) + (os.getpid(), peak_rss_mb())
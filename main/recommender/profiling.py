@@ -0,0 +1,18 @@
+import resource
+import sys
+
+
+# Peak resident set size of this process so far, in megabytes
+def peak_rss_mb():
+	return _megabytes(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+
+
+# Largest peak resident set size of the child processes that ended and were waited for
+# (ex: a finished process pool's workers), in megabytes. 0 when there were none.
+def peak_children_rss_mb():
+	return _megabytes(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+
+
+def _megabytes(peak):
+	# ru_maxrss is in bytes on macOS and kilobytes on Linux
+	return peak / (1024.0 * 1024) if sys.platform == 'darwin' else peak / 1024.0
@@ -0,0 +1,97 @@
+import json
+import os
+
+from main.recommender.artifacts import artifact_root, live_version, POINTER
+
+
+# Kinds of artifacts the web workers serve from
+KINDS = ('snapshot', 'als', 'walk')
+
+# Previously live versions remembered for rollback
+HISTORY_SIZE = 10
+
+
+class ModelRegistry(object):
+	"""
+	Versions of one kind of artifact and which of them is live. Recomputes write new
+	version directories next to the live one, nothing readers use is touched until
+	publish() replaces the LIVE pointer file in a single rename. Readers (LatestArtifact)
+	notice the new pointer on their next lookup. rollback() points back at the version
+	that was live before, without recomputing anything.
+	"""
+
+	def __init__(self, root):
+		self.root = root
+
+	@classmethod
+	def for_kind(cls, kind):
+		return cls(artifact_root(kind))
+
+	# Complete version names, oldest first
+	def versions(self):
+		if not os.path.isdir(self.root):
+			return []
+		return sorted(v for v in os.listdir(self.root) if not v.startswith('.') and os.path.exists(os.path.join(self.root, v, 'meta.json')))
+
+	# Name of the live version, None when there is none
+	def live(self):
+		directory = live_version(self.root)
+		return os.path.basename(directory) if directory else None
+
+	# Versions that rollback() goes back to, most recent last
+	def history(self):
+		try:
+			with open(os.path.join(self.root, POINTER)) as f:
+				return json.load(f).get('history', [])
+		except (OSError, ValueError):
+			return []
+
+	# Make a version live, remembering the current one for rollback
+	def publish(self, version):
+		if version not in self.versions():
+			raise ValueError("No complete version {} in {}.".format(version, self.root))
+		history = self.history()
+		current = self.live()
+		if current and current != version:
+			history = (history + [current])[-HISTORY_SIZE:]
+		self._point(version, history)
+
+	# Write down what is live now, even nothing, when there's no pointer yet: otherwise the newest
+	# version counts as live and a version saved next would go live without being published
+	def pin(self):
+		if not os.path.exists(os.path.join(self.root, POINTER)):
+			os.makedirs(self.root, exist_ok=True)
+			self._point(self.live(), self.history())
+
+	# Make the previously live version live again, returns its name
+	def rollback(self):
+		history = [version for version in self.history() if version in self.versions()]
+		if not history:
+			raise ValueError("No earlier version of {} to roll back to.".format(self.root))
+		version = history.pop()
+		self._point(version, history)
+		return version
+
+	def _point(self, version, history):
+		path = os.path.join(self.root, POINTER)
+		with open(path + '.tmp', 'w') as f:
+			json.dump({'version': version, 'history': history}, f, indent=2)
+		os.replace(path + '.tmp', path)
+
+
+# Publish a directory written by save_artifact, returns its version name
+def publish(directory):
+	root, version = os.path.split(os.path.normpath(directory))
+	ModelRegistry(root).publish(version)
+	return version
+
+
+# Save a version with save(root) and make it live unless told not to, in which case whatever was
+# live before stays live until recommendermodels publish. Returns the version directory.
+def save_version(save, root, live=True):
+	if not live:
+		ModelRegistry(root).pin()
+	directory = save(root)
+	if live:
+		publish(directory)
+	return directory
@@ -0,0 +1,61 @@
+from django.db import transaction
+
+from main.models import Recipe, CollaborativeNeighbour
+from main.recommender.snapshot import current_snapshot
+
+
+# Replace the related_recipes of each recipe id with its row of neighbour ids.
+# Rows are written in one direction only, so every recipe lists exactly its own neighbours.
+def save_related_recipes(recipe_ids, neighbour_ids, batch_size=500):
+	Through = Recipe.related_recipes.through
+	recipe_ids = [int(recipe_id) for recipe_id in recipe_ids]
+	links = [
+		Through(from_recipe_id=recipe_id, to_recipe_id=int(neighbour_id))
+		for recipe_id, neighbours in zip(recipe_ids, neighbour_ids) for neighbour_id in neighbours
+	]
+
+	with transaction.atomic():
+		for i in range(0, len(recipe_ids), batch_size):
+			Through.objects.filter(from_recipe_id__in=recipe_ids[i:i+batch_size]).delete()
+		Through.objects.bulk_create(links, batch_size=batch_size)
+	return len(links)
+
+
+# Replace every CollaborativeNeighbour row with (recipe id, neighbour ids, scores) rows
+def save_collaborative_neighbours(rows, batch_size=500):
+	links = [
+		CollaborativeNeighbour(recipe_id=int(recipe_id), neighbour_id=int(neighbour_id), score=float(score))
+		for recipe_id, neighbour_ids, scores in rows for neighbour_id, score in zip(neighbour_ids, scores)
+	]
+	with transaction.atomic():
+		CollaborativeNeighbour.objects.all().delete()
+		CollaborativeNeighbour.objects.bulk_create(links, batch_size=batch_size)
+	return len(links)
+
+
+# Related recipe ids of each recipe id as served, best first: the live snapshot's lists (see ModelRegistry),
+# so recomputes saved with --no-publish don't show and rollbacks bring the previous lists back. Recipes
+# the snapshot doesn't have (added since it was built, or all of them when no snapshot is live) use the
+# related_recipes rows, which imports, cold start and computerecommendations without --snapshot write.
+def live_related_ids(recipe_ids):
+	snapshot = current_snapshot()
+	related, missing = {}, []
+	for recipe_id in recipe_ids:
+		neighbour_ids = snapshot.neighbours(recipe_id) if snapshot else None
+		if neighbour_ids is None:
+			missing.append(recipe_id)
+		else:
+			related[recipe_id] = neighbour_ids
+	Through = Recipe.related_recipes.through
+	for i in range(0, len(missing), 500):
+		rows = Through.objects.filter(from_recipe_id__in=missing[i:i+500]).order_by('from_recipe_id', 'id').values_list('from_recipe_id', 'to_recipe_id')
+		for recipe_id, neighbour_id in rows:
+			related.setdefault(recipe_id, []).append(neighbour_id)
+	return related
+
+
+# Related recipes of a recipe as served, see live_related_ids
+def live_related_recipes(recipe, limit=None):
+	neighbour_ids = live_related_ids([recipe.id]).get(recipe.id, [])[:limit]
+	recipes = Recipe.objects.in_bulk(neighbour_ids)
+	return [recipes[recipe_id] for recipe_id in neighbour_ids if recipe_id in recipes]
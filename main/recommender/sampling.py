@@ -0,0 +1,30 @@
+import datetime
+import hashlib
+import random
+from itertools import islice
+
+
+# Seed that stays the same for a user during a day, so sampled pages are stable and cacheable
+def daily_seed(profile_id, day=None):
+	day = day or datetime.date.today()
+	digest = hashlib.sha1('{}:{}'.format(profile_id, day.isoformat()).encode('utf-8')).hexdigest()
+	return int(digest[:16], 16)
+
+
+# k items drawn uniformly from an iterable of unknown length in one pass (reservoir sampling),
+# in the order they were drawn. Memory is O(k) however long the iterable is.
+def reservoir_sample(items, k, seed=None):
+	generator = random.Random(seed)
+	items = iter(items)
+	reservoir = list(islice(items, k))
+	for seen, item in enumerate(items, k + 1):
+		slot = generator.randrange(seen)
+		if slot < k:
+			reservoir[slot] = item
+	generator.shuffle(reservoir)
+	return reservoir
+
+
+# k distinct positions out of 1..count, seeded, for random offsets into a ranked set
+def sample_positions(count, k, seed=None):
+	return random.Random(seed).sample(range(1, count + 1), min(k, count))
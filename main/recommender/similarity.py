@@ -0,0 +1,126 @@
+import os
+
+import numpy as np
+from scipy import sparse
+
+from main.recommender.diversity import mmr
+
+
+# Scale rows to unit length, rows of zeros stay zero
+def normalize_rows(matrix):
+	if sparse.issparse(matrix):
+		norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+		norms[norms == 0] = 1
+		return sparse.diags(1 / norms).dot(matrix).tocsr().astype(np.float32)
+	norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+	norms[norms == 0] = 1
+	return (matrix / norms).astype(np.float32)
+
+
+class ContentSimilarity(object):
+	"""
+	Cosine similarity between recipes, blending the six flavor values (centered on
+	the catalog mean, so flavors score relative to an average recipe) with the
+	ingredient sets (idf weighted, so salt and water count for less than saffron).
+	"""
+
+	def __init__(self, features, flavor_weight=0.5):
+		self.ids = features.ids
+		self.flavor_weight = flavor_weight
+
+		flavors = features.flavors - features.flavors.mean(axis=0) if len(features) else features.flavors
+		self.flavor_vectors = normalize_rows(flavors)
+
+		ingredients = features.ingredients
+		document_frequency = np.asarray(ingredients.sum(axis=0)).ravel()
+		idf = np.log((1.0 + len(features)) / (1.0 + document_frequency)).astype(np.float32) + 1
+		self.ingredient_vectors = normalize_rows(ingredients.dot(sparse.diags(idf)))
+
+	def __len__(self):
+		return len(self.ids)
+
+	# Write the scoring vectors as .npy files in directory, see load
+	def save(self, directory):
+		arrays = {
+			'ids': self.ids,
+			'flavor_weight': np.array(self.flavor_weight),
+			'flavor_vectors': self.flavor_vectors,
+			'ingredient_data': self.ingredient_vectors.data,
+			'ingredient_indices': self.ingredient_vectors.indices,
+			'ingredient_indptr': self.ingredient_vectors.indptr,
+			'ingredient_shape': np.array(self.ingredient_vectors.shape),
+		}
+		for name, array in arrays.items():
+			np.save(os.path.join(directory, name + '.npy'), array)
+
+	# Similarity from vectors written by save, mapped read-only by default so
+	# processes loading the same directory share the pages instead of copying them
+	@classmethod
+	def load(cls, directory, mmap_mode='r'):
+		def array(name):
+			return np.load(os.path.join(directory, name + '.npy'), mmap_mode=mmap_mode)
+
+		similarity = cls.__new__(cls)
+		similarity.ids = array('ids')
+		similarity.flavor_weight = float(array('flavor_weight'))
+		similarity.flavor_vectors = array('flavor_vectors')
+		similarity.ingredient_vectors = sparse.csr_matrix(
+			(array('ingredient_data'), array('ingredient_indices'), array('ingredient_indptr')),
+			shape=tuple(array('ingredient_shape')), copy=False)
+		return similarity
+
+	# Similarity of the recipes at row positions [start, stop) to those at [col_start, col_stop), as a dense block
+	def score_block(self, start, stop, col_start=0, col_stop=None):
+		flavor_scores = self.flavor_vectors[start:stop].dot(self.flavor_vectors[col_start:col_stop].T)
+		ingredient_scores = self.ingredient_vectors[start:stop].dot(self.ingredient_vectors[col_start:col_stop].T).toarray()
+		return self.flavor_weight * flavor_scores + (1 - self.flavor_weight) * ingredient_scores
+
+	# Similarity of the recipes at positions rows_a[i] and rows_b[i], for arrays of pairs of any shape
+	def pair_scores(self, rows_a, rows_b):
+		rows_a, rows_b = np.asarray(rows_a), np.asarray(rows_b)
+		a, b = rows_a.ravel(), rows_b.ravel()
+		flavor_scores = (self.flavor_vectors[a] * self.flavor_vectors[b]).sum(axis=1)
+		ingredient_scores = np.asarray(self.ingredient_vectors[a].multiply(self.ingredient_vectors[b]).sum(axis=1)).ravel()
+		scores = self.flavor_weight * flavor_scores + (1 - self.flavor_weight) * ingredient_scores
+		return scores.reshape(rows_a.shape).astype(np.float32)
+
+	# Yields (row positions, neighbour positions, scores) per block of rows, neighbours sorted best first.
+	# Each row block is scored against column shards of the catalog and reduced to a running top k,
+	# so peak memory is about block_size x shard_size scores whatever the catalog size.
+	# Only rows in [row_start, row_stop) are scored, neighbours come from the whole catalog.
+	# With a tradeoff below 1 the k neighbours are picked by MMR among the best pool (default 3k),
+	# trading relevance for neighbours that aren't near duplicates of each other.
+	def top_k(self, k=4, block_size=1024, shard_size=None, row_start=0, row_stop=None, tradeoff=1.0, pool=None):
+		n = len(self)
+		k = min(k, n - 1)
+		final_k, k = k, min(max(k, pool or 3 * k), n - 1) if tradeoff < 1 else k
+		shard_size = shard_size or n
+		row_stop = n if row_stop is None else min(row_stop, n)
+		for start in range(row_start, row_stop, block_size):
+			stop = min(start + block_size, row_stop)
+			rows = np.arange(start, stop)
+			best = np.empty((len(rows), 0), dtype=np.int64)
+			best_scores = np.empty((len(rows), 0), dtype=np.float32)
+
+			for col_start in range(0, n if k > 0 else 0, shard_size):
+				col_stop = min(col_start + shard_size, n)
+				scores = self.score_block(start, stop, col_start, col_stop)
+				own = (rows >= col_start) & (rows < col_stop)
+				scores[own.nonzero()[0], rows[own] - col_start] = -np.inf # A recipe doesn't recommend itself
+
+				shard_k = min(k, col_stop - col_start)
+				candidates = np.argpartition(-scores, shard_k - 1, axis=1)[:, :shard_k]
+				best = np.hstack([best, candidates + col_start])
+				best_scores = np.hstack([best_scores, np.take_along_axis(scores, candidates, axis=1)])
+				if best.shape[1] > k:
+					keep = np.argpartition(-best_scores, k - 1, axis=1)[:, :k]
+					best = np.take_along_axis(best, keep, axis=1)
+					best_scores = np.take_along_axis(best_scores, keep, axis=1)
+
+			order = np.argsort(-best_scores, axis=1)
+			best, best_scores = np.take_along_axis(best, order, axis=1), np.take_along_axis(best_scores, order, axis=1)
+			if k > final_k:
+				pairwise = self.pair_scores(best[:, :, None].repeat(k, axis=2), best[:, None, :].repeat(k, axis=1))
+				order = mmr(best_scores, pairwise, final_k, tradeoff)
+				best, best_scores = np.take_along_axis(best, order, axis=1), np.take_along_axis(best_scores, order, axis=1)
+			yield rows, best, best_scores
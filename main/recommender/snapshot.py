@@ -0,0 +1,173 @@
+import json
+import os
+
+import numpy as np
+
+from main.models import Recipe, FLAVORS
+from main.recommender.artifacts import artifact_root, save_artifact, load_artifact, latest_version, LatestArtifact
+
+
+class RecommenderSnapshot(object):
+	"""
+	Read-only serving copy of the recommender indexes as flat arrays: recipe ids
+	(int64, sorted), flavors (float32, n x 6) and related recipes as CSR lists,
+	the neighbours of recipe_ids[i] being neighbour_ids[indptr[i]:indptr[i + 1]].
+
+	Loaded memory-mapped, so every worker on a box shares the same physical pages
+	and pays only for the pages it touches. Lookups go through searchsorted on the
+	id array rather than per-process dicts. Each saved snapshot gets the next
+	generation number, workers switch to it on their next lookup.
+
+	Flavor queries go through a grid saved with the snapshot, so it's mapped and
+	shared too: each flavor is cut into GRID_BINS ranges, cell_order lists the
+	rows cell by cell and the rows of cell c are cell_order[cell_indptr[c]:cell_indptr[c + 1]].
+	A query scans cells nearest first and stops once the next cell is farther than
+	its k-th best, nothing is built or copied per worker.
+	"""
+
+	NAMES = ('recipe_ids', 'flavors', 'indptr', 'neighbour_ids')
+	GRID_NAMES = ('cell_order', 'cell_indptr')
+
+	def __init__(self, recipe_ids, flavors, indptr, neighbour_ids, meta=None, cell_order=None, cell_indptr=None):
+		self.recipe_ids = recipe_ids
+		self.flavors = flavors
+		self.indptr = indptr
+		self.neighbour_ids = neighbour_ids
+		self.meta = meta or {}
+		if cell_order is None: # New snapshots, or ones saved before the grid was
+			cell_order, cell_indptr = flavor_grid(flavors)
+		self.cell_order = cell_order
+		self.cell_indptr = cell_indptr
+
+	def __len__(self):
+		return len(self.recipe_ids)
+
+	@property
+	def version(self):
+		return self.meta.get('version')
+
+	@property
+	def generation(self):
+		return self.meta.get('generation')
+
+	# Snapshot of the current flavors and related_recipes
+	@classmethod
+	def from_database(cls):
+		rows = list(Recipe.objects.order_by('id').values_list('id', *FLAVORS))
+		recipe_ids = np.array([row[0] for row in rows], dtype=np.int64)
+		flavors = np.array([row[1:] for row in rows], dtype=np.float32).reshape(len(rows), len(FLAVORS))
+
+		links = np.array(list(Recipe.related_recipes.through.objects.order_by('from_recipe_id', 'id')\
+			.values_list('from_recipe_id', 'to_recipe_id')), dtype=np.int64).reshape(-1, 2)
+		counts = np.bincount(np.searchsorted(recipe_ids, links[:, 0]), minlength=len(recipe_ids))
+		indptr = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+		return cls(recipe_ids, flavors, indptr, links[:, 1].copy())
+
+	# Snapshot of freshly computed neighbours, without going through related_recipes: neighbour_ids[i]
+	# (one row of k ids per recipe) are the related recipes of recipe_ids[i], in any recipe order
+	@classmethod
+	def from_neighbours(cls, recipe_ids, flavors, neighbour_ids):
+		order = np.argsort(recipe_ids, kind='mergesort')
+		neighbour_ids = np.asarray(neighbour_ids, dtype=np.int64).reshape(len(order), -1)[order]
+		indptr = np.arange(len(order) + 1, dtype=np.int64) * neighbour_ids.shape[1]
+		return cls(np.asarray(recipe_ids, dtype=np.int64)[order], np.asarray(flavors, dtype=np.float32)[order], indptr, neighbour_ids.ravel())
+
+	def save(self, root=None):
+		root = root or snapshot_root()
+		previous = latest_version(root)
+		generation = 1
+		if previous:
+			with open(os.path.join(previous, 'meta.json')) as f:
+				generation = json.load(f).get('generation', 0) + 1
+		directory, self.meta = save_artifact(root, {
+			'recipe_ids': self.recipe_ids, 'flavors': self.flavors, 'indptr': self.indptr, 'neighbour_ids': self.neighbour_ids,
+			'cell_order': self.cell_order, 'cell_indptr': self.cell_indptr,
+		}, dict(self.meta, generation=generation, recipes=len(self), links=len(self.neighbour_ids)))
+		return directory
+
+	@classmethod
+	def load(cls, directory, mmap_mode='r'):
+		names = cls.NAMES + tuple(name for name in cls.GRID_NAMES if os.path.exists(os.path.join(directory, name + '.npy')))
+		arrays, meta = load_artifact(directory, names, mmap_mode)
+		return cls(*[arrays[name] for name in cls.NAMES], meta=meta, cell_order=arrays.get('cell_order'), cell_indptr=arrays.get('cell_indptr'))
+
+	# Row of a recipe id, None when the recipe isn't in the snapshot
+	def position(self, recipe_id):
+		position = int(np.searchsorted(self.recipe_ids, recipe_id))
+		if position < len(self.recipe_ids) and self.recipe_ids[position] == recipe_id:
+			return position
+		return None
+
+	# Related recipe ids of a recipe, best first, None when the recipe isn't in the snapshot
+	def neighbours(self, recipe_id):
+		position = self.position(recipe_id)
+		if position is None:
+			return None
+		return [int(neighbour_id) for neighbour_id in self.neighbour_ids[self.indptr[position]:self.indptr[position + 1]]]
+
+	# Up to k (recipe id, distance) pairs closest to a flavor vector, closest first, like FlavorIndex.nearest
+	def nearest(self, flavors, k=10, exclude=None):
+		excluded = None if exclude is None else self.position(exclude)
+		count = min(k, len(self) - (excluded is not None))
+		if count < 1:
+			return []
+		target = np.asarray(flavors, dtype=np.float32)
+		# Squared distance from the target to each non-empty cell's box
+		gaps = np.maximum(np.maximum(_BIN_LOWER[:, None] - target, target - _BIN_UPPER[:, None]), 0)
+		cells = np.flatnonzero(np.diff(self.cell_indptr))
+		cell_distances = np.square(gaps[_CELL_BINS[cells], np.arange(len(FLAVORS))]).sum(axis=1)
+		order = np.argsort(cell_distances, kind='mergesort')
+
+		positions, distances = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+		for cell, cell_distance in zip(cells[order], cell_distances[order]):
+			if len(positions) == count and cell_distance > distances.max():
+				break
+			rows = np.asarray(self.cell_order[self.cell_indptr[cell]:self.cell_indptr[cell + 1]])
+			if excluded is not None:
+				rows = rows[rows != excluded]
+			positions = np.concatenate([positions, rows])
+			distances = np.concatenate([distances, np.square(self.flavors[rows] - target).sum(axis=1)])
+			if len(positions) > count:
+				best = np.lexsort((positions, distances))[:count]
+				positions, distances = positions[best], distances[best]
+		best = np.lexsort((positions, distances))
+		return [(int(self.recipe_ids[p]), float(np.sqrt(d))) for p, d in zip(positions[best], distances[best])]
+
+	# Up to k (recipe id, distance) pairs closest in flavor to a recipe, None when the recipe isn't in the snapshot
+	def similar_to(self, recipe_id, k=10):
+		position = self.position(recipe_id)
+		if position is None:
+			return None
+		return self.nearest(self.flavors[position], k, exclude=recipe_id)
+
+
+# Ranges per flavor of the snapshot grid, GRID_BINS ** 6 cells. The outer ranges are open ended
+# so flavors outside [0, 1] still land in a cell whose box holds them.
+GRID_BINS = 4
+_BIN_LOWER = np.concatenate([[-np.inf], np.arange(1, GRID_BINS) / GRID_BINS]).astype(np.float32)
+_BIN_UPPER = np.concatenate([np.arange(1, GRID_BINS) / GRID_BINS, [np.inf]]).astype(np.float32)
+# Bin of each flavor for every cell, cell = sum of bin * GRID_BINS ** flavor
+_CELL_BINS = np.array(np.unravel_index(np.arange(GRID_BINS ** len(FLAVORS)), (GRID_BINS,) * len(FLAVORS), order='F')).T
+
+
+# (cell_order, cell_indptr) of the grid over an n x 6 flavor matrix
+def flavor_grid(flavors):
+	flavors = np.asarray(flavors, dtype=np.float32).reshape(-1, len(FLAVORS))
+	bins = np.clip(np.floor(flavors * GRID_BINS), 0, GRID_BINS - 1).astype(np.int64)
+	cells = (bins * GRID_BINS ** np.arange(len(FLAVORS))).sum(axis=1)
+	cell_order = np.argsort(cells, kind='mergesort').astype(np.int64)
+	counts = np.bincount(cells, minlength=GRID_BINS ** len(FLAVORS))
+	return cell_order, np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+
+# Snapshots live in RECOMMENDER_ARTIFACT_DIR/snapshot, one versioned directory per generation
+_latest_snapshot = LatestArtifact('snapshot', RecommenderSnapshot.load)
+
+
+def snapshot_root():
+	return artifact_root('snapshot')
+
+
+# Newest snapshot mapped in this process, None until computerecommendations --snapshot has run
+def current_snapshot():
+	return _latest_snapshot.get()
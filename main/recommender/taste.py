@@ -0,0 +1,69 @@
+import numpy as np
+from django.db.models import F, Sum, Count
+
+from main.models import Recipe, Profile, FlavorProfile, FLAVORS
+
+
+# Weight of the mean disliked flavors subtracted from the mean liked flavors
+DISLIKE_WEIGHT = 0.5
+
+
+# A profile's taste: mean flavors of its liked recipes minus DISLIKE_WEIGHT times the mean of its
+# disliked ones (float32, 6). None when it has neither. Profiles without a FlavorProfile row yet get one.
+def taste_vector(profile_id):
+	row = FlavorProfile.objects.filter(profile_id=profile_id).first() or rebuild_flavor_profile(profile_id)
+	if not row.liked_count and not row.disliked_count:
+		return None
+	taste = np.zeros(len(FLAVORS), dtype=np.float32)
+	if row.liked_count:
+		taste += np.array([getattr(row, 'liked_' + flavor) for flavor in FLAVORS], dtype=np.float32) / row.liked_count
+	if row.disliked_count:
+		taste -= DISLIKE_WEIGHT * np.array([getattr(row, 'disliked_' + flavor) for flavor in FLAVORS], dtype=np.float32) / row.disliked_count
+	return taste
+
+
+# Recompute a profile's sums from its liked and disliked recipes, for profiles that voted before
+# they had a row and to clear float drift or recipes whose flavors were edited since
+def rebuild_flavor_profile(profile_id):
+	values = {}
+	for kind in ('liked', 'disliked'):
+		links = getattr(Profile, kind + '_recipes').through.objects.filter(profile_id=profile_id)
+		totals = links.aggregate(count=Count('id'), **{flavor: Sum('recipe__' + flavor) for flavor in FLAVORS})
+		values[kind + '_count'] = totals['count']
+		values.update({kind + '_' + flavor: totals[flavor] or 0 for flavor in FLAVORS})
+	row, created = FlavorProfile.objects.update_or_create(profile_id=profile_id, defaults=values)
+	return row
+
+
+# Add (sign 1) or take out (sign -1) one recipe's flavors per (profile id, recipe id) pair:
+# a single UPDATE of the running sums, however many recipes the profile has voted on
+def apply_flavor_votes(kind, pairs, sign):
+	if not pairs:
+		return
+	flavors = {row[0]: row[1:] for row in Recipe.objects.filter(id__in={recipe_id for profile_id, recipe_id in pairs}).values_list('id', *FLAVORS)}
+	for profile_id, recipe_id in pairs:
+		changes = {kind + '_' + flavor: F(kind + '_' + flavor) + sign * value for flavor, value in zip(FLAVORS, flavors[recipe_id])}
+		changes[kind + '_count'] = F(kind + '_count') + sign
+		if not FlavorProfile.objects.filter(profile_id=profile_id).update(**changes):
+			rebuild_flavor_profile(profile_id) # The vote is already in (or out of) the M2M table
+
+
+# (profile id, recipe id) links that a remove or clear is about to delete, pk_set is None for clears
+def _links_going(sender, instance, reverse, pk_set):
+	links = sender.objects.filter(**{'recipe_id' if reverse else 'profile_id': instance.id})
+	if pk_set is not None:
+		links = links.filter(**{'profile_id__in' if reverse else 'recipe_id__in': pk_set})
+	return list(links.values_list('profile_id', 'recipe_id'))
+
+
+# Receiver for m2m_changed on the liked and disliked through models, connected in MainConfig.ready.
+# Removes only count links that existed, so they're looked up before the delete.
+def update_flavor_profile(sender, instance, action, reverse, pk_set, **kwargs):
+	kind = 'liked' if sender is Profile.liked_recipes.through else 'disliked'
+	if action == 'post_add':
+		apply_flavor_votes(kind, [(other_id, instance.id) if reverse else (instance.id, other_id) for other_id in pk_set], 1)
+	elif action in ('pre_remove', 'pre_clear'):
+		instance._flavor_links_going = _links_going(sender, instance, reverse, pk_set if action == 'pre_remove' else None)
+	elif action in ('post_remove', 'post_clear'):
+		apply_flavor_votes(kind, getattr(instance, '_flavor_links_going', []), -1)
+		instance._flavor_links_going = []
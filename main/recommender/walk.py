@@ -0,0 +1,182 @@
+import numpy as np
+from scipy import sparse
+
+from main.models import Recipe, Ingredient, Profile
+from main.recommender.artifacts import save_artifact, load_artifact, LatestArtifact
+
+
+class InteractionGraph(object):
+	"""
+	Undirected graph of profiles, recipes and ingredients as a column-stochastic
+	sparse transition matrix. Nodes are laid out as [profiles | recipes | ingredients]
+	and edges come from liked and saved recipes, related_recipes and recipe ingredients.
+	"""
+
+	def __init__(self, profile_ids, recipe_ids, ingredient_ids, edges):
+		self.profile_ids = profile_ids
+		self.recipe_ids = recipe_ids
+		self.ingredient_ids = ingredient_ids
+		self.recipe_offset = len(profile_ids)
+		self.ingredient_offset = self.recipe_offset + len(recipe_ids)
+		size = self.ingredient_offset + len(ingredient_ids)
+
+		adjacency = sparse.coo_matrix((np.ones(len(edges), dtype=np.float32), (edges[:, 0], edges[:, 1])), shape=(size, size)).tocsr()
+		adjacency = adjacency + adjacency.T
+		adjacency.data[:] = 1 # Edges found both ways (related_recipes) count once
+		degree = np.asarray(adjacency.sum(axis=0)).ravel()
+		degree[degree == 0] = 1
+		self.transition = adjacency.dot(sparse.diags(1 / degree)).tocsr().astype(np.float32)
+
+	def __len__(self):
+		return self.transition.shape[0]
+
+	# feedback replaces the liked and saved (profile id, recipe id) pairs, ex: a training split
+	@classmethod
+	def load(cls, feedback=None):
+		def pairs(queryset, *fields):
+			return np.array(list(queryset.values_list(*fields)), dtype=np.int64).reshape(-1, 2)
+
+		related = pairs(Recipe.related_recipes.through.objects, 'from_recipe_id', 'to_recipe_id')
+		ingredients = pairs(Recipe.ingredients.through.objects, 'recipe_id', 'ingredient_id')
+
+		if feedback is None:
+			liked = pairs(Profile.liked_recipes.through.objects, 'profile_id', 'recipe_id')
+			saved = pairs(Profile.saved_recipes.through.objects, 'profile_id', 'recipe_id')
+			feedback = np.vstack([liked, saved])
+		feedback = np.asarray(feedback, dtype=np.int64).reshape(-1, 2)
+		profile_ids = np.unique(feedback[:, 0])
+		recipe_ids = np.array(Recipe.objects.order_by('id').values_list('id', flat=True), dtype=np.int64)
+		ingredient_ids = np.array(Ingredient.objects.order_by('id').values_list('id', flat=True), dtype=np.int64)
+
+		recipe_offset, ingredient_offset = len(profile_ids), len(profile_ids) + len(recipe_ids)
+		edges = np.vstack([
+			np.column_stack([np.searchsorted(profile_ids, feedback[:, 0]), recipe_offset + np.searchsorted(recipe_ids, feedback[:, 1])]),
+			recipe_offset + np.searchsorted(recipe_ids, related),
+			np.column_stack([recipe_offset + np.searchsorted(recipe_ids, ingredients[:, 0]), ingredient_offset + np.searchsorted(ingredient_ids, ingredients[:, 1])]),
+		]).astype(np.int64)
+		return cls(profile_ids, recipe_ids, ingredient_ids, edges)
+
+	# Node of a profile, None for profiles without likes or saves
+	def profile_node(self, profile_id):
+		position = np.searchsorted(self.profile_ids, profile_id)
+		if position < len(self.profile_ids) and self.profile_ids[position] == profile_id:
+			return int(position)
+		return None
+
+	# Recipe nodes the profile is linked to (its likes and saves)
+	def profile_recipes(self, node):
+		neighbours = self.transition[node].indices # The adjacency is symmetric, a row lists the node's edges
+		return neighbours[(neighbours >= self.recipe_offset) & (neighbours < self.ingredient_offset)] - self.recipe_offset
+
+
+class RandomWalk(object):
+	"""
+	Personalized PageRank (random walk with restart): scores are the stationary
+	visit probabilities of a walk over the graph that jumps back to the user's node
+	with probability restart at every step. Computed by sparse power iteration,
+	stopping once an iteration moves less than tolerance (L1) of the mass.
+	"""
+
+	def __init__(self, graph, restart=0.3, tolerance=1e-6, max_iterations=50):
+		self.graph = graph
+		self.restart = restart
+		self.tolerance = tolerance
+		self.max_iterations = max_iterations
+
+	# Visit probabilities of every node for the restart columns (nodes x users), and iterations used
+	def iterate(self, restart_vectors):
+		scores = restart_vectors.copy()
+		for iteration in range(1, self.max_iterations + 1):
+			updated = (1 - self.restart) * self.graph.transition.dot(scores) + self.restart * restart_vectors
+			change = np.abs(updated - scores).sum(axis=0).max()
+			scores = updated
+			if change < self.tolerance:
+				break
+		return scores, iteration
+
+	# Up to k (recipe ids, scores) for one profile, excluding its liked and saved recipes.
+	# None when the profile has no likes or saves.
+	def recommend(self, profile_id, k=10, exclude=()):
+		node = self.graph.profile_node(profile_id)
+		if node is None:
+			return None
+		restart_vector = np.zeros((len(self.graph), 1), dtype=np.float32)
+		restart_vector[node] = 1
+		scores, self.iterations = self.iterate(restart_vector)
+		return self.top_recipes(node, scores[:, 0], k, exclude)
+
+	# (profile id, recipe ids, scores) for every profile, walking batch_size profiles at once
+	def recommend_all(self, k=10, batch_size=256):
+		profile_count = len(self.graph.profile_ids)
+		for start in range(0, profile_count, batch_size):
+			nodes = np.arange(start, min(start + batch_size, profile_count))
+			restart_vectors = np.zeros((len(self.graph), len(nodes)), dtype=np.float32)
+			restart_vectors[nodes, np.arange(len(nodes))] = 1
+			scores, self.iterations = self.iterate(restart_vectors)
+			for column, node in enumerate(nodes):
+				recipe_ids, recipe_scores = self.top_recipes(node, scores[:, column], k)
+				yield int(self.graph.profile_ids[node]), recipe_ids, recipe_scores
+
+	def top_recipes(self, node, scores, k, exclude=()):
+		graph = self.graph
+		recipe_scores = scores[graph.recipe_offset:graph.ingredient_offset].copy()
+		recipe_scores[graph.profile_recipes(node)] = 0
+		exclude = np.asarray(exclude, dtype=np.int64)
+		positions = np.searchsorted(graph.recipe_ids, exclude)
+		valid = positions < len(graph.recipe_ids)
+		positions, exclude = positions[valid], exclude[valid]
+		recipe_scores[positions[graph.recipe_ids[positions] == exclude]] = 0
+		candidates = np.flatnonzero(recipe_scores > 0)
+		best = candidates[np.lexsort((candidates, -recipe_scores[candidates]))][:k]
+		return graph.recipe_ids[best], recipe_scores[best]
+
+
+class WalkRecommendations(object):
+	"""
+	Batch random walk results as CSR lists: the recipes of profile_ids[i] are
+	recipe_ids[indptr[i]:indptr[i + 1]], best first, with their scores.
+	"""
+
+	def __init__(self, profile_ids, indptr, recipe_ids, scores, meta=None):
+		self.profile_ids = profile_ids
+		self.indptr = indptr
+		self.recipe_ids = recipe_ids
+		self.scores = scores
+		self.meta = meta or {}
+
+	@classmethod
+	def from_rows(cls, rows, meta=None):
+		profile_ids, indptr, recipe_ids, scores = [], [0], [], []
+		for profile_id, ids, row_scores in rows:
+			profile_ids.append(profile_id)
+			recipe_ids.extend(ids)
+			scores.extend(row_scores)
+			indptr.append(len(recipe_ids))
+		return cls(np.array(profile_ids, dtype=np.int64), np.array(indptr, dtype=np.int64),
+			np.array(recipe_ids, dtype=np.int64), np.array(scores, dtype=np.float32), meta)
+
+	def save(self, root):
+		directory, self.meta = save_artifact(root, {
+			'profile_ids': self.profile_ids, 'indptr': self.indptr, 'recipe_ids': self.recipe_ids, 'scores': self.scores,
+		}, self.meta)
+		return directory
+
+	@classmethod
+	def load(cls, directory):
+		arrays, meta = load_artifact(directory, ('profile_ids', 'indptr', 'recipe_ids', 'scores'))
+		return cls(arrays['profile_ids'], arrays['indptr'], arrays['recipe_ids'], arrays['scores'], meta)
+
+	# Recipe ids for a profile, best first, empty when the profile wasn't walked
+	def for_profile(self, profile_id):
+		position = np.searchsorted(self.profile_ids, profile_id)
+		if position >= len(self.profile_ids) or self.profile_ids[position] != profile_id:
+			return []
+		return [int(recipe_id) for recipe_id in self.recipe_ids[self.indptr[position]:self.indptr[position + 1]]]
+
+
+# Latest batch under RECOMMENDER_ARTIFACT_DIR/walk
+_latest_walk = LatestArtifact('walk', WalkRecommendations.load)
+
+
+def current_walk_recommendations():
+	return _latest_walk.get()
@@ -2,6 +2,7 @@ from django.contrib.auth.models import User, Group
 from rest_framework import serializers 
 
 from .models import Recipe, Ingredient, Profile, RecipeVote
+from .recommender.related import live_related_recipes
 
 
 ############################################################
@@ -53,7 +54,7 @@ class UserSerializer(serializers.ModelSerializer):
 
 class RecipeDetailSerializer(serializers.ModelSerializer):
 	ingredients = IngredientSerializer(read_only=True, many=True)
-	related_recipes = RecipeSerializer(many=True)
+	related_recipes = serializers.SerializerMethodField()
 	creator = UserSerializer()
 
 	class Meta:
@@ -63,6 +64,10 @@ class RecipeDetailSerializer(serializers.ModelSerializer):
 			'yummly_image_url', 'bitter', 'meaty', 'salty', 'sour', 'sweet', 'piquant',
 			'date_created', 'date_modified', 'ingredients', 'related_recipes',)
 
+	# Resolved through the live recommender snapshot
+	def get_related_recipes(self, recipe):
+		return RecipeSerializer(live_related_recipes(recipe), many=True, context=self.context).data
+
 class RecipeCreateSerializer(serializers.ModelSerializer):
 	class Meta:
 		model = Recipe 
@@ -1,10 +1,49 @@
 from django.test import TestCase, RequestFactory
 from django.test import tag
+from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.contrib.auth.models import User 
+from django.conf import settings
+from django.utils import timezone
 from rest_framework.test import APIRequestFactory
-
-from .models import Recipe, Ingredient, Profile, RecipeVote 
+import csv
+import json
+import datetime
+import os
+import tempfile
+import numpy as np
+from scipy import sparse
+from io import StringIO
+from unittest import mock
+
+from .models import Recipe, Ingredient, Profile, RecipeVote, ImportCheckpoint, SignatureBucket, RecipeSignature, FlavorProfile
 from .views import recipes, users, api 
+from .importer.rows import parse_recipe_row
+from .importer.writers import RecipeWriter, BulkRecipeWriter, UpsertRecipeWriter
+from .importer.stream import StreamingImport
+from .importer.parallel import ParallelImport
+from .importer.reset import reset_recipe_data
+from .importer.readers import detect_format, read_records
+from .recommender.features import RecipeFeatures
+from .recommender.similarity import ContentSimilarity
+from .recommender.parallel import ParallelTopK
+from .recommender.diversity import mmr
+from .recommender.coldstart import link_cold_start_neighbours
+from .recommender.snapshot import RecommenderSnapshot, current_snapshot
+from .recommender.registry import ModelRegistry
+from .recommender.related import live_related_recipes, save_related_recipes
+from .serializers import RecipeDetailSerializer
+from .recommender.evaluation import TimeSplit, RECOMMENDERS, evaluate
+from .recommender.taste import taste_vector, rebuild_flavor_profile
+from .recommender.minhash import MinHasher, MinHashIndex
+from .recommender.flavor import FlavorIndex, flavor_index, rebuild_flavor_index
+from .recommender.interactions import Interactions
+from .recommender.feed import home_recommendations, compute_home_recommendations, refresh_user_recommendations, diversify, rank_by_model, vote_neighbours
+from .recommender.sampling import daily_seed, reservoir_sample, sample_positions
+from .recommender.metrics import holdout_split, precision_recall_at_k, coverage
+from .recommender.als import current_als_model
+from .recommender.walk import InteractionGraph, RandomWalk, current_walk_recommendations
+from .importer.recommendations import RecommendationLinker
 
 
 ########################################################
@@ -22,6 +61,28 @@ class RecipeTests(TestCase):
 		self.assertEqual(r.ingredients.count(), 3)
 
 
+	def test_ingredient_ids_are_read_from_the_database(self):
+		chicken = Ingredient.objects.get(raw_name='chicken')
+		# Deleted by another process (ex: importrecipedata --restart), no signal reaches this one
+		Ingredient.objects.filter(id=chicken.id)._raw_delete(Ingredient.objects.db)
+		with self.assertNumQueries(3): # One select, one insert and the select of the new id
+			ids = Ingredient.ids_for_names(['chicken', 'rice'])
+		self.assertNotEqual(ids[0], chicken.id)
+		self.assertEqual(Ingredient.objects.get(raw_name='chicken').id, ids[0])
+
+
+	def test_relink_ingredients_only_when_list_changes(self):
+		r = Recipe.objects.get(name='Chicken Rice')
+		r.name = 'Chicken And Rice'
+		with self.assertNumQueries(1): # Just the update
+			r.save()
+
+		r.ingredient_list = 'chicken rice peas'
+		r.save()
+		self.assertEqual(sorted(r.ingredients.values_list('raw_name', flat=True)), ['chicken', 'peas', 'rice'])
+		self.assertEqual(Ingredient.objects.filter(raw_name='chicken').count(), 1)
+
+
 	def test_add_to_user_saved_recipes_fail_when_get(self):
 		request = self.factory.get('/save_recipe')
 		request.user = self.user 
@@ -227,5 +288,706 @@ class APITests(TestCase):
 
 
 
+########################################################
+# Import
+########################################################
+class ImportTests(TestCase):
+	def setUp(self):
+		self.rows = [
+			['Omelet-1', '0.1', '0.2', '0.3', '0.4', '0.5', '0.6', 'Large-Eggs salt salt', 'Omelet', 'http://img/omelet.png s90', '', '4', 'Food Republic'],
+			['Fries-2', '0.8', '0.6', '0.5', '0.6', '0.1', '0.5', 'avocado salt', 'Fries', 'https://img/fries.png', '1200', '3', 'Kids Kitchen'],
+		]
+		Ingredient.objects.create(raw_name='salt')
+
+	def write_csv(self, rows):
+		f = tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False, newline='')
+		writer = csv.writer(f, quoting=csv.QUOTE_ALL)
+		writer.writerow(['id', 'bitter', 'meaty', 'salty', 'sour', 'sweet', 'piquant', 'ingredients', 'recipeName',
+			'smallImageUrls', 'totalTimeInSeconds', 'rating', 'sourceDisplayName'])
+		writer.writerows(rows)
+		f.close()
+		self.addCleanup(os.remove, f.name)
+		return f.name
+
+	def test_parse_recipe_row(self):
+		record = parse_recipe_row(self.rows[0])
+		self.assertEqual(record['yummly_image_url'], 'https://img/omelet.png')
+		self.assertEqual(record['ingredient_list'], 'large-eggs salt salt')
+		self.assertEqual(record['piquant'], 0.6)
+		self.assertTrue(record['is_yummly_recipe'])
+
+	def test_bulk_writer_links_ingredients(self):
+		writer = BulkRecipeWriter()
+		writer.write([parse_recipe_row(row) for row in self.rows])
+
+		omelet = Recipe.objects.get(yummly_url='Omelet-1')
+		self.assertEqual(writer.recipes_created, 2)
+		self.assertEqual(writer.ingredients_created, 2) # salt already existed
+		self.assertEqual(Ingredient.objects.count(), 3)
+		self.assertEqual(omelet.ingredients.count(), 2)
+		self.assertEqual(Ingredient.objects.get(raw_name='large-eggs').name, 'Large Eggs')
+		self.assertIsNotNone(omelet.date_created)
+
+	def test_recommendation_linker_skips_unknown_ids(self):
+		BulkRecipeWriter().write([parse_recipe_row(row) for row in self.rows])
+		linker = RecommendationLinker()
+		linker.add_rows([
+			['Omelet-1', 'Fries-2', 'Missing-3', 'Omelet-1'],
+			['Missing-4', 'Omelet-1'],
+		])
+		self.assertEqual(linker.save(), 1) # Only the row's own recipe lists it
+		self.assertEqual(linker.save(), 0) # Already linked
+		self.assertEqual(linker.missing_ids, 2)
+
+		omelet = Recipe.objects.get(yummly_url='Omelet-1')
+		self.assertEqual([r.yummly_url for r in omelet.related_recipes.all()], ['Fries-2'])
+		self.assertFalse(Recipe.objects.get(yummly_url='Fries-2').related_recipes.exists())
+
+	def test_streaming_import_resumes_from_checkpoint(self):
+		rows = self.rows + [['Soup-{}'.format(i), '0', '0', '0', '0', '0', '0', 'water', 'Soup\nnumber {}'.format(i), '', '', '5', 'Me'] for i in range(3)]
+		path = self.write_csv(rows)
+
+		class FailingWriter(BulkRecipeWriter):
+			def write(self, records):
+				if self.recipes_created >= 2:
+					raise RuntimeError('crash')
+				return super(FailingWriter, self).write(records)
+
+		with self.assertRaises(RuntimeError):
+			StreamingImport(path, FailingWriter(), chunk_size=2).run()
+		checkpoint = StreamingImport(path, None).pending_checkpoint()
+		self.assertEqual(checkpoint.row_number, 2)
+		self.assertEqual(Recipe.objects.count(), 2)
+
+		stream = StreamingImport(path, BulkRecipeWriter(), chunk_size=2)
+		stream.run(resume=True)
+		self.assertEqual(stream.rows_written, 3)
+		self.assertEqual(Recipe.objects.count(), 5)
+		self.assertEqual(Recipe.objects.get(yummly_url='Soup-2').name, 'Soup\nnumber 2')
+		self.assertIsNone(stream.pending_checkpoint())
+
+	def test_import_command_requires_resume_or_restart(self):
+		path = self.write_csv(self.rows)
+		ImportCheckpoint.objects.create(source=os.path.abspath(path), row_number=1)
+		with self.assertRaises(CommandError):
+			call_command('importrecipedata', recipe_file=path, skip_recommendations=True)
+
+		call_command('importrecipedata', recipe_file=path, skip_recommendations=True, restart=True, bulk=True)
+		self.assertEqual(Recipe.objects.count(), 2)
+
+	def test_import_command_refuses_to_duplicate_recipes(self):
+		path = self.write_csv(self.rows)
+		call_command('importrecipedata', recipe_file=path, skip_recommendations=True, bulk=True)
+		with self.assertRaises(CommandError):
+			call_command('importrecipedata', recipe_file=path, skip_recommendations=True, bulk=True)
+		ImportCheckpoint.objects.all().delete()
+		with self.assertRaises(CommandError): # Recipes from elsewhere
+			call_command('importrecipedata', recipe_file=path, skip_recommendations=True, bulk=True, workers=2)
+		self.assertEqual(Recipe.objects.count(), 2)
+
+		call_command('importrecipedata', recipe_file=path, skip_recommendations=True, bulk=True, append=True)
+		self.assertEqual(Recipe.objects.count(), 4)
+		call_command('importrecipedata', recipe_file=path, skip_recommendations=True, incremental=True)
+		self.assertEqual(Recipe.objects.count(), 4)
+
+	def test_import_command_indexes_only_changed_recipes(self):
+		path = self.write_csv(self.rows)
+		call_command('importrecipedata', recipe_file=path, skip_recommendations=True, bulk=True)
+		self.assertEqual(RecipeSignature.objects.count(), 2)
+		omelet = Recipe.objects.get(yummly_url='Omelet-1')
+		signature = RecipeSignature.objects.get(recipe=omelet).signature
+
+		# Nothing changed: nothing reindexed
+		RecipeSignature.objects.filter(recipe__yummly_url='Fries-2').delete()
+		call_command('importrecipedata', recipe_file=path, skip_recommendations=True, incremental=True)
+		self.assertEqual(RecipeSignature.objects.count(), 1)
+
+		self.rows[0][7] = 'eggs ham'
+		call_command('importrecipedata', recipe_file=self.write_csv(self.rows), skip_recommendations=True, incremental=True)
+		self.assertEqual(RecipeSignature.objects.count(), 1)
+		self.assertNotEqual(RecipeSignature.objects.get(recipe=omelet).signature, signature)
+
+	def test_parallel_import_parses_every_row_once(self):
+		rows = [['Soup-{}'.format(i), '0', '0', '0', '0', '0', '0', 'water salt', 'Soup {}'.format(i), '', '', '5', 'Me'] for i in range(25)]
+		path = self.write_csv(rows)
+		pipeline = ParallelImport(path, BulkRecipeWriter(), workers=4, chunk_size=3)
+		self.assertEqual(len(pipeline.shards()), 4)
+		pipeline.run()
+
+		self.assertEqual(pipeline.rows_written, 25)
+		self.assertEqual(sorted(Recipe.objects.values_list('yummly_url', flat=True)), sorted(row[0] for row in rows))
+		self.assertEqual(Ingredient.objects.count(), 2)
+
+	def test_reset_recipe_data_clears_recipes_and_links(self):
+		BulkRecipeWriter().write([parse_recipe_row(row) for row in self.rows])
+		user = User.objects.create_user(username='testguy', password='fdsajkl;')
+		omelet = Recipe.objects.get(yummly_url='Omelet-1')
+		user.profile.liked_recipes.add(omelet)
+		RecipeVote.objects.create(user_profile=user.profile, recipe=omelet, liked=True)
+		refresh_user_recommendations(user.profile)
+		self.assertFalse(Profile.objects.get(id=user.profile.id).recommendations_stale)
+
+		reset_recipe_data()
+		self.assertTrue(Profile.objects.get(id=user.profile.id).recommendations_stale) # Its feed rows are gone
+		self.assertEqual(Recipe.objects.count(), 0)
+		self.assertEqual(Ingredient.objects.count(), 0)
+		self.assertEqual(Recipe.ingredients.through.objects.count(), 0)
+		self.assertEqual(Profile.liked_recipes.through.objects.count(), 0)
+		self.assertEqual(RecipeVote.objects.count(), 0)
+		self.assertTrue(User.objects.filter(username='testguy').exists())
+
+	def test_upsert_writer_keeps_unchanged_recipes_and_user_links(self):
+		BulkRecipeWriter().write([parse_recipe_row(row) for row in self.rows])
+		omelet = Recipe.objects.get(yummly_url='Omelet-1')
+		user = User.objects.create_user(username='testguy', password='fdsajkl;')
+		user.profile.saved_recipes.add(omelet)
+
+		self.rows[0][7] = 'large-eggs cheese' # Changed ingredients
+		new_row = ['Toast-3', '0', '0', '0', '0', '0.9', '0', 'bread', 'Toast', '', '', '5', 'Me']
+		writer = UpsertRecipeWriter()
+		writer.write([parse_recipe_row(row) for row in [self.rows[0], new_row]])
+
+		self.assertEqual((writer.recipes_created, writer.recipes_updated, writer.recipes_unchanged), (1, 1, 0))
+		self.assertEqual(Recipe.objects.get(pk=omelet.pk).ingredients.count(), 2)
+		self.assertTrue(Recipe.objects.get(pk=omelet.pk).ingredients.filter(raw_name='cheese').exists())
+		self.assertIn(omelet, user.profile.saved_recipes.all())
+
+		writer = UpsertRecipeWriter()
+		writer.write([parse_recipe_row(row) for row in [self.rows[0], new_row]])
+		self.assertEqual((writer.recipes_created, writer.recipes_updated, writer.recipes_unchanged), (0, 0, 2))
+		self.assertEqual(writer.retire_missing(), 1) # Fries-2 wasn't in this import
+		self.assertFalse(Recipe.objects.filter(yummly_url='Fries-2').exists())
+
+	def test_detect_bundled_csv_formats(self):
+		formats = {
+			'salty_recipes_v3.csv': 'recipe export',
+			'garlic_ingredients.csv': 'flavor and ingredients',
+			'yummly_recipe_data.csv': 'yummly api',
+			'final_recommendations_v2.csv': 'recommendations',
+			'id_recc_pairing_v3.csv': 'recommendations',
+		}
+		for filename, name in formats.items():
+			self.assertEqual(detect_format(os.path.join(settings.BASE_DIR, 'data', filename)).name, name)
+
+	def test_read_yummly_api_records(self):
+		record = next(read_records(os.path.join(settings.BASE_DIR, 'data', 'yummly_recipe_data.csv')))
+		self.assertEqual(record['yummly_url'], 'Spinach-and-oven-roasted-tomato-omelet-306176')
+		self.assertEqual(record['yummly_time_in_seconds'], 1500)
+		self.assertEqual(record['ingredient_list'], 'olive-oil large-eggs baby-spinach-leaves tomatoes feta-cheese')
+
+	def test_import_garlic_data_command(self):
+		call_command('importgarlicdata', bulk=True)
+		recipe = Recipe.objects.get(yummly_url='Pecan-Praline-Cookies-2022561')
+		self.assertEqual(recipe.name, 'Pecan Praline Cookies')
+		self.assertEqual(recipe.sweet, 0.8333333333333334)
+		self.assertEqual(recipe.ingredients.count(), 6) # egg whites brown sugar vanilla pecans
+
 
 
+########################################################
+# Recommender
+########################################################
+class RecommenderTests(TestCase):
+	def setUp(self):
+		self.chicken_rice = Recipe.objects.create(name='Chicken Rice', ingredient_list='chicken rice bacon', meaty=0.9, salty=0.6, is_yummly_recipe=True)
+		self.chicken_soup = Recipe.objects.create(name='Chicken Soup', ingredient_list='chicken rice peas', meaty=0.8, salty=0.7, is_yummly_recipe=True)
+		self.brownies = Recipe.objects.create(name='Brownies', ingredient_list='sugar butter cocoa', sweet=0.9, bitter=0.3, is_yummly_recipe=True)
+		self.cookies = Recipe.objects.create(name='Cookies', ingredient_list='sugar butter flour', sweet=0.8, bitter=0.1, is_yummly_recipe=True)
+
+	def test_recipe_features(self):
+		features = RecipeFeatures.load()
+		self.assertEqual(list(features.ids), [self.chicken_rice.id, self.chicken_soup.id, self.brownies.id, self.cookies.id])
+		self.assertEqual(features.flavors.shape, (4, 6))
+		self.assertEqual(features.ingredients[0].sum(), 3)
+		self.assertEqual(list(features.index_of([self.brownies.id, 0])), [2, -1])
+
+	def test_top_k_excludes_self(self):
+		similarity = ContentSimilarity(RecipeFeatures.load())
+		rows, neighbours, scores = next(similarity.top_k(k=3, block_size=2))
+		self.assertEqual(list(rows), [0, 1])
+		self.assertEqual(list(neighbours[0]), [1, 3, 2])
+		self.assertNotIn(1, neighbours[1])
+		self.assertTrue(scores[0][0] >= scores[0][1] >= scores[0][2])
+
+	def test_sharded_top_k_matches_full_scan(self):
+		similarity = ContentSimilarity(RecipeFeatures.load())
+		full = [neighbours.tolist() for rows, neighbours, scores in similarity.top_k(k=2, block_size=4)]
+		sharded = [neighbours.tolist() for rows, neighbours, scores in similarity.top_k(k=2, block_size=1, shard_size=1)]
+		self.assertEqual(sum(full, []), sum(sharded, []))
+
+	def test_mmr_demotes_near_duplicates(self):
+		relevance = np.array([[1.0, 0.95, 0.5, -np.inf]])
+		similarity = np.eye(4)[None, :, :].repeat(1, axis=0)
+		similarity[0, 0, 1] = similarity[0, 1, 0] = 0.99
+		self.assertEqual(mmr(relevance, similarity, 4, tradeoff=0.5).tolist(), [[0, 2, 1, -1]])
+		self.assertEqual(mmr(relevance, similarity, 3, tradeoff=1).tolist(), [[0, 1, 2]])
+
+	def test_pair_scores_match_score_block(self):
+		similarity = ContentSimilarity(RecipeFeatures.load())
+		block = similarity.score_block(0, 4)
+		self.assertTrue(np.allclose(similarity.pair_scores([0, 1, 3], [2, 3, 3]), block[[0, 1, 3], [2, 3, 3]], atol=1e-5))
+
+	def test_diverse_top_k_picks_from_pool(self):
+		similarity = ContentSimilarity(RecipeFeatures.load())
+		plain = np.vstack([neighbours for rows, neighbours, scores in similarity.top_k(k=2)])
+		diverse = np.vstack([neighbours for rows, neighbours, scores in similarity.top_k(k=2, tradeoff=0.3, pool=3)])
+		self.assertEqual(diverse.shape, (4, 2))
+		self.assertEqual(diverse[:, 0].tolist(), plain[:, 0].tolist()) # The best match always comes first
+		for row, neighbours in enumerate(diverse):
+			self.assertNotIn(row, neighbours)
+		self.assertEqual(np.vstack([n for r, n, s in similarity.top_k(k=2, tradeoff=1, pool=3)]).tolist(), plain.tolist())
+
+	def test_diversify_feed(self):
+		recipes = [self.brownies, self.cookies, self.chicken_rice, self.chicken_soup]
+		self.assertEqual(diversify(recipes, tradeoff=1), recipes)
+		self.assertEqual(diversify(recipes, tradeoff=0.3)[:2], [self.brownies, self.chicken_rice])
+
+	def test_compute_recommendations_command(self):
+		self.chicken_rice.related_recipes.add(self.brownies)
+		call_command('computerecommendations', k=1)
+		self.assertEqual(list(self.chicken_rice.related_recipes.all()), [self.chicken_soup])
+		self.assertEqual(list(self.cookies.related_recipes.all()), [self.brownies])
+
+	def test_minhash_estimates_jaccard(self):
+		hasher = MinHasher(num_perm=240, bands=80)
+		first, second = hasher.signature(range(0, 100)), hasher.signature(range(50, 150))
+		self.assertAlmostEqual((first == second).mean(), 1 / 3, delta=0.1)
+		signatures = hasher.signatures(RecipeFeatures.load().ingredients)
+		self.assertEqual(signatures[1].tolist(), hasher.signature(self.chicken_soup.ingredients.values_list('id', flat=True)).tolist())
+
+	def test_minhash_index_follows_ingredient_changes(self):
+		index = MinHashIndex()
+		self.assertEqual(index.similar_to(self.chicken_soup, k=1), [(self.chicken_rice.id, 0.5)])
+		self.cookies.ingredient_list = 'chicken rice peas'
+		self.cookies.save()
+		self.assertEqual(index.similar_to(self.chicken_soup, k=1), [(self.cookies.id, 1.0)])
+		self.assertNotIn(self.cookies.id, [recipe_id for recipe_id, score in index.similar_to(self.brownies)])
+
+		SignatureBucket.objects.all().delete()
+		call_command('buildminhashindex')
+		self.assertEqual(index.similar_to(self.chicken_soup, k=1), [(self.cookies.id, 1.0)])
+
+	def test_user_recipe_gets_neighbours_on_create(self):
+		recipe = Recipe.objects.create(name='Fried Rice', ingredient_list='chicken rice peas', is_user_recipe=True)
+		self.assertCountEqual(recipe.related_recipes.all(), [self.chicken_soup, self.chicken_rice])
+		recipe.ingredient_list = 'sugar butter flour'
+		recipe.save()
+		self.assertCountEqual(recipe.related_recipes.all(), [self.cookies, self.brownies])
+		# Catalog recipes are left to computerecommendations
+		self.assertFalse(self.brownies.related_recipes.exists())
+
+	def test_deferred_cold_start_waits_for_commit(self):
+		with self.settings(COLD_START_DEFERRED=True):
+			recipe = Recipe.objects.create(name='Fried Rice', ingredient_list='chicken rice peas', is_user_recipe=True)
+		self.assertFalse(recipe.related_recipes.exists()) # The test transaction never commits
+		self.assertEqual(link_cold_start_neighbours(recipe.id, set(recipe.ingredients.values_list('id', flat=True)), k=1), [self.chicken_soup.id])
+
+	def test_flavor_index_nearest(self):
+		index = FlavorIndex.load()
+		self.assertEqual([recipe_id for recipe_id, distance in index.similar_to(self.brownies.id, k=2)], [self.cookies.id, self.chicken_soup.id])
+		self.assertEqual(index.nearest([0, 0.82, 0.68, 0, 0, 0], k=1)[0][0], self.chicken_soup.id)
+		self.assertIsNone(index.similar_to(0))
+
+		path = os.path.join(tempfile.mkdtemp(), 'flavors.npz')
+		index.save(path)
+		self.assertEqual(FlavorIndex.load_snapshot(path).similar_to(self.brownies.id), index.similar_to(self.brownies.id))
+
+	# Start from an empty process-wide flavor index, other tests leave theirs behind
+	def fresh_flavor_index(self):
+		patcher = mock.patch.multiple('main.recommender.flavor', _index=None, _pending={}, _rebuild_thread=None)
+		patcher.start()
+		self.addCleanup(patcher.stop)
+
+	def test_flavor_index_follows_flavor_edits(self):
+		from main.recommender import flavor
+		self.fresh_flavor_index()
+		index = flavor_index()
+		self.cookies.name = 'Sugar Cookies'
+		self.cookies.save()
+		self.assertIs(flavor_index(), index) # Not a flavor edit
+
+		self.chicken_rice.sweet, self.chicken_rice.meaty, self.chicken_rice.salty = 0.9, 0, 0
+		self.chicken_rice.save()
+		self.assertEqual(flavor_index().similar_to(self.cookies.id, k=1)[0][0], self.chicken_rice.id) # At once
+		flavor._rebuild_thread.join()
+		self.assertEqual(flavor._pending, {})
+		self.assertEqual(flavor._index.similar_to(self.cookies.id, k=1)[0][0], self.chicken_rice.id)
+
+		self.chicken_rice.delete()
+		self.assertIsNone(flavor_index().similar_to(self.chicken_rice.id))
+		self.assertNotIn(self.chicken_rice.id, [recipe_id for recipe_id, distance in flavor_index().nearest([0, 0, 0, 0, 0.9, 0])])
+
+	def test_flavor_index_keeps_snapshot(self):
+		self.fresh_flavor_index()
+		path = os.path.join(tempfile.mkdtemp(), 'flavors.npz')
+		FlavorIndex(np.array([self.brownies.id, self.cookies.id]), np.array([[0.3, 0, 0, 0, 0.9, 0], [0.1, 0, 0, 0, 0.8, 0]])).save(path)
+		with self.settings(FLAVOR_INDEX_SNAPSHOT=path, FLAVOR_INDEX_MAX_AGE=0):
+			self.assertEqual(len(flavor_index()), 2)
+			self.brownies.sweet = 0.7
+			self.brownies.save()
+			index = rebuild_flavor_index() # Snapshot unchanged: the edit built on top, no database load
+			self.assertEqual(len(index), 2)
+			self.assertAlmostEqual(float(index.flavors_of(self.brownies.id)[4]), 0.7)
+
+	def test_recommender_snapshot(self):
+		self.chicken_rice.related_recipes.add(self.chicken_soup)
+		with self.settings(RECOMMENDER_ARTIFACT_DIR=tempfile.mkdtemp()):
+			self.assertIsNone(current_snapshot())
+			RecommenderSnapshot.from_database().save()
+			snapshot = current_snapshot()
+			self.assertEqual(snapshot.generation, 1)
+			self.assertIsInstance(snapshot.flavors, np.memmap)
+			self.assertEqual(snapshot.neighbours(self.chicken_rice.id), [self.chicken_soup.id])
+			self.assertEqual(snapshot.neighbours(self.brownies.id), [])
+			self.assertIsNone(snapshot.neighbours(0))
+			index = FlavorIndex.load()
+			self.assertEqual([recipe_id for recipe_id, distance in snapshot.similar_to(self.brownies.id, k=3)],
+				[recipe_id for recipe_id, distance in index.similar_to(self.brownies.id, k=3)])
+			self.assertEqual(snapshot.nearest([0, 0.82, 0.68, 0, 0, 0], k=1)[0][0], self.chicken_soup.id)
+			self.assertIsInstance(snapshot.cell_order, np.memmap) # The flavor grid is mapped, not built per worker
+
+			self.chicken_rice.related_recipes.clear()
+			call_command('computerecommendations', k=1, snapshot=True, stdout=StringIO())
+			self.assertEqual(current_snapshot().generation, 2)
+			self.assertEqual(current_snapshot().neighbours(self.chicken_rice.id), [self.chicken_soup.id])
+
+	def test_snapshot_grid_matches_full_scan(self):
+		random = np.random.RandomState(0)
+		flavors = np.vstack([random.rand(500, 6), random.rand(20, 6) * 0.1 + 0.5, [[1.2, -0.1, 0, 0, 1, 1]]]).astype(np.float32)
+		snapshot = RecommenderSnapshot(np.arange(len(flavors)) * 2, flavors, np.zeros(len(flavors) + 1, dtype=np.int64), np.empty(0, dtype=np.int64))
+		for target in list(random.rand(20, 6)) + [flavors[-1], [0.5] * 6]:
+			distances = np.sqrt(np.square(flavors - np.asarray(target, dtype=np.float32)).sum(axis=1))
+			expected = [int(p) * 2 for p in np.lexsort((np.arange(len(flavors)), distances))[:7]]
+			self.assertEqual([recipe_id for recipe_id, distance in snapshot.nearest(target, k=7)], expected)
+		self.assertNotIn(4, [recipe_id for recipe_id, distance in snapshot.similar_to(4, k=600)])
+		self.assertEqual(len(snapshot.similar_to(4, k=600)), len(flavors) - 1)
+
+	def test_model_registry_publish_and_rollback(self):
+		self.chicken_rice.related_recipes.add(self.chicken_soup)
+		with self.settings(RECOMMENDER_ARTIFACT_DIR=tempfile.mkdtemp()):
+			self.assertEqual(live_related_recipes(self.chicken_rice), [self.chicken_soup]) # Nothing published yet
+			call_command('computerecommendations', k=1, snapshot=True, stdout=StringIO())
+			registry = ModelRegistry.for_kind('snapshot')
+			first = registry.live()
+			self.assertEqual(live_related_recipes(self.chicken_rice), [self.chicken_soup])
+
+			cat = User.objects.create_user(username='cat', password='fdsajkl;').profile
+			cat.liked_recipes.add(self.chicken_rice)
+			self.assertEqual(compute_home_recommendations(cat), [self.chicken_soup])
+
+			# A recompute that isn't published doesn't show: not on the recipe page, the home feed or vote updates
+			self.chicken_rice.ingredient_list, self.chicken_rice.meaty, self.chicken_rice.salty, self.chicken_rice.sweet = 'sugar butter flour', 0, 0, 0.8
+			self.chicken_rice.save()
+			call_command('computerecommendations', k=1, snapshot=True, no_publish=True, stdout=StringIO())
+			second = registry.versions()[-1]
+			self.assertEqual(registry.live(), first)
+			self.assertEqual(live_related_recipes(self.chicken_rice), [self.chicken_soup])
+			self.assertEqual(compute_home_recommendations(cat), [self.chicken_soup])
+			self.assertEqual(list(vote_neighbours(self.chicken_rice.id)), [self.chicken_soup.id])
+			self.assertFalse(self.chicken_rice.related_recipes.filter(id=self.cookies.id).exists()) # Table untouched
+
+			call_command('recommendermodels', 'publish', 'snapshot', second, stdout=StringIO())
+			self.assertEqual(current_snapshot().version, second)
+			self.assertEqual(RecipeDetailSerializer(self.chicken_rice).data['related_recipes'][0]['id'], self.cookies.id)
+			self.assertEqual(compute_home_recommendations(cat), [self.cookies])
+			self.assertEqual(list(vote_neighbours(self.chicken_rice.id)), [self.cookies.id])
+
+			out = StringIO()
+			call_command('recommendermodels', 'rollback', 'snapshot', stdout=out)
+			self.assertIn(first, out.getvalue())
+			self.assertEqual(current_snapshot().version, first)
+			self.assertEqual(live_related_recipes(self.chicken_rice), [self.chicken_soup])
+			self.assertEqual(compute_home_recommendations(cat), [self.chicken_soup])
+			with self.assertRaises(CommandError):
+				call_command('recommendermodels', 'rollback', 'snapshot', stdout=StringIO())
+			with self.assertRaises(CommandError):
+				call_command('recommendermodels', 'publish', 'snapshot', 'missing', stdout=StringIO())
+
+	def test_unpublished_first_snapshot_stays_offline(self):
+		self.chicken_rice.related_recipes.add(self.brownies)
+		with self.settings(RECOMMENDER_ARTIFACT_DIR=tempfile.mkdtemp()):
+			with self.assertRaises(CommandError): # The table would be live at once
+				call_command('computerecommendations', k=1, no_publish=True, stdout=StringIO())
+			call_command('computerecommendations', k=1, snapshot=True, no_publish=True, stdout=StringIO())
+			self.assertIsNone(current_snapshot())
+			self.assertEqual(live_related_recipes(self.chicken_rice), [self.brownies])
+
+			version = ModelRegistry.for_kind('snapshot').versions()[-1]
+			call_command('recommendermodels', 'publish', 'snapshot', version, stdout=StringIO())
+			self.assertEqual(live_related_recipes(self.chicken_rice), [self.chicken_soup])
+
+	def test_api_similar_flavor(self):
+		factory = APIRequestFactory()
+		response = api.SimilarFlavorRecipes.as_view()(factory.get('/api/recipes/{}/similar-flavor/?k=1'.format(self.cookies.id)), pk=str(self.cookies.id))
+		self.assertEqual([recipe['id'] for recipe in response.data], [self.brownies.id])
+
+		response = api.FlavorSearch.as_view()(factory.get('/api/recipes/flavor/', {'meaty': 0.9, 'salty': 0.6, 'k': 2}))
+		self.assertEqual([recipe['id'] for recipe in response.data], [self.chicken_rice.id, self.chicken_soup.id])
+		self.assertEqual(api.FlavorSearch.as_view()(factory.get('/api/recipes/flavor/', {'sweet': 2})).status_code, 400)
+
+		Recipe.objects.create(name='Fudge', ingredient_list='sugar butter cocoa', sweet=0.9, bitter=0.29)
+		response = api.SimilarFlavorRecipes.as_view()(factory.get('/api/recipes/{}/similar-flavor/?k=1'.format(self.brownies.id)), pk=str(self.brownies.id))
+		self.assertEqual(response.data[0]['name'], 'Fudge')
+		self.assertEqual(api.SimilarFlavorRecipes.as_view()(factory.get('/api/recipes/0/similar-flavor/'), pk='0').status_code, 404)
+
+	def test_flavor_api_follows_edits_while_snapshot_is_live(self):
+		self.fresh_flavor_index()
+		factory = APIRequestFactory()
+		with self.settings(RECOMMENDER_ARTIFACT_DIR=tempfile.mkdtemp()):
+			call_command('computerecommendations', k=1, snapshot=True, stdout=StringIO())
+			self.assertIsNotNone(current_snapshot())
+			self.chicken_soup.sweet, self.chicken_soup.bitter, self.chicken_soup.meaty, self.chicken_soup.salty = 0.85, 0.2, 0, 0
+			self.chicken_soup.save()
+			fudge = Recipe.objects.create(name='Fudge', ingredient_list='sugar butter cocoa', sweet=0.9, bitter=0.29)
+
+			response = api.SimilarFlavorRecipes.as_view()(factory.get('/api/recipes/{}/similar-flavor/?k=1'.format(self.chicken_rice.id)), pk=str(self.chicken_rice.id))
+			self.assertNotEqual(response.data[0]['id'], self.chicken_soup.id)
+			response = api.FlavorSearch.as_view()(factory.get('/api/recipes/flavor/', {'sweet': 0.9, 'bitter': 0.29, 'k': 1}))
+			self.assertEqual(response.data[0]['id'], fudge.id)
+			response = api.FlavorSearch.as_view()(factory.get('/api/recipes/flavor/', {'sweet': 0.85, 'bitter': 0.2, 'k': 1}))
+			self.assertEqual(response.data[0]['id'], self.chicken_soup.id)
+
+	def add_feedback(self):
+		ann, bob, cat = [User.objects.create_user(username=name, password='fdsajkl;').profile for name in ('ann', 'bob', 'cat')]
+		ann.liked_recipes.add(self.brownies, self.cookies)
+		bob.saved_recipes.add(self.brownies, self.cookies, self.chicken_rice)
+		cat.liked_recipes.add(self.chicken_rice)
+		cat.disliked_recipes.add(self.brownies)
+		return ann, bob, cat
+
+	def test_time_split_evaluation(self):
+		ann, bob, cat = self.add_feedback()
+		old = timezone.now() - datetime.timedelta(days=30)
+		RecipeVote.objects.exclude(user_profile=ann, recipe=self.cookies).update(date_modified=old)
+
+		split = TimeSplit.load(holdout=0.25)
+		self.assertEqual(split.heldout, {ann.id: {self.cookies.id}})
+		self.assertEqual(split.train.matrix[split.train.profile_index([ann.id])[0]].nnz, 1) # Only brownies left
+
+		metrics = evaluate(RECOMMENDERS['popular'](), split, k=2)
+		self.assertEqual((metrics['precision'], metrics['recall'], metrics['users']), (0.5, 1.0, 1))
+		self.assertEqual(metrics['coverage'], 0.5)
+		self.assertGreaterEqual(metrics['latency_p99_ms'], metrics['latency_p50_ms'])
+
+		out = StringIO()
+		call_command('evaluaterecommenders', k=2, cutoff=(old + datetime.timedelta(days=1)).date().isoformat(), stdout=out, stderr=StringIO())
+		report = json.loads(out.getvalue())
+		self.assertEqual(report['heldout_users'], 1)
+		self.assertEqual(list(report['recommenders']), list(RECOMMENDERS))
+		self.assertEqual(report['recommenders']['collaborative']['recall'], 1.0) # bob saved brownies and cookies together
+		with self.assertRaises(CommandError):
+			call_command('evaluaterecommenders', 'nope', stdout=StringIO())
+
+	def test_votes_are_recorded(self):
+		ann, bob, cat = self.add_feedback()
+		votes = lambda: set(RecipeVote.objects.values_list('user_profile_id', 'recipe_id', 'liked'))
+		self.assertEqual(votes(), {(ann.id, self.brownies.id, True), (ann.id, self.cookies.id, True),
+			(cat.id, self.chicken_rice.id, True), (cat.id, self.brownies.id, False)})
+
+		cat.disliked_recipes.remove(self.brownies)
+		self.brownies.profiles_liked.add(cat) # From the recipe's side
+		self.assertEqual(RecipeVote.objects.filter(user_profile=cat, recipe=self.brownies).get().liked, True)
+		ann.liked_recipes.clear()
+		self.assertEqual(votes(), {(ann.id, self.brownies.id, None), (ann.id, self.cookies.id, None),
+			(cat.id, self.chicken_rice.id, True), (cat.id, self.brownies.id, True)})
+
+	def test_flavor_profile_follows_votes(self):
+		ann, bob, cat = self.add_feedback()
+		self.assertTrue(np.allclose(taste_vector(cat.id), [-0.15, 0.9, 0.6, 0, -0.45, 0]))
+		self.assertIsNone(taste_vector(bob.id)) # Saves don't count
+
+		self.cookies.profiles_liked.add(cat)
+		self.assertTrue(np.allclose(taste_vector(cat.id), [0.05 - 0.15, 0.45, 0.3, 0, 0.4 - 0.45, 0]))
+		cat.liked_recipes.remove(self.cookies, self.chicken_soup) # Chicken soup was never liked
+		self.assertTrue(np.allclose(taste_vector(cat.id), [-0.15, 0.9, 0.6, 0, -0.45, 0]))
+		cat.disliked_recipes.clear()
+		self.assertTrue(np.allclose(taste_vector(cat.id), [0, 0.9, 0.6, 0, 0, 0]))
+
+		stored = FlavorProfile.objects.get(profile=cat)
+		rebuilt = rebuild_flavor_profile(cat.id)
+		self.assertEqual((stored.liked_count, stored.disliked_count), (rebuilt.liked_count, rebuilt.disliked_count))
+		self.assertAlmostEqual(stored.liked_meaty, rebuilt.liked_meaty)
+
+	def test_taste_ranks_candidates_without_model(self):
+		ann, bob, cat = self.add_feedback()
+		with self.settings(RECOMMENDER_ARTIFACT_DIR=tempfile.mkdtemp()):
+			candidates = Recipe.objects.filter(id__in=[self.cookies.id, self.chicken_soup.id])
+			self.assertEqual(rank_by_model(cat, candidates, 2), [self.chicken_soup, self.cookies])
+			self.assertEqual(rank_by_model(ann, candidates, 2), [self.cookies, self.chicken_soup])
+
+			# Every candidate is scored, not a slice of them
+			for i in range(300):
+				Recipe.objects.create(name='Cake {}'.format(i), ingredient_list='sugar', sweet=0.5)
+			steak = Recipe.objects.create(name='Steak', ingredient_list='beef salt', meaty=1, salty=0.8)
+			self.assertEqual(rank_by_model(cat, Recipe.objects.exclude(id=self.chicken_rice.id).distinct(), 1), [steak])
+
+	def test_interactions_matrix(self):
+		ann, bob, cat = self.add_feedback()
+		bob.liked_recipes.add(self.cookies)
+		interactions = Interactions.load()
+		self.assertEqual(list(interactions.recipe_ids), [self.chicken_rice.id, self.brownies.id, self.cookies.id])
+		matrix = interactions.matrix.toarray()
+		self.assertEqual(matrix[interactions.profile_index([bob.id])[0]].tolist(), [1, 1, 2])
+		self.assertEqual(matrix[interactions.profile_index([cat.id])[0]].tolist(), [1, -1, 0])
+		self.assertEqual(list(interactions.recipe_index([self.chicken_soup.id])), [-1])
+
+	def test_compute_collaborative_command(self):
+		ann, bob, cat = self.add_feedback()
+		call_command('computecollaborative', k=2)
+		self.assertEqual([n.neighbour for n in self.brownies.collaborative_neighbours.order_by('-score')], [self.cookies])
+		self.assertEqual([n.neighbour for n in self.cookies.collaborative_neighbours.order_by('-score')], [self.brownies, self.chicken_rice])
+
+		# Collaborative neighbours are blended with related_recipes in the home feed
+		self.chicken_rice.related_recipes.add(self.chicken_soup)
+		cat.saved_recipes.add(self.cookies)
+		self.assertEqual(set(compute_home_recommendations(cat)), {self.chicken_soup, self.cookies})
+		cat.disliked_recipes.remove(self.brownies)
+		self.assertEqual(set(compute_home_recommendations(cat)), {self.chicken_soup, self.cookies, self.brownies})
+
+	def test_holdout_metrics(self):
+		matrix = sparse.csr_matrix(np.array([[1, 1, 1, 1], [1, 0, -1, 0], [0, 0, 1, 1]], dtype=np.float32))
+		train, heldout = holdout_split(matrix, fraction=0.5)
+		self.assertEqual(sorted(heldout), [0, 2])
+		self.assertEqual(len(heldout[0]), 2)
+		self.assertEqual(train.nnz, matrix.nnz - 3)
+		self.assertEqual(precision_recall_at_k({0: [3, 1], 2: [0]}, {0: {1, 2}, 2: {3}}, k=2), (0.25, 0.25))
+		self.assertEqual(coverage({0: [3, 1], 2: [0]}, 8, k=1), 0.25)
+
+	def test_train_als_command(self):
+		ann, bob, cat = self.add_feedback()
+		with self.settings(RECOMMENDER_ARTIFACT_DIR=tempfile.mkdtemp()):
+			out = StringIO()
+			call_command('trainals', factors=4, iterations=5, holdout=0.5, stdout=out)
+			self.assertIn('Iteration 5', out.getvalue())
+			self.assertIn('precision@10', out.getvalue())
+
+			model = current_als_model()
+			self.assertEqual(model.item_factors.dtype, np.float32)
+			self.assertEqual(model.meta['iterations'], 5)
+			scores = model.score(ann.id, [self.cookies.id, self.chicken_soup.id])
+			self.assertGreater(scores[0], scores[1])
+			self.assertIsNone(model.score(0, [self.cookies.id]))
+			self.assertTrue(model.has_user(ann.id))
+			self.assertFalse(model.has_user(0))
+
+			# A newer version replaces the loaded one
+			call_command('trainals', factors=2, iterations=1, holdout=0, stdout=out)
+			self.assertEqual(current_als_model().meta['factors'], 2)
+
+	def test_random_walk(self):
+		ann, bob, cat = self.add_feedback()
+		walk = RandomWalk(InteractionGraph.load())
+		recipe_ids, scores = walk.recommend(cat.id, k=3)
+		self.assertEqual(set(recipe_ids), {self.chicken_soup.id, self.brownies.id, self.cookies.id})
+		self.assertEqual(recipe_ids[0], self.chicken_soup.id) # Shares two ingredients with chicken rice
+		self.assertLess(walk.iterations, walk.max_iterations)
+		self.assertNotIn(self.brownies.id, walk.recommend(cat.id, exclude=[self.brownies.id])[0])
+		self.assertIsNone(walk.recommend(0))
+
+		# Batch mode walks users together and gives the same lists
+		batch = {profile_id: list(ids) for profile_id, ids, batch_scores in walk.recommend_all(k=3, batch_size=2)}
+		self.assertEqual(batch[cat.id], list(recipe_ids))
+		self.assertEqual(batch[ann.id][0], self.chicken_rice.id)
+
+	def test_random_walk_command(self):
+		ann, bob, cat = self.add_feedback()
+		with self.settings(RECOMMENDER_ARTIFACT_DIR=tempfile.mkdtemp()):
+			call_command('computerandomwalk', k=2, stdout=StringIO())
+			self.assertEqual(len(current_walk_recommendations().for_profile(cat.id)), 2)
+			self.assertIn(self.chicken_soup, compute_home_recommendations(cat))
+
+			out = StringIO()
+			call_command('computerandomwalk', user='cat', stdout=out)
+			self.assertIn('Chicken Soup', out.getvalue())
+
+	def test_home_follows_stored_neighbours_of_liked_recipes(self):
+		ann, bob, cat = self.add_feedback()
+		# One way: chicken rice lists chicken soup, cookies list chicken rice
+		save_related_recipes([self.chicken_rice.id, self.cookies.id], [[self.chicken_soup.id], [self.chicken_rice.id]])
+		with self.settings(RECOMMENDER_ARTIFACT_DIR=tempfile.mkdtemp()):
+			self.assertEqual(compute_home_recommendations(cat), [self.chicken_soup])
+
+	def test_materialized_feed(self):
+		ann, bob, cat = self.add_feedback()
+		self.chicken_rice.related_recipes.add(self.chicken_soup)
+		self.assertTrue(cat.recommendations_stale)
+		self.assertEqual(home_recommendations(cat), [self.chicken_soup]) # Generated on first visit
+		self.assertFalse(Profile.objects.get(id=cat.id).recommendations_stale)
+
+		with self.assertNumQueries(1):
+			self.assertEqual(home_recommendations(cat), [self.chicken_soup])
+
+		# Votes from either side of the relation mark the feed stale, the job regenerates it
+		cat.disliked_recipes.remove(self.brownies)
+		self.assertTrue(Profile.objects.get(id=cat.id).recommendations_stale)
+		self.chicken_rice.related_recipes.add(self.brownies)
+		cat.refresh_from_db()
+		self.assertEqual(home_recommendations(cat), [self.chicken_soup]) # Recent enough to serve as is
+		call_command('refreshrecommendations', stdout=StringIO())
+		cat.refresh_from_db()
+		self.assertFalse(cat.recommendations_stale)
+		self.assertEqual(sorted(cat.recommendations.values_list('rank', flat=True)), [1, 2])
+		self.assertEqual(set(home_recommendations(cat)), {self.chicken_soup, self.brownies})
+
+		# Without the job, a feed stale for HOME_FEED_STALE_AGE is recomputed by the home page
+		cat.disliked_recipes.add(self.brownies)
+		cat.liked_recipes.remove(self.chicken_rice)
+		cat.refresh_from_db()
+		self.assertTrue(cat.recommendations_stale)
+		cat.recommendations.update(generated_at=timezone.now() - datetime.timedelta(hours=1))
+		self.assertEqual(home_recommendations(cat), [])
+		self.assertFalse(Profile.objects.get(id=cat.id).recommendations_stale)
+
+	def test_feed_follows_votes_incrementally(self):
+		self.add_feedback()
+		call_command('computecollaborative', k=2, stdout=StringIO())
+		self.chicken_rice.related_recipes.add(self.chicken_soup)
+		dan = User.objects.create_user(username='dan', password='fdsajkl;').profile
+		Profile.objects.filter(id=dan.id).update(recommendations_stale=False)
+
+		def feed():
+			return list(dan.recommendations.order_by('rank').values_list('recipe_id', flat=True))
+
+		dan.liked_recipes.add(self.chicken_rice) # Related chicken soup and collaborative cookies come in
+		self.assertEqual(feed(), [self.chicken_soup.id, self.cookies.id])
+		self.cookies.profiles_liked.add(dan) # Cookies leave, brownies come in above chicken soup
+		self.assertEqual(feed(), [self.brownies.id, self.chicken_soup.id])
+		dan.disliked_recipes.add(self.chicken_soup)
+		self.assertEqual(feed(), [self.brownies.id])
+		self.assertFalse(Profile.objects.get(id=dan.id).recommendations_stale)
+
+	def test_seeded_sampling(self):
+		self.assertEqual(daily_seed(1, datetime.date(2017, 5, 1)), daily_seed(1, datetime.date(2017, 5, 1)))
+		self.assertNotEqual(daily_seed(1, datetime.date(2017, 5, 1)), daily_seed(1, datetime.date(2017, 5, 2)))
+		sample = reservoir_sample(iter(range(1000)), 5, seed=3)
+		self.assertEqual(sample, reservoir_sample(range(1000), 5, seed=3))
+		self.assertEqual(len(set(sample)), 5)
+		self.assertEqual(sorted(reservoir_sample(range(3), 5)), [0, 1, 2])
+		self.assertEqual(sorted(sample_positions(4, 10, seed=1)), [1, 2, 3, 4])
+
+	def test_sampled_home_page(self):
+		ann, bob, cat = self.add_feedback()
+		self.chicken_rice.related_recipes.add(self.chicken_soup, self.cookies)
+		refresh_user_recommendations(cat)
+		with self.assertNumQueries(2):
+			page = home_recommendations(cat, page_size=1, sample=True)
+		self.assertEqual(len(page), 1)
+		self.assertEqual(page, home_recommendations(cat, page_size=1, sample=True))
+		self.assertEqual(set(home_recommendations(cat, sample=True)), {self.chicken_soup, self.cookies})
+
+	def test_parallel_top_k_matches_serial(self):
+		similarity = ContentSimilarity(RecipeFeatures.load())
+		serial = np.vstack([similarity.ids[neighbours] for rows, neighbours, scores in similarity.top_k(k=2)])
+		pipeline = ParallelTopK(similarity, workers=2, shard_rows=1)
+		recipe_ids, neighbour_ids = pipeline.neighbours(k=2)
+		self.assertEqual(recipe_ids.tolist(), similarity.ids.tolist())
+		self.assertEqual(neighbour_ids.tolist(), serial.tolist())
+		self.assertTrue(pipeline.worker_rss_mb)
+		self.assertTrue(all(rss_mb > 0 for rss_mb in pipeline.worker_rss_mb.values()))
+
+	def test_compute_recommendations_command_with_workers(self):
+		out = StringIO()
+		call_command('computerecommendations', k=1, workers=2, stdout=out)
+		self.assertIn('Worker peak RSS', out.getvalue())
+		self.assertEqual(list(self.chicken_rice.related_recipes.all()), [self.chicken_soup])
+		self.assertEqual(list(self.cookies.related_recipes.all()), [self.brownies])
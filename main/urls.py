@@ -39,6 +39,8 @@ urlpatterns = [
 	url(r'^api/recipes/like/$', api.LikeRecipe.as_view()),
 	url(r'^api/recipes/dislike/$', api.DislikeRecipe.as_view()),
 	url(r'^api/recipes/(?P<pk>[0-9]+)$', api.RecipeDetail.as_view()),
+	url(r'^api/recipes/(?P<pk>[0-9]+)/similar-flavor/$', api.SimilarFlavorRecipes.as_view(), name='api_similar_flavor'),
+	url(r'^api/recipes/flavor/$', api.FlavorSearch.as_view(), name='api_flavor_search'),
 	url(r'^api/users/$', api.UserList.as_view(), name='api_users_list'),
 	url(r'^api/users/(?P<pk>[0-9]+)$', api.UserDetail.as_view()),
 
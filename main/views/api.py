@@ -26,9 +26,11 @@ from rest_framework import generics
 from rest_framework import permissions 
 from rest_framework.decorators import api_view
 from rest_framework.reverse import reverse as api_reverse
+from rest_framework.exceptions import NotFound, ValidationError
 
 # Local
-from main.models import Recipe, Ingredient
+from main.models import Recipe, Ingredient, FLAVORS
+from main.recommender.flavor import flavor_index
 from main.forms import UserForm, UserRegistrationForm, UserInfoForm, ProfileInfoForm
 from main.serializers import RecipeSerializer, RecipeDetailSerializer, UserSerializer, UserDetailSerializer, RecipeCreateSerializer
 
@@ -61,6 +63,49 @@ class RecipeDetail(generics.RetrieveUpdateDestroyAPIView):
 	queryset = Recipe.objects.all()
 	serializer_class = RecipeDetailSerializer 
 
+# Recipes closest in flavor to a recipe, ?k= sets how many (default 10)
+class SimilarFlavorRecipes(APIView):
+	def get(self, request, pk, format=None):
+		k = flavor_query_k(request)
+		# The flavor index, not the serving snapshot: it follows flavor edits and new recipes as they're saved
+		neighbours = flavor_index().similar_to(int(pk), k=k)
+		if neighbours is None:
+			raise NotFound("No recipe with id {}.".format(pk))
+		return Response(flavor_neighbour_data(neighbours))
+
+# Recipes closest to a target flavor profile, ex: ?sweet=0.9&bitter=0.2&k=5 (flavors left out count as 0)
+class FlavorSearch(APIView):
+	def get(self, request, format=None):
+		target = []
+		for flavor in FLAVORS:
+			try:
+				value = float(request.query_params.get(flavor, 0))
+			except ValueError:
+				value = None
+			if value is None or not 0 <= value <= 1:
+				raise ValidationError({flavor: "Must be a number between 0 and 1."})
+			target.append(value)
+		return Response(flavor_neighbour_data(flavor_index().nearest(target, k=flavor_query_k(request))))
+
+def flavor_query_k(request, default=10, maximum=100):
+	try:
+		k = int(request.query_params.get('k', default))
+	except ValueError:
+		k = 0
+	if not 1 <= k <= maximum:
+		raise ValidationError({'k': "Must be an integer between 1 and {}.".format(maximum)})
+	return k
+
+# Serialized recipes with their flavor distance, in neighbour order
+def flavor_neighbour_data(neighbours):
+	recipes = Recipe.objects.prefetch_related('ingredients').in_bulk([recipe_id for recipe_id, distance in neighbours])
+	data = []
+	for recipe_id, distance in neighbours:
+		if recipe_id in recipes: # Deleted since the index was built
+			data.append(dict(RecipeSerializer(recipes[recipe_id]).data, distance=distance))
+	return data
+
+
 class UserList(generics.ListAPIView):
 	queryset = User.objects.all()
 	serializer_class = UserSerializer
@@ -33,6 +33,8 @@ from rest_framework.reverse import reverse as api_reverse
 # Local
 from main.models import Recipe, Ingredient
 from main.forms import RecipeCreateForm
+from main.recommender.feed import home_recommendations
+from main.recommender.related import live_related_recipes
 from main.serializers import RecipeSerializer, RecipeDetailSerializer, UserSerializer, UserDetailSerializer, RecipeCreateSerializer
 
 
@@ -41,11 +43,7 @@ def home(request):
 
 	if request.user.is_authenticated:
 		profile = request.user.profile 
-		liked_recipes = profile.liked_recipes.all()
-		disliked_recipes = profile.disliked_recipes.all()
-
-		recommended_recipes = Recipe.objects.filter(related_recipes__in=liked_recipes).distinct().exclude(id__in=liked_recipes).exclude(id__in=disliked_recipes).order_by('?')
-		context['recommended_recipes'] = recommended_recipes
+		context['recommended_recipes'] = home_recommendations(profile)
 	return render(request, 'main/home.html', context)
 
 
@@ -112,6 +110,7 @@ class RecipeDetail(DetailView):
 			{ 'name': 'meaty', 'value': int(recipe.meaty * 100) },
 			{ 'name': 'piquant', 'value': int(recipe.piquant * 100) },
 		]
+		context['related_recipes'] = live_related_recipes(recipe, limit=4)
 		if self.request.user.is_authenticated:
 			context['saved_recipes'] = self.request.user.profile.saved_recipes.all()
 			context['liked_recipes'] = self.request.user.profile.liked_recipes.all()